@@ -0,0 +1,356 @@
+# 说明：
+# 数据处理工具的基准测试：生成仿照企业失信数据的合成数据（中文duty列、年份列、机构代码等），
+# 依次运行各工具并记录用时、吞吐量和峰值内存，结果保存为json；compare比较两次结果并标出变慢/内存变大的工具
+# 每个工具在单独的子进程中运行（峰值内存只属于这个工具），用时等数据来自 run_report.py 的运行报告
+# 用法：
+#   python benchmark.py run --rows 1000000 --output 结果.json             生成数据（已存在则复用）并测试全部工具
+#   python benchmark.py run --rows 200000 --tools split_csv,sample --repeat 3 --output 结果.json
+#   python benchmark.py compare 旧结果.json 新结果.json --threshold 0.1   用时或峰值内存增加超过10%记为退化（退出码1）
+#   python benchmark.py generate --rows 5000000                          只生成数据
+# 数据保存在 --data-dir（默认 bench_data）下的 rows<行数>_seed<种子>/ 中，相同行数和种子的数据会复用
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+GENERATE_CHUNK = 100000     # 生成数据时每块的行数
+PARQUET_FILES = 4           # parquet数据拆成的文件数（合并工具的输入）
+SAMPLE_ROWS = 1000
+SPLIT_PARTS = 10
+
+# ================== 合成数据 ==================
+SUBJECTS = ["被执行人", "该公司", "法定代表人", "失信被执行人", "被申请人", "上述企业"]
+ACTIONS = ["未按执行通知书履行", "拒不履行生效法律文书确定的义务", "以虚假诉讼逃避执行",
+           "违反财产报告制度", "违反限制消费令", "有履行能力而拒不履行", "转移财产规避执行"]
+OBJECTS = ["给付货款", "支付工程款", "偿还借款本息", "支付劳动报酬", "返还租金", "赔偿经济损失", "支付违约金"]
+COURTS = ["上海市浦东新区人民法院", "北京市朝阳区人民法院", "广州市天河区人民法院",
+          "杭州市西湖区人民法院", "成都市武侯区人民法院", "武汉市江汉区人民法院"]
+NAME_CHARS = "华中国海东方新兴科技实业发展贸易建设投资控股集团电子信息工程机械物流商贸"
+
+def _duty(rng):
+    # 长度从几个字到约200字，短文本会被清洗程序删除
+    parts = [f"{rng.choice(SUBJECTS)}{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}{rng.randint(1, 999)}万元"
+             for _ in range(rng.choice((0, 1, 1, 2, 3, 5, 8)))]
+    return "，".join(parts) or rng.choice(SUBJECTS)
+
+def generate_chunk(start, rows, seed):
+    """第start行开始的rows行合成数据（同一种子下每块的数据固定）"""
+    import pandas as pd
+    rng = random.Random(seed * 1000003 + start)
+    data = {'id': range(start, start + rows), 'name': [], 'cardnum': [], 'duty': [],
+            'publish_year': [], 'case_year': [], 'court': [], 'amount': []}
+    for _ in range(rows):
+        code = rng.randrange(10 ** 8)
+        data['name'].append(''.join(rng.choice(NAME_CHARS) for _ in range(rng.randint(4, 10))) + "有限公司")
+        data['cardnum'].append(f"{code:08d}{rng.randrange(10)}")
+        data['duty'].append(_duty(rng))
+        case_year = rng.randint(2008, 2024)
+        data['case_year'].append(case_year)
+        data['publish_year'].append(min(2024, case_year + rng.randint(0, 3)))
+        data['court'].append(rng.choice(COURTS))
+        data['amount'].append(round(rng.lognormvariate(10, 1.5), 2))
+    return pd.DataFrame(data)
+
+def generate_data(data_dir, rows, seed=0, formats=('csv', 'parquet', 'dta')):
+    """生成（或复用）各格式的合成数据，返回数据文件夹"""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    root = os.path.join(data_dir, f"rows{rows}_seed{seed}")
+    done_file = os.path.join(root, 'done.json')
+    done = {}
+    if os.path.exists(done_file):
+        with open(done_file, 'r', encoding='utf-8') as f:
+            done = json.load(f)
+    formats = [fmt for fmt in formats if not done.get(fmt)]
+    if not formats:
+        return root
+    os.makedirs(os.path.join(root, 'parquet'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'dta'), exist_ok=True)
+
+    print(f"生成 {rows:,} 行合成数据（{', '.join(formats)}）到 {root} ...")
+    start_time = time.perf_counter()
+    csv_path = os.path.join(root, 'qiye.csv')
+    per_file = -(-rows // PARQUET_FILES)
+    writers = {}
+    dta_chunks = []
+    try:
+        for start in range(0, rows, GENERATE_CHUNK):
+            chunk = generate_chunk(start, min(GENERATE_CHUNK, rows - start), seed)
+            if 'csv' in formats:
+                chunk.to_csv(csv_path, mode='w' if start == 0 else 'a', header=start == 0,
+                             index=False, encoding='utf-8')
+            if 'parquet' in formats:
+                # 按行号分到PARQUET_FILES个文件
+                for k, part in chunk.groupby(chunk['id'] // per_file):
+                    table = pa.Table.from_pandas(part, preserve_index=False)
+                    if k not in writers:
+                        path = os.path.join(root, 'parquet', f'qiye_{k + 1}.parquet')
+                        writers[k] = pq.ParquetWriter(path, table.schema)
+                    writers[k].write_table(table)
+            if 'dta' in formats:
+                dta_chunks.append(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    if 'dta' in formats:
+        # Stata格式只能整表写出
+        pd.concat(dta_chunks, ignore_index=True).to_stata(
+            os.path.join(root, 'dta', 'qiye.dta'), write_index=False, version=118)
+        del dta_chunks
+    for fmt in formats:
+        done[fmt] = True
+    with open(done_file, 'w', encoding='utf-8') as f:
+        json.dump(done, f)
+    print(f"数据生成完成，用时 {time.perf_counter() - start_time:.1f}s")
+    return root
+
+# ================== 各工具的调用方式 ==================
+# 每个函数接收 (数据文件夹, 本次的输出文件夹)，在子进程中执行
+def _bench_dta2parquet(root, out):
+    from dta2parquet import convert_dta_to_parquet_parallel
+    convert_dta_to_parquet_parallel(os.path.join(root, 'dta'), out)
+
+def _bench_dta2csv(root, out):
+    from dta2csv import dta_columns_to_csv
+    dta_columns_to_csv(os.path.join(root, 'dta', 'qiye.dta'), ['cardnum', 'duty', 'publish_year'],
+                       os.path.join(out, 'columns.csv'))
+
+def _bench_csv2dta(root, out):
+    from csv2dta import csv_to_dta_streaming
+    csv_to_dta_streaming(os.path.join(root, 'qiye.csv'), os.path.join(out, 'qiye.dta'))
+
+def _bench_parquet2csv(root, out):
+    from parquet2csv import parquet_to_csv
+    parquet_to_csv(os.path.join(root, 'parquet'), os.path.join(out, 'qiye.csv'))
+
+def _bench_parquet2csv_parallel(root, out):
+    from parquet2csv import parquet_to_csv_parallel
+    parquet_to_csv_parallel(os.path.join(root, 'parquet'), os.path.join(out, 'qiye.csv'))
+
+def _bench_merge_parquet(root, out):
+    from 合并parquet文件 import merge_parquet_files_streaming
+    merge_parquet_files_streaming(os.path.join(root, 'parquet'), os.path.join(out, 'merged.parquet'))
+
+def _bench_split_csv(root, out):
+    from 均分csv文件 import split_csv_streaming
+    split_csv_streaming(os.path.join(root, 'qiye.csv'), os.path.join(out, 'part'), SPLIT_PARTS)
+
+def _bench_sample(root, out):
+    from 随机抽取csv文件特定列 import sample_file
+    sample_file(os.path.join(root, 'qiye.csv'), os.path.join(out, 'sample.csv'), SAMPLE_ROWS,
+                ['cardnum', 'duty', 'publish_year'], seed=1)
+
+def _bench_sample_parquet(root, out):
+    from 随机抽取csv文件特定列 import sample_file
+    sample_file(os.path.join(root, 'parquet', 'qiye_1.parquet'), os.path.join(out, 'sample.csv'), SAMPLE_ROWS,
+                ['cardnum', 'duty', 'publish_year'], seed=1)
+
+def _bench_clean(root, out):
+    from 企业数据清洗 import run_cleaning
+    run_cleaning(root, ['qiye.csv'], out, num_parts=SPLIT_PARTS)
+
+# 工具名 → (函数, 需要的数据格式)
+TOOLS = {
+    'dta2parquet': (_bench_dta2parquet, 'dta'),
+    'dta2csv': (_bench_dta2csv, 'dta'),
+    'csv2dta': (_bench_csv2dta, 'csv'),
+    'parquet2csv': (_bench_parquet2csv, 'parquet'),
+    'parquet2csv_parallel': (_bench_parquet2csv_parallel, 'parquet'),
+    'merge_parquet': (_bench_merge_parquet, 'parquet'),
+    'split_csv': (_bench_split_csv, 'csv'),
+    'sample': (_bench_sample, 'csv'),
+    'sample_parquet': (_bench_sample_parquet, 'parquet'),
+    'clean': (_bench_clean, 'csv'),
+}
+
+# ================== 运行 ==================
+def _run_in_child(tool, root, out, report_path):
+    """子进程中执行：开启运行报告，运行工具，写出报告"""
+    import run_report
+    run_report.enable(report_path, tool=tool)
+    try:
+        with run_report.run_stage(tool):
+            TOOLS[tool][0](root, out)
+    finally:
+        run_report.finish()
+
+def _summarize(report, tool):
+    """从运行报告中取出该工具的用时、数据量和峰值内存"""
+    stages = report['stages']
+    top = next(s for s in stages if s['name'] == tool and s['parent'] is None)
+    if top['status'] != 'ok':
+        raise RuntimeError(f"{tool} 运行失败: {top['status']}")
+    # 数据量取各阶段中的最大值（外层阶段和内层阶段统计的是同一份数据）
+    rows = max(max(s['rows_in'], s['rows_out']) for s in stages)
+    bytes_in = max(s['bytes_in'] for s in stages)
+    bytes_out = max(s['bytes_out'] for s in stages)
+    wall = top['wall_s']
+    peaks = [v for v in (report['peak_rss_mb'], report['peak_rss_children_mb']) if v is not None]
+    return {
+        'wall_s': wall,
+        'cpu_s': top['cpu_s'] + top['cpu_children_s'],
+        'rows': rows,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'rows_per_s': rows / wall if wall > 0 else None,
+        'mb_per_s': max(bytes_in, bytes_out) / 1024 / 1024 / wall if wall > 0 else None,
+        'peak_rss_mb': max(peaks) if peaks else None,
+    }
+
+def run_tool(tool, root, keep_outputs=False):
+    """在子进程中运行一次工具，返回该次的测量结果"""
+    out = tempfile.mkdtemp(prefix=f'bench_{tool}_')
+    report_path = os.path.join(out, 'run_report.json')
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '_child', tool, root, out, report_path],
+                       cwd=code_dir, check=True, stdout=subprocess.DEVNULL)
+        with open(report_path, 'r', encoding='utf-8') as f:
+            return _summarize(json.load(f), tool)
+    finally:
+        if not keep_outputs:
+            shutil.rmtree(out, ignore_errors=True)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(rows, tools=None, repeat=1, seed=0, data_dir='bench_data', output=None):
+    """
+    生成数据并依次测试各工具，每个工具运行repeat次
+    结果中wall_s为最短用时（最稳定），另记录所有次的用时；峰值内存取最大值
+    """
+    tools = list(tools or TOOLS)
+    unknown = [t for t in tools if t not in TOOLS]
+    if unknown:
+        raise ValueError(f"未知的工具: {unknown}，可用：{list(TOOLS)}")
+    formats = sorted({TOOLS[t][1] for t in tools})
+    root = os.path.abspath(generate_data(data_dir, rows, seed, formats))
+
+    results = {}
+    for tool in tools:
+        runs = []
+        for i in range(repeat):
+            runs.append(run_tool(tool, root))
+            print(f"  {tool} 第{i + 1}次: {runs[-1]['wall_s']:.2f}s")
+        best = min(runs, key=lambda r: r['wall_s'])
+        results[tool] = dict(best, walls=[r['wall_s'] for r in runs],
+                             peak_rss_mb=max((r['peak_rss_mb'] or 0) for r in runs) or None)
+        print(f"{tool:22s} {best['wall_s']:8.2f}s  {best['rows_per_s'] or 0:>12,.0f} 行/s  "
+              f"{best['mb_per_s'] or 0:8.1f} MB/s  峰值内存 {results[tool]['peak_rss_mb'] or 0:8.1f}MB")
+
+    data = {
+        'meta': {
+            'rows': rows,
+            'seed': seed,
+            'repeat': repeat,
+            'commit': _git_commit(),
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"基准测试结果已保存到: {output}")
+    return data
+
+# ================== 比较 ==================
+def compare_results(old, new, threshold=0.10):
+    """
+    比较两次结果（json路径或run_benchmarks的返回值）
+    用时或峰值内存比旧结果增加超过threshold（比例）的工具记为退化，返回退化的工具列表
+    """
+    if isinstance(old, str):
+        with open(old, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    if isinstance(new, str):
+        with open(new, 'r', encoding='utf-8') as f:
+            new = json.load(f)
+    if old['meta']['rows'] != new['meta']['rows']:
+        print(f"⚠️ 两次测试的数据量不同（{old['meta']['rows']:,} 行 vs {new['meta']['rows']:,} 行），结果不可直接比较")
+
+    print(f"旧: {old['meta'].get('commit')} {old['meta']['started_at']}  新: {new['meta'].get('commit')} {new['meta']['started_at']}")
+    print(f"{'工具':20s} {'旧用时':>9s} {'新用时':>9s} {'变化':>8s} {'旧内存MB':>9s} {'新内存MB':>9s} {'变化':>8s}")
+    regressions = []
+    for tool in sorted(set(old['results']) | set(new['results'])):
+        if tool not in old['results'] or tool not in new['results']:
+            print(f"{tool:22s} 只在{'新' if tool in new['results'] else '旧'}结果中")
+            continue
+        a, b = old['results'][tool], new['results'][tool]
+        wall_change = b['wall_s'] / a['wall_s'] - 1 if a['wall_s'] else 0.0
+        rss_change = (b['peak_rss_mb'] / a['peak_rss_mb'] - 1
+                      if a.get('peak_rss_mb') and b.get('peak_rss_mb') else 0.0)
+        flags = []
+        if wall_change > threshold:
+            flags.append("变慢")
+        if rss_change > threshold:
+            flags.append("内存增加")
+        if flags:
+            regressions.append(tool)
+        elif wall_change < -threshold:
+            flags.append("变快")
+        print(f"{tool:22s} {a['wall_s']:9.2f} {b['wall_s']:9.2f} {wall_change:+8.1%} "
+              f"{a.get('peak_rss_mb') or 0:9.1f} {b.get('peak_rss_mb') or 0:9.1f} {rss_change:+8.1%}  {' '.join(flags)}")
+    if regressions:
+        print(f"❌ 退化（超过{threshold:.0%}）: {', '.join(regressions)}")
+    else:
+        print(f"✅ 没有超过{threshold:.0%}的退化")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据处理工具的基准测试")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help="生成数据并测试各工具")
+    p.add_argument('--rows', type=int, default=1000000, help="合成数据的行数")
+    p.add_argument('--tools', help=f"要测试的工具，逗号分隔，默认全部：{','.join(TOOLS)}")
+    p.add_argument('--repeat', type=int, default=1, help="每个工具运行的次数（取最短用时）")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--data-dir', default='bench_data', help="合成数据保存位置")
+    p.add_argument('--output', help="结果json")
+
+    p = sub.add_parser('generate', help="只生成合成数据")
+    p.add_argument('--rows', type=int, default=1000000)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--data-dir', default='bench_data')
+
+    p = sub.add_parser('compare', help="比较两次结果，有退化时退出码为1")
+    p.add_argument('old', help="旧结果json")
+    p.add_argument('new', help="新结果json")
+    p.add_argument('--threshold', type=float, default=0.10, help="允许的增加比例，默认0.1")
+
+    p = sub.add_parser('_child')   # 内部使用：在子进程中运行一个工具
+    p.add_argument('tool')
+    p.add_argument('root')
+    p.add_argument('out')
+    p.add_argument('report_path')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        tools = [t.strip() for t in args.tools.split(',')] if args.tools else None
+        run_benchmarks(args.rows, tools, args.repeat, args.seed, args.data_dir, args.output)
+    elif args.command == 'generate':
+        generate_data(args.data_dir, args.rows, args.seed)
+    elif args.command == 'compare':
+        return 1 if compare_results(args.old, args.new, args.threshold) else 0
+    else:
+        _run_in_child(args.tool, args.root, args.out, args.report_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,37 @@
 # 这是一个获取符合火山方舟批量处理格式jsonl文件的程序
 # promptA为固定的提示词，promptB为变化的题干
-# json_object处可根据火山方舟的文档设定更具体的参数
+# json_object处（convert_engine.py的BatchJsonlSink）可根据火山方舟的文档设定更具体的参数
 # 将处理后的文件存入火山引擎的TOS对象存储，即可在批量推理界面调用
 
-import csv
-import json
-import os
-from tqdm import tqdm
- 
-# 输入的promptA
-promptA =""
+# 读取与写出由convert_engine完成（BatchJsonlSink），也可以直接用
+#   python convert_engine.py 输入.csv --to 输出.jsonl --text-column 9 --prompt-file prompt.txt --all-strings
 
-# 输入与输出文件的名称,输入文件为csv，输出文件为jsonl
-csv_file_name = r""
-output_jsonl_file = r""
-print(output_jsonl_file)
+from convert_engine import BatchJsonlSink, PartitionedSink, open_source, run_chain
+from run_report import current_stage, staged
 
-with open(csv_file_name, mode='r', encoding='utf-8') as csv_file, \
-     open(output_jsonl_file, mode='w', encoding='utf-8') as jsonl_file:
-        
-    csv_reader = csv.reader(csv_file)
-    # 读取CSV文件的标题行
-    headers = next(csv_reader, None)
-    for index, row in enumerate(tqdm(csv_reader)):
-         
-        # 获取promptB
-        promptB = row[9] if headers and row else None
-            
-        # 如果promptB存在，则创建JSON对象
-        if promptB:
-        # 生成唯一的custom_id
-            custom_id = f"request-{index + 1}"
-            json_object = {
-                "custom_id": custom_id,
-                "body": {
-                    "messages": [
-                        {"role": "system", "content": promptA},
-                        {"role": "user", "content": promptB}
-                    ],
-                    "temperature": 0
-                    }
-                }
-                
-            # 将JSON对象转换为字符串并写入JSONL文件
-            jsonl_file.write(json.dumps(json_object, ensure_ascii=False) + '\n')
\ No newline at end of file
+@staged('csv2jsonl')
+def csv_to_batch_jsonl(csv_file_name, output_jsonl_file, promptA, text_column=9, representatives_only=False):
+    """
+    把csv中text_column列（列序号或列名，默认第10列）作为promptB写成批量推理jsonl
+    custom_id为request-<行号>，文本为空的行跳过
+    representatives_only=True时只为近似重复簇的代表行（dup_representative列，见near_duplicates.py）生成请求，
+    关联结果时 企业数据清洗.py 会把代表行的结果填给同簇的其他行
+    """
+    keep_column = 'dup_representative' if representatives_only else None
+    sink = PartitionedSink(output_jsonl_file,
+                           lambda path: BatchJsonlSink(path, text_column, promptA, keep_column=keep_column))
+    stats = run_chain(open_source(csv_file_name, all_strings=True), [sink])
+    current_stage().add_files_in(csv_file_name)
+    print(f"已处理 {stats['rows']} 行，输出: {output_jsonl_file}")
+    return stats
+
+if __name__ == "__main__":
+    # 输入的promptA
+    promptA =""
+
+    # 输入与输出文件的名称,输入文件为csv，输出文件为jsonl
+    csv_file_name = r""
+    output_jsonl_file = r""
+    print(output_jsonl_file)
+
+    csv_to_batch_jsonl(csv_file_name, output_jsonl_file, promptA)
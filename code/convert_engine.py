@@ -0,0 +1,682 @@
+# 说明：
+# 这是一个通用的格式转换引擎，把csv、dta、parquet、jsonl都看作Arrow记录批次的读取端/写出端
+# 一条命令即可完成 读取 → 选择列/筛选/抽样/均分 → 写出（可同时写多个文件），全程流式，
+# 不再需要 dta2parquet → 合并parquet → parquet2csv → 均分csv → change2json 之间的中间文件
+# 输出路径中可以使用 {part}，配合 --split 为每一份生成单独的文件
+# 其他脚本共用这里的 align_to_schema、to_expression、filter_rows 和写出端：
+#   change2json.py、合并parquet文件.py 通过 open_source/run_chain 读写；
+#   dta2parquet.py（多进程逐文件转换）、parquet2csv.py 的并行写出（按行组分段多线程）、
+#   均分csv文件.py（按字节范围复制，不解析CSV）保留各自更快的专用流程
+# 示例：
+#   python convert_engine.py 输入文件夹 --split 10 --to 清洗数据_{part}.csv \
+#       --to qy-prompt1-{part}.jsonl --prompt-file prompt1.txt --text-column duty
+#   python convert_engine.py merged.parquet --columns name,cardnum --filter "publish_year>=2019" --to out.csv
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from csv_input import iter_arrow_batches, read_header, sniff_csv
+from run_report import current_stage, staged
+
+SUPPORTED_FORMATS = ('csv', 'dta', 'parquet', 'jsonl')
+
+def detect_format(path):
+    """根据扩展名判断格式，文件夹视为parquet数据集"""
+    if os.path.isdir(path):
+        return 'parquet'
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == 'json':
+        ext = 'jsonl'
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的文件格式: {path}（支持 {', '.join(SUPPORTED_FORMATS)}）")
+    return ext
+
+def align_to_schema(batch, schema, constants=None):
+    """
+    把批次对齐到给定schema：缺少的列补null，类型不同的列做转换，多余的列丢弃
+    constants为批次外的常量列（如hive分区列），{列名: 值}
+    """
+    if not constants and batch.schema.equals(schema):
+        return batch
+    arrays = []
+    for field in schema:
+        index = batch.schema.get_field_index(field.name)
+        if constants and field.name in constants:
+            arrays.append(pa.array([constants[field.name]] * batch.num_rows, type=field.type))
+        elif index == -1:
+            arrays.append(pa.nulls(batch.num_rows, type=field.type))
+        else:
+            column = batch.column(index)
+            arrays.append(column if column.type == field.type else column.cast(field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def to_expression(filters):
+    """筛选条件转换为pyarrow表达式，写法同pandas.read_parquet的filters"""
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    # pyarrow 10之前只有私有的_filters_to_expression
+    to_expr = getattr(pq, 'filters_to_expression', None) or pq._filters_to_expression
+    return to_expr(filters)
+
+def filter_columns(filters):
+    """筛选条件用到的列名；pyarrow表达式无法取出列名，返回None"""
+    if filters is None:
+        return []
+    if isinstance(filters, ds.Expression):
+        return None
+    # [(列, 操作, 值), ...] 或 [[(列, 操作, 值), ...], ...]（外层为"或"）
+    conditions = [c for group in filters for c in group] if filters and isinstance(filters[0], list) else filters
+    return list(dict.fromkeys(condition[0] for condition in conditions))
+
+def parse_filter_string(text):
+    """
+    解析命令行中的筛选条件，多个条件用逗号分隔（同时满足）
+    如 "publish_year>=2019,case_year>=2014,province==上海"
+    """
+    filters = []
+    for condition in text.split(','):
+        condition = condition.strip()
+        if not condition:
+            continue
+        for op in ('>=', '<=', '!=', '==', '>', '<', '='):
+            if op in condition:
+                column, value = condition.split(op, 1)
+                value = value.strip().strip('"').strip("'")
+                for cast in (int, float):
+                    try:
+                        value = cast(value)
+                        break
+                    except ValueError:
+                        continue
+                filters.append((column.strip(), '==' if op == '=' else op, value))
+                break
+        else:
+            raise ValueError(f"无法解析筛选条件: {condition}")
+    return filters
+
+# ================== 读取端 ==================
+def read_csv_batches(path, columns=None, encoding=None, all_strings=False, block_size=1 << 24):
+    """
+    流式读取CSV，每次解析block_size字节
+    encoding为None时由csv_input根据文件开头的样本判断编码和分隔符
+    all_strings=True时所有列按字符串读取（避免代码类列丢失前导0）
+    """
+    fmt = sniff_csv(path, encoding)
+    column_types = None
+    if all_strings:
+        column_types = {name: pa.string() for name in read_header(path, fmt)}
+    yield from iter_arrow_batches(path, fmt, columns, column_types, block_size)
+
+def read_parquet_batches(path, columns=None, filters=None, batch_size=65536):
+    """流式读取parquet文件或文件夹，筛选条件下推到扫描器"""
+    dataset = ds.dataset(path, format='parquet')
+    for batch in dataset.to_batches(columns=columns, filter=to_expression(filters), batch_size=batch_size):
+        yield batch
+
+def read_dta_batches(path, columns=None, chunksize=100000):
+    """分块读取.dta，类型映射与值标签处理与dta2parquet相同"""
+    import pyreadstat
+    from dta2parquet import build_arrow_schema, chunk_to_table
+
+    _, meta = pyreadstat.read_dta(path, metadataonly=True)
+    value_labels = meta.variable_value_labels or {}
+    schema = None
+    chunks = pyreadstat.read_file_in_chunks(
+        pyreadstat.read_dta, path,
+        chunksize=chunksize,
+        usecols=list(columns) if columns else None,
+        dates_as_pandas_datetime=True
+    )
+    for chunk, _ in chunks:
+        if columns:
+            chunk = chunk[list(columns)]
+        if schema is None:
+            schema = build_arrow_schema(chunk, meta)
+        yield from chunk_to_table(chunk, schema, value_labels).to_batches()
+
+def read_jsonl_batches(path, columns=None, batch_size=65536):
+    """逐行读取JSONL，每batch_size行组成一个批次，字段以第一批为准"""
+    schema = None
+    records = []
+
+    def flush():
+        nonlocal schema
+        batch = pa.RecordBatch.from_pylist(records) if schema is None else \
+            align_to_schema(pa.RecordBatch.from_pylist(records), schema)
+        if schema is None:
+            schema = batch.schema
+        return batch.select(columns) if columns else batch
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            records.append(json.loads(line))
+            if len(records) >= batch_size:
+                yield flush()
+                records = []
+    if records:
+        yield flush()
+
+def expand_inputs(paths):
+    """
+    展开输入路径：文件夹中的.dta/.csv/.jsonl展开为各个文件，
+    没有这些文件的文件夹作为parquet数据集保留
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    expanded = []
+    for path in paths:
+        path = str(path)
+        if os.path.isdir(path):
+            inner = sorted(f for f in os.listdir(path)
+                           if os.path.splitext(f)[1].lower() in ('.dta', '.csv', '.jsonl'))
+            expanded.extend(os.path.join(path, f) for f in inner)
+            if not inner:
+                expanded.append(path)  # parquet数据集
+        else:
+            expanded.append(path)
+    return expanded
+
+def open_source(paths, columns=None, filters=None, encoding=None, all_strings=False):
+    """
+    打开一个或多个输入（同一格式），依次输出记录批次
+    文件夹中的.dta/.csv/.jsonl会全部读取；parquet文件夹作为一个数据集读取
+    多个文件的schema以第一个文件为准对齐
+    筛选条件只对parquet下推，其他格式请使用filter_rows
+    """
+    schema = None
+    for path in expand_inputs(paths):
+        fmt = detect_format(path)
+        if fmt == 'csv':
+            batches = read_csv_batches(path, columns, encoding, all_strings)
+        elif fmt == 'parquet':
+            batches = read_parquet_batches(path, columns, filters)
+        elif fmt == 'dta':
+            batches = read_dta_batches(path, columns)
+        else:
+            batches = read_jsonl_batches(path, columns)
+        for batch in batches:
+            if schema is None:
+                schema = batch.schema
+            yield align_to_schema(batch, schema)
+
+def source_row_count(paths):
+    """不读取数据，从元数据获取parquet/dta的总行数，其他格式（包括.csv/.jsonl文件夹）返回None"""
+    total = 0
+    for path in expand_inputs(paths):
+        fmt = detect_format(path)
+        if fmt == 'parquet':
+            total += ds.dataset(path, format='parquet').count_rows()
+        elif fmt == 'dta':
+            import pyreadstat
+            _, meta = pyreadstat.read_dta(path, metadataonly=True)
+            total += meta.number_rows
+        else:
+            return None
+    return total
+
+# ================== 转换 ==================
+# 每个转换接收并输出 (part, batch) 流，part 为 None 表示尚未均分
+def select_columns(stream, columns):
+    for part, batch in stream:
+        yield part, batch.select(columns)
+
+def filter_rows(stream, filters):
+    expression = to_expression(filters)
+    for part, batch in stream:
+        table = ds.dataset(pa.Table.from_batches([batch])).to_table(filter=expression)
+        for filtered in table.to_batches():
+            if filtered.num_rows:
+                yield part, filtered
+
+def reservoir_sample(stream, n, seed=None):
+    """
+    单遍无放回等概率抽样：每行赋予一个随机键，保留键最小的n行
+    内存只与n有关；相同seed结果可复现；输出按原始行顺序排列
+    """
+    if n <= 0:
+        return
+    rng = np.random.default_rng(seed)
+    kept = None
+    kept_keys = np.empty(0)
+    kept_pos = np.empty(0, dtype=np.int64)
+    offset = 0
+    for _, batch in stream:
+        keys = rng.random(batch.num_rows)
+        if len(kept_keys) >= n:
+            candidates = np.nonzero(keys < kept_keys.max())[0]
+        else:
+            candidates = np.arange(batch.num_rows)
+        if len(candidates):
+            chosen = pa.Table.from_batches([batch]).take(pa.array(candidates))
+            table = chosen if kept is None else pa.concat_tables([kept, chosen])
+            all_keys = np.concatenate([kept_keys, keys[candidates]])
+            all_pos = np.concatenate([kept_pos, candidates + offset])
+            if len(all_keys) > n:
+                smallest = np.argpartition(all_keys, n - 1)[:n]
+                table = table.take(pa.array(smallest))
+                all_keys, all_pos = all_keys[smallest], all_pos[smallest]
+            kept, kept_keys, kept_pos = table.combine_chunks(), all_keys, all_pos
+        offset += batch.num_rows
+
+    if kept is None or kept.num_rows == 0:
+        return
+    order = np.argsort(kept_pos, kind='stable')
+    for batch in kept.take(pa.array(order)).to_batches():
+        yield None, batch
+
+def split_parts(stream, n, total_rows):
+    """
+    按行数均分为n份，与均分csv文件.py的分配方式一致：每份 ceil(total/n) 行，part从1开始
+    """
+    rows_per_part = max(1, -(-total_rows // n))
+    position = 0
+    for _, batch in stream:
+        start = 0
+        while start < batch.num_rows:
+            part = position // rows_per_part
+            take = min(batch.num_rows - start, (part + 1) * rows_per_part - position)
+            yield part + 1, batch.slice(start, take)
+            start += take
+            position += take
+
+# ================== 写出端 ==================
+class CsvSink:
+    """
+    CSV写出端，bom=True时写入utf_8_sig的BOM
+    给出schema时，没有任何数据也会写出只有表头的文件
+    """
+    def __init__(self, path, bom=False, schema=None):
+        self.path = path
+        self.bom = bom
+        self.schema = schema
+        self._file = None
+        self._writer = None
+
+    def _open(self, schema):
+        self._file = open(self.path, 'wb')
+        if self.bom:
+            self._file.write(b'\xef\xbb\xbf')
+        try:
+            options = pacsv.WriteOptions(quoting_style='needed')
+        except TypeError:
+            options = pacsv.WriteOptions()
+        self._writer = pacsv.CSVWriter(self._file, schema, write_options=options)
+
+    def write(self, batch):
+        if self._writer is None:
+            self._open(self.schema or batch.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is None and self.schema is not None:
+            self._open(self.schema)
+        if self._writer is not None:
+            self._writer.close()
+            self._file.close()
+
+class ParquetSink:
+    """
+    Parquet写出端，攒够row_group_size行再写一个行组
+    给出schema时，没有任何数据也会写出只有schema的文件
+    """
+    def __init__(self, path, row_group_size=500000, schema=None):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = schema
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending), row_group_size=self.row_group_size)
+            self._pending, self._pending_rows = [], 0
+
+    def write(self, batch):
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self.schema or batch.schema)
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def close(self):
+        if self._writer is None and self.schema is not None:
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+
+class JsonlSink:
+    """每行一个JSON对象"""
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def write(self, batch):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        for record in batch.to_pylist():
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+class BatchJsonlSink:
+    """
+    火山方舟批量推理格式的JSONL（与change2json.py相同）
+    custom_id 为 request-<行号>，行号从1开始，文本为空的行跳过但仍占用行号，
+    因此与企业数据清洗.py中每个分块的local_id一一对应
+    指定keep_column时只为该列为True的行生成请求（如近似重复检测的dup_representative），其他行同样占用行号
+    """
+    def __init__(self, path, text_column, prompt, temperature=0, keep_column=None):
+        self.path = path
+        self.text_column = text_column
+        self.prompt = prompt
+        self.temperature = temperature
+        self.keep_column = keep_column
+        self._file = None
+        self._row = 0
+
+    def write(self, batch):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        column = self.text_column
+        if not isinstance(column, int):
+            column = batch.schema.get_field_index(column)
+            if column == -1:
+                raise ValueError(f"列 '{self.text_column}' 不存在，可用列名：{batch.schema.names}")
+        texts = batch.column(column).to_pylist()
+        if self.keep_column is None:
+            keep = [True] * len(texts)
+        else:
+            index = batch.schema.get_field_index(self.keep_column)
+            if index == -1:
+                raise ValueError(f"列 '{self.keep_column}' 不存在，可用列名：{batch.schema.names}")
+            # CSV按字符串读入时为 'True'/'False'
+            keep = [str(value).lower() in ('true', '1') for value in batch.column(index).to_pylist()]
+        for text, wanted in zip(texts, keep):
+            self._row += 1
+            if not text or not wanted:
+                continue
+            json_object = {
+                "custom_id": f"request-{self._row}",
+                "body": {
+                    "messages": [
+                        {"role": "system", "content": self.prompt},
+                        {"role": "user", "content": str(text)}
+                    ],
+                    "temperature": self.temperature
+                }
+            }
+            self._file.write(json.dumps(json_object, ensure_ascii=False) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+class DtaSink:
+    """
+    DTA写出端：Stata格式需要整表写出，因此先收集全部批次，关闭时一次写出
+    （只适合能放进内存的结果，如抽样或筛选后的数据）
+    """
+    def __init__(self, path):
+        self.path = path
+        self._batches = []
+
+    def write(self, batch):
+        self._batches.append(batch)
+
+    def close(self):
+        if self._batches:
+            df = pa.Table.from_batches(self._batches).to_pandas()
+            self._batches = []
+            df.to_stata(self.path, write_index=False, version=118)
+
+class PartitionedSink:
+    """
+    均分时每一份写入单独的文件（路径中的 {part} 替换为份号，part变化时关闭上一份）
+    不均分时（part为None）原样使用路径；只替换 {part}，路径中的其他花括号保持不变
+    """
+    def __init__(self, path_template, factory):
+        self.path_template = path_template
+        self.factory = factory
+        self.paths = []
+        self._part = None
+        self._sink = None
+
+    def _open(self, path):
+        self.paths.append(path)
+        self._sink = self.factory(path)
+
+    def _close_current(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def write(self, batch, part):
+        if part != self._part or self._sink is None:
+            self._close_current()
+            self._open(self.path_template if part is None else self.path_template.replace('{part}', str(part)))
+            self._part = part
+        self._sink.write(batch)
+
+    def close(self):
+        if not self.paths and '{part}' not in self.path_template:
+            # 没有任何数据：仍交给写出端关闭（给出schema的csv/parquet写出端会写出空文件）
+            self._open(self.path_template)
+        self._close_current()
+
+def open_sink(path, text_column=None, prompt=None, bom=False, row_group_size=500000, schema=None):
+    """
+    根据扩展名创建写出端；jsonl在给出text_column和prompt时写为批量推理格式
+    schema: csv/parquet在没有数据时仍按该schema写出空文件
+    """
+    fmt = detect_format(path)
+    if fmt == 'csv':
+        factory = lambda p: CsvSink(p, bom=bom, schema=schema)
+    elif fmt == 'parquet':
+        factory = lambda p: ParquetSink(p, row_group_size, schema)
+    elif fmt == 'dta':
+        factory = DtaSink
+    elif text_column is not None and prompt is not None:
+        factory = lambda p: BatchJsonlSink(p, text_column, prompt)
+    else:
+        factory = JsonlSink
+    return PartitionedSink(path, factory)
+
+# ================== 执行 ==================
+def run_chain(source, sinks, transforms=(), split=None, total_rows=None, recount=None):
+    """
+    执行一条转换链：source → transforms → (split) → 所有sinks
+    参数:
+    source: 记录批次迭代器（open_source的结果）
+    sinks: open_sink创建的写出端列表
+    transforms: 依次作用的转换函数，每个接收并返回 (part, batch) 流
+    split (int): 均分的份数，需要total_rows；total_rows为None时调用recount()统计一遍行数
+    返回统计信息（行数、耗时、输出字节数、输出文件）
+    """
+    start = time.perf_counter()
+    stage = current_stage()
+
+    def counted(batches):
+        for batch in batches:
+            stage.add(rows_in=batch.num_rows)
+            yield None, batch
+
+    stream = counted(source)
+    for transform in transforms:
+        stream = transform(stream)
+    if split:
+        if total_rows is None:
+            if recount is None:
+                raise ValueError("均分需要总行数，请提供total_rows或recount")
+            total_rows = recount()
+        stream = split_parts(stream, split, total_rows)
+
+    rows = 0
+    try:
+        for part, batch in stream:
+            rows += batch.num_rows
+            for sink in sinks:
+                sink.write(batch, part)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    # 没有数据且不写空文件的写出端不会产生文件
+    paths = [p for sink in sinks for p in sink.paths if os.path.exists(p)]
+    bytes_out = sum(os.path.getsize(p) for p in paths)
+    stage.add(rows_out=rows, bytes_out=bytes_out)
+    return {
+        'rows': rows,
+        'seconds': time.perf_counter() - start,
+        'bytes_out': bytes_out,
+        'outputs': paths,
+    }
+
+@staged('convert')
+def convert(inputs, outputs, columns=None, filters=None, sample=None, seed=None, split=None,
+            text_column=None, prompt=None, bom=False, encoding=None, all_strings=False):
+    """
+    一次完成读取、选择、筛选、抽样、均分和写出，供其他脚本在进程内调用
+    outputs 中的路径可以包含 {part}（配合split使用）
+    """
+    if isinstance(outputs, str):
+        outputs = [outputs]
+    if split and any('{part}' not in path for path in outputs):
+        raise ValueError("使用split时输出路径需要包含 {part}")
+    inputs = [inputs] if isinstance(inputs, (str, os.PathLike)) else list(inputs)
+    # 按展开后的文件判断：.csv/.jsonl文件夹不能下推
+    pushdown = filters is not None and all(detect_format(p) == 'parquet' for p in expand_inputs(inputs))
+
+    read_columns = columns
+    transforms = []
+    if filters is not None and not pushdown:
+        # 不能下推时：读取选择的列与筛选用到的列，筛选后再只保留选择的列
+        if columns is not None:
+            needed = filter_columns(filters)
+            read_columns = None if needed is None else list(dict.fromkeys([*columns, *needed]))
+        transforms.append(lambda stream: filter_rows(stream, filters))
+        if columns is not None:
+            transforms.append(lambda stream: select_columns(stream, columns))
+
+    def fresh_source():
+        return open_source(inputs, columns=read_columns, filters=filters if pushdown else None,
+                           encoding=encoding, all_strings=all_strings)
+    if sample:
+        transforms.append(lambda stream: reservoir_sample(stream, sample, seed))
+
+    def recount():
+        # 筛选或无法从元数据得到行数时，先流式统计一遍（不写盘）
+        stream = ((None, batch) for batch in fresh_source())
+        for transform in transforms:
+            stream = transform(stream)
+        return sum(batch.num_rows for _, batch in stream)
+
+    total_rows = None
+    if split and filters is None:
+        total_rows = source_row_count(inputs)
+        if total_rows is not None and sample:
+            total_rows = min(total_rows, sample)
+
+    current_stage().add_files_in(inputs)
+    sinks = [open_sink(path, text_column, prompt, bom) for path in outputs]
+    return run_chain(fresh_source(), sinks, transforms, split=split, total_rows=total_rows, recount=recount)
+
+def compare_chain(dta_folder, work_dir, n_parts, text_column, prompt):
+    """
+    比较原有的多脚本流程与一次流式转换在完整链路上的耗时和写盘量：
+    原流程：dta2parquet → 合并parquet → parquet2csv → 均分csv → change2json（每份）
+    新流程：dta文件夹 → 均分 → 每份的csv与jsonl
+    """
+    import shutil
+    from dta2parquet import convert_dta_to_parquet_parallel
+    from 合并parquet文件 import merge_parquet_files_streaming
+    from parquet2csv import parquet_to_csv
+    from 均分csv文件 import split_csv_with_header
+    from change2json import csv_to_batch_jsonl
+
+    def folder_bytes(folder):
+        return sum(os.path.getsize(os.path.join(root, f))
+                   for root, _, files in os.walk(folder) for f in files)
+
+    legacy_dir = os.path.join(work_dir, 'legacy')
+    engine_dir = os.path.join(work_dir, 'engine')
+    for folder in (legacy_dir, engine_dir):
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    start = time.perf_counter()
+    convert_dta_to_parquet_parallel(dta_folder, os.path.join(legacy_dir, 'parquet'))
+    merged = os.path.join(legacy_dir, 'merged.parquet')
+    merge_parquet_files_streaming(os.path.join(legacy_dir, 'parquet'), merged)
+    merged_csv = os.path.join(legacy_dir, 'merged.csv')
+    parquet_to_csv(merged, merged_csv)
+    prefix = os.path.join(legacy_dir, 'part')
+    split_csv_with_header(merged_csv, prefix, n_parts)
+    for i in range(1, n_parts + 1):
+        csv_to_batch_jsonl(f"{prefix}_{i}.csv", f"{prefix}-{i}.jsonl", prompt, text_column)
+    legacy = {'seconds': time.perf_counter() - start, 'bytes_written': folder_bytes(legacy_dir)}
+
+    stats = convert(dta_folder, [os.path.join(engine_dir, 'part_{part}.csv'),
+                                 os.path.join(engine_dir, 'part-{part}.jsonl')],
+                    split=n_parts, text_column=text_column, prompt=prompt)
+    engine = {'seconds': stats['seconds'], 'bytes_written': folder_bytes(engine_dir)}
+
+    print("="*60)
+    for name, r in (('原流程', legacy), ('流式引擎', engine)):
+        print(f"{name}: 用时 {r['seconds']:.1f}s, 写盘 {r['bytes_written'] / 1024 / 1024:.1f}MB")
+    saved = legacy['bytes_written'] - engine['bytes_written']
+    print(f"节省写盘 {saved / 1024 / 1024:.1f}MB")
+    print("="*60)
+    return {'legacy': legacy, 'engine': engine}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="csv / dta / parquet / jsonl 流式转换")
+    parser.add_argument('inputs', nargs='+', help="输入文件或文件夹（同一格式）")
+    parser.add_argument('--to', dest='outputs', action='append', required=True,
+                        help="输出文件，可重复；扩展名决定格式，均分时用 {part} 表示份号")
+    parser.add_argument('--columns', help="选择列，逗号分隔")
+    parser.add_argument('--filter', help="筛选条件，如 publish_year>=2019,case_year>=2014")
+    parser.add_argument('--sample', type=int, help="随机抽取的行数")
+    parser.add_argument('--seed', type=int, help="抽样随机种子")
+    parser.add_argument('--split', type=int, help="均分的份数")
+    parser.add_argument('--text-column', help="写批量推理jsonl时作为题干的列（列名或列序号）")
+    parser.add_argument('--prompt-file', help="写批量推理jsonl时的系统提示词文件")
+    parser.add_argument('--bom', action='store_true', help="CSV写入BOM（utf_8_sig）")
+    parser.add_argument('--encoding', default=None, help="CSV输入编码，默认自动判断")
+    parser.add_argument('--all-strings', action='store_true', help="CSV所有列按字符串读取")
+    args = parser.parse_args(argv)
+
+    prompt = None
+    if args.prompt_file:
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            prompt = f.read().strip()
+    text_column = args.text_column
+    if text_column is not None and text_column.isdigit():
+        text_column = int(text_column)
+
+    stats = convert(
+        args.inputs, args.outputs,
+        columns=[c.strip() for c in args.columns.split(',')] if args.columns else None,
+        filters=parse_filter_string(args.filter) if args.filter else None,
+        sample=args.sample, seed=args.seed, split=args.split,
+        text_column=text_column, prompt=prompt, bom=args.bom,
+        encoding=args.encoding, all_strings=args.all_strings,
+    )
+    print(f"转换完成！共 {stats['rows']} 行，用时 {stats['seconds']:.1f}s，"
+          f"写出 {stats['bytes_out'] / 1024 / 1024:.1f}MB 到 {len(stats['outputs'])} 个文件")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
+import os
+import time
+import tracemalloc
 import pandas as pd
 import pyreadstat
+from csv_input import CsvFormat, read_csv_pandas, sniff_csv
+from run_report import current_stage, staged
 
-def csv_to_dta_advanced(csv_file_path, dta_file_path, encoding='utf-8'):
+STATA_STR_LIMIT = 244       # 普通字符串列的截断长度（与旧版本一致）
+
+def csv_to_dta_advanced(csv_file_path, dta_file_path, encoding=None):
     """  
     参数:
     csv_file_path (str): 输入的CSV文件路径
     dta_file_path (str): 输出的DTA文件路径
-    encoding (str): 文件编码格式
+    encoding (str): 文件编码格式，None为自动判断
     """
     try:
         # 读取CSV文件
-        df = pd.read_csv(csv_file_path, encoding=encoding)
+        df = read_csv_pandas(csv_file_path, sniff_csv(csv_file_path, encoding))
         
         # 显示数据基本信息
         print(f"数据形状: {df.shape}")
@@ -31,7 +38,7 @@ def csv_to_dta_advanced(csv_file_path, dta_file_path, encoding='utf-8'):
         # 使用正确的参数
         pyreadstat.write_dta(df, dta_file_path)
         
-        print(f"转换成功！")
+        print("转换成功！")
         print(f"输入文件: {csv_file_path}")
         print(f"输出文件: {dta_file_path}")
         
@@ -43,6 +50,138 @@ def csv_to_dta_advanced(csv_file_path, dta_file_path, encoding='utf-8'):
         print(f"转换过程中出现错误: {str(e)}")
         import traceback
         traceback.print_exc()
+
+def infer_stata_schema(csv_file_path, encoding=None, sample_rows=10000, string_columns=None):
+    """
+    读取CSV前sample_rows行推断每列的读取类型
+    数值列统一按float64读取（兼容后续出现的缺失值），其余按字符串读取
+    全部缺失的列和string_columns中指定的列（如代码类列，避免丢失前导0）按字符串读取
+    encoding可以是编码名，也可以是csv_input.sniff_csv的结果
+    """
+    fmt = encoding if isinstance(encoding, CsvFormat) else sniff_csv(csv_file_path, encoding)
+    sample = read_csv_pandas(csv_file_path, fmt, nrows=sample_rows)
+    string_columns = set(string_columns or [])
+    schema = {}
+    for col in sample.columns:
+        series = sample[col]
+        if (col not in string_columns
+                and pd.api.types.is_numeric_dtype(series)
+                and not pd.api.types.is_bool_dtype(series)
+                and series.notna().any()):
+            schema[col] = 'float64'
+        else:
+            schema[col] = 'object'
+    return schema
+
+def _downcast_integers(df):
+    """没有缺失值且全为整数的数值列就地转为最小的整数类型（Stata的byte/int/long）"""
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != 'float64' or series.isna().any():
+            continue
+        # Stata没有int64，超出long范围的保持double
+        if series.abs().max() < 2**31 and (series % 1 == 0).all():
+            df[col] = pd.to_numeric(series, downcast='integer')
+
+@staged('csv2dta')
+def csv_to_dta_streaming(csv_file_path, dta_file_path, encoding=None, sample_rows=10000,
+                         string_columns=None, str_limit=STATA_STR_LIMIT, use_strl=True):
+    """
+    低内存的CSV → DTA转换
+    参数:
+    csv_file_path (str): 输入的CSV文件路径
+    dta_file_path (str): 输出的DTA文件路径
+    encoding (str): 文件编码格式，None为根据文件开头的样本自动判断（同时判断分隔符）
+    sample_rows (int): 用于推断列类型的抽样行数
+    string_columns (list): 强制按字符串读取的列
+    str_limit (int): 普通字符串列的最大长度
+    use_strl (bool): True时超过str_limit的列写为strL（不截断），False时截断到str_limit
+
+    与csv_to_dta_advanced的区别：
+    1. 按抽样推断的类型一次性读取，不再做全表类型推断，也没有object数值列
+    2. 字符串截断使用向量化的.str.slice，缺失值保持缺失（不会变成"nan"），只替换需要截断的列
+    3. 不再对每列做where(notnull)复制
+    4. 写出后只读取元数据验证行列数
+    Stata格式需要整表写出，所以内存上限是数据表本身，转换过程中不再产生额外的整表副本
+    """
+    fmt = sniff_csv(csv_file_path, encoding)
+    schema = infer_stata_schema(csv_file_path, fmt, sample_rows, string_columns)
+    try:
+        df = read_csv_pandas(csv_file_path, fmt, dtype=schema)
+    except UnicodeDecodeError:
+        # 编码错误也是ValueError的子类，不是列类型的问题，原样抛出
+        raise
+    except ValueError as e:
+        raise ValueError(f"抽样推断的列类型与后续数据不符（{e}），请增大sample_rows或在string_columns中指定该列") from e
+
+    print(f"数据形状: {df.shape}")
+    print(f"列名: {list(df.columns)}")
+
+    strl_columns = []
+    for col, kind in schema.items():
+        if kind != 'object':
+            continue
+        max_len = df[col].str.len().max()
+        if pd.isna(max_len):
+            # 整列缺失：to_stata不接受只有空值的object列，写为空字符串（Stata的字符串缺失值）
+            df[col] = df[col].fillna('')
+            continue
+        if max_len <= str_limit:
+            continue
+        if use_strl:
+            # strL列不能包含NaN，Stata中空字符串即为字符串缺失值
+            df[col] = df[col].fillna('')
+            strl_columns.append(col)
+        else:
+            df[col] = df[col].str.slice(0, str_limit)
+
+    _downcast_integers(df)
+    print(f"数据类型:\n{df.dtypes}")
+    if strl_columns:
+        print(f"以下列超过{str_limit}个字符，写为strL: {strl_columns}")
+
+    # version 118 支持UTF-8（中文列名和内容）与strL
+    df.to_stata(dta_file_path, write_index=False, version=118, convert_strl=strl_columns)
+    n_rows, n_cols = df.shape
+    del df
+
+    print("转换成功！")
+    print(f"输入文件: {csv_file_path}")
+    print(f"输出文件: {dta_file_path}")
+
+    # 只读取元数据验证输出文件
+    _, meta = pyreadstat.read_dta(dta_file_path, metadataonly=True)
+    print(f"验证: 输出的DTA文件包含 {meta.number_rows} 行和 {meta.number_columns} 列")
+    if meta.number_rows != n_rows or meta.number_columns != n_cols:
+        raise ValueError(f"验证失败：应为 {n_rows} 行 {n_cols} 列")
+    stage = current_stage()
+    stage.add(rows_in=n_rows, rows_out=n_rows)
+    stage.add_files_in(csv_file_path)
+    stage.add_files_out(dta_file_path)
+    return meta
+
+def compare_csv2dta(csv_file_path, output_dir, encoding=None):
+    """
+    对同一个CSV分别运行旧函数与新函数，比较峰值内存（tracemalloc）和耗时
+    输出文件为output_dir下的legacy.dta与streaming.dta
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    for name, func in [('legacy', csv_to_dta_advanced), ('streaming', csv_to_dta_streaming)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(csv_file_path, os.path.join(output_dir, f'{name}.dta'), encoding=encoding)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {'seconds': seconds, 'peak_mb': peak / 1024 / 1024}
+
+    print("="*50)
+    for name, r in results.items():
+        print(f"{name:>10}: 用时 {r['seconds']:.2f}s, 峰值内存 {r['peak_mb']:.1f}MB")
+    print("="*50)
+    return results
+
 # 使用示例
 if __name__ == "__main__":
     csv_f = input("输入csv文件位置：").replace("\"","")
@@ -50,4 +189,4 @@ if __name__ == "__main__":
     csv_file = rf"{csv_f}"
     dta_file = rf"{dta_f}"
     
-    csv_to_dta_advanced(csv_file, dta_file)
\ No newline at end of file
+    csv_to_dta_streaming(csv_file, dta_file)
\ No newline at end of file
@@ -0,0 +1,178 @@
+# 说明：
+# 所有脚本共用的CSV读取层
+# 只读取文件开头的一段字节（默认1MB）判断编码和分隔符，然后流式读取整个文件，每个文件只读一遍：
+#   - 编码：先看BOM（utf-8-sig / utf-16 / utf-32），否则依次尝试 utf-8 → gbk，都不行时用latin-1
+#   - 分隔符：用表头行判断（, 制表符 ; |），分出字段最多的那个，默认逗号
+#   - 样本之后才出现无法解码的字节时，才换下一个候选编码从头重读，已经返回的行会被跳过
+# 提供csv模块、pyarrow.csv、pandas三种读取方式
+
+import codecs
+import csv
+from collections import namedtuple
+
+SAMPLE_SIZE = 1 << 20               # 判断编码用的样本字节数
+CANDIDATE_ENCODINGS = ('utf-8', 'gbk', 'latin-1')
+DELIMITERS = (',', '\t', ';', '|')
+
+# encoding: 读取时使用的编码；fallbacks: 解码失败时依次改用的编码；delimiter/quotechar: 分隔符与引号
+CsvFormat = namedtuple('CsvFormat', ['encoding', 'fallbacks', 'delimiter', 'quotechar'])
+
+def detect_encoding_from_sample(sample):
+    """根据字节样本判断编码，返回 (编码, 后备编码元组)"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig', ('gbk', 'latin-1')
+    # utf-32的BOM以utf-16 LE的BOM开头，需要先判断
+    if sample.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        return 'utf-32', ()
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16', ()
+    for i, encoding in enumerate(CANDIDATE_ENCODINGS):
+        try:
+            # 样本末尾可能截断了一个多字节字符，用增量解码器忽略末尾不完整的字符
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding, CANDIDATE_ENCODINGS[i + 1:]
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1', ()
+
+def _detect_delimiter(text):
+    """用第一条记录判断分隔符"""
+    first_line = text.splitlines(True)[:1]
+    best, best_fields = ',', 0
+    for delimiter in DELIMITERS:
+        row = next(csv.reader(first_line, delimiter=delimiter), [])
+        if len(row) > best_fields:
+            best, best_fields = delimiter, len(row)
+    return best
+
+def sniff_csv(path, encoding=None, delimiter=None, sample_size=SAMPLE_SIZE):
+    """
+    读取文件开头的sample_size字节判断编码和分隔符，返回CsvFormat
+    指定encoding或delimiter时不再判断对应的项
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    if encoding:
+        fallbacks = ()
+    else:
+        encoding, fallbacks = detect_encoding_from_sample(sample)
+    if not delimiter:
+        text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+        delimiter = _detect_delimiter(text.lstrip('\ufeff'))
+    return CsvFormat(encoding, tuple(fallbacks), delimiter, '"')
+
+def detect_encoding(path, sample_size=SAMPLE_SIZE):
+    """只读取文件开头的一段字节判断编码"""
+    with open(path, 'rb') as f:
+        return detect_encoding_from_sample(f.read(sample_size))[0]
+
+def _format(path, fmt):
+    return fmt if fmt is not None else sniff_csv(path)
+
+def _with_fallback(path, fmt, read):
+    """
+    依次用fmt.encoding和后备编码调用read(编码, 已返回的条数)，
+    read是生成器，解码失败时换下一个编码重新读取，并跳过已经返回的条数
+    """
+    encodings = (fmt.encoding,) + fmt.fallbacks
+    done = 0
+    for i, encoding in enumerate(encodings):
+        try:
+            for item, count in read(encoding, done):
+                done += count
+                yield item
+            return
+        except UnicodeDecodeError as e:
+            if i == len(encodings) - 1:
+                raise
+            print(f"警告：{path} 按 {encoding} 解码失败（{e.reason}），改用 {encodings[i + 1]} 重新读取")
+
+def iter_rows(path, fmt=None, skip_header=False):
+    """用csv模块流式逐行读取（包含表头，skip_header=True时跳过表头）"""
+    fmt = _format(path, fmt)
+
+    def read(encoding, done):
+        with open(path, 'r', newline='', encoding=encoding) as f:
+            reader = csv.reader(f, delimiter=fmt.delimiter, quotechar=fmt.quotechar)
+            for k, row in enumerate(reader):
+                if k >= done:
+                    yield row, 1
+
+    rows = _with_fallback(path, fmt, read)
+    if skip_header:
+        next(rows, None)
+    return rows
+
+def read_header(path, fmt=None):
+    """只读取表头"""
+    fmt = _format(path, fmt)
+    with open(path, 'r', newline='', encoding=fmt.encoding, errors='replace') as f:
+        return next(csv.reader(f, delimiter=fmt.delimiter, quotechar=fmt.quotechar), [])
+
+def open_text(path, fmt=None, errors='replace'):
+    """按判断出的编码打开文本（newline=''，可直接交给csv.reader）"""
+    fmt = _format(path, fmt)
+    return open(path, 'r', newline='', encoding=fmt.encoding, errors=errors)
+
+def arrow_encoding(encoding):
+    """pyarrow原生支持utf8（并自动跳过BOM），其他编码会经过Python转码"""
+    return 'utf8' if encoding.lower().replace('-', '_') in ('utf_8', 'utf8', 'utf_8_sig') else encoding
+
+def iter_arrow_batches(path, fmt=None, columns=None, column_types=None, block_size=1 << 24):
+    """用pyarrow.csv流式读取，每次解析block_size字节，返回RecordBatch"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    fmt = _format(path, fmt)
+
+    def read(encoding, done):
+        try:
+            reader = pacsv.open_csv(
+                path,
+                read_options=pacsv.ReadOptions(encoding=arrow_encoding(encoding), block_size=block_size),
+                parse_options=pacsv.ParseOptions(delimiter=fmt.delimiter, quote_char=fmt.quotechar,
+                                                 newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(include_columns=columns, column_types=column_types),
+            )
+            seen = 0
+            for batch in reader:
+                if seen + batch.num_rows > done:
+                    skip = max(0, done - seen)
+                    yield batch.slice(skip), batch.num_rows - skip
+                seen += batch.num_rows
+        except pa.ArrowInvalid as e:
+            # pyarrow按utf8读取时，非法字节报的是ArrowInvalid
+            if 'utf8' not in str(e).lower():
+                raise
+            raise UnicodeDecodeError(encoding, b'', 0, 1, str(e)) from e
+
+    return _with_fallback(path, fmt, read)
+
+def read_csv_pandas(path, fmt=None, **kwargs):
+    """pandas.read_csv，编码和分隔符使用判断结果（kwargs中不要再传encoding和sep）"""
+    import pandas as pd
+    fmt = _format(path, fmt)
+    encodings = (fmt.encoding,) + fmt.fallbacks
+    for i, encoding in enumerate(encodings):
+        try:
+            return pd.read_csv(path, encoding=encoding, sep=fmt.delimiter, quotechar=fmt.quotechar, **kwargs)
+        except UnicodeDecodeError as e:
+            if i == len(encodings) - 1:
+                raise
+            print(f"警告：{path} 按 {encoding} 解码失败（{e.reason}），改用 {encodings[i + 1]} 重新读取")
+
+def read_csv_chunks(path, chunksize, fmt=None, **kwargs):
+    """分块的pandas.read_csv，逐块返回DataFrame"""
+    import pandas as pd
+    fmt = _format(path, fmt)
+
+    def read(encoding, done):
+        seen = 0
+        with pd.read_csv(path, encoding=encoding, sep=fmt.delimiter, quotechar=fmt.quotechar,
+                         chunksize=chunksize, **kwargs) as reader:
+            for chunk in reader:
+                if seen + len(chunk) > done:
+                    skip = max(0, done - seen)
+                    yield chunk.iloc[skip:], len(chunk) - skip
+                seen += len(chunk)
+
+    return _with_fallback(path, fmt, read)
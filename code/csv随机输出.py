@@ -1,32 +1,124 @@
 import csv
+import hashlib
+import json
+import mmap
 import random
 import keyboard
 import os
 import sys
+import numpy as np
+from csv_input import iter_rows, sniff_csv
+from csv_ranges import header_end, record_offsets, supports_byte_scan
+
+INDEX_SUFFIX = '.rowidx.npy'        # 行偏移索引（uint64数组），保存在CSV文件旁边
+INDEX_META_SUFFIX = '.rowidx.json'  # 索引对应的文件指纹、编码与分隔符
 
 def read_csv_file(file_path):
     """读取CSV文件并返回数据列表"""
-    data = []
     try:
-        # 尝试使用不同编码读取文件，解决中文乱码问题
-        encodings = ['utf-8', 'gbk', 'latin-1']
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', newline='', encoding=encoding) as file:
-                    reader = csv.reader(file)
-                    header = next(reader)  # 获取表头
-                    data.append(header)    # 将表头作为第一行存入数据
-                    
-                    for row in reader:
-                        data.append(row)
-                print(f"成功读取CSV文件，共 {len(data)-1} 行数据（不含表头），使用编码: {encoding}")
-                return data
-            except UnicodeDecodeError:
-                continue
+        # 编码由文件开头的样本判断，只读取一遍文件（表头作为第一行）
+        fmt = sniff_csv(file_path)
+        data = list(iter_rows(file_path, fmt))
+        if not data:
+            print(f"错误：文件 '{file_path}' 为空")
+            return None
+        print(f"成功读取CSV文件，共 {len(data)-1} 行数据（不含表头），使用编码: {fmt.encoding}")
+        return data
         
-        print(f"错误：无法解码文件 '{file_path}'，尝试了多种编码")
+    except FileNotFoundError:
+        print(f"错误：找不到文件 '{file_path}'")
         return None
-        
+    except Exception as e:
+        print(f"读取文件时出错：{str(e)}")
+        return None
+
+def file_fingerprint(file_path, sample_size=65536):
+    """文件指纹：大小、修改时间以及首尾各64KB的哈希，文件不变时索引可直接复用"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(sample_size, stat.st_size - sample_size))
+            digest.update(f.read(sample_size))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': digest.hexdigest()}
+
+class CsvRowIndex:
+    """
+    基于行偏移索引的CSV随机访问：只扫描一遍文件记录每行的开始位置，
+    之后通过mmap只读取并解析被选中的行
+    index[0] 为表头，index[i] 为第i行数据，len(index) 为数据行数+1，
+    因此可以直接替代 read_csv_file 返回的列表
+    只支持引号和换行为单字节的编码（utf-8、gbk等），utf-16/utf-32会抛出ValueError
+    """
+    def __init__(self, file_path, encoding=None, rebuild=False):
+        self.file_path = file_path
+        index_path = file_path + INDEX_SUFFIX
+        meta_path = file_path + INDEX_META_SUFFIX
+        fingerprint = file_fingerprint(file_path)
+
+        meta = None
+        if not rebuild and os.path.exists(index_path) and os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('fingerprint') != fingerprint or not supports_byte_scan(meta.get('encoding', 'utf-8')):
+                meta = None
+
+        if meta is not None:
+            self.offsets = np.load(index_path, mmap_mode='r')
+            self.encoding = meta['encoding']
+            self.delimiter = meta.get('delimiter', ',')
+            print(f"使用已有索引: {index_path}")
+        else:
+            fmt = sniff_csv(file_path, encoding)
+            if not supports_byte_scan(fmt.encoding):
+                raise ValueError(f"{fmt.encoding} 编码中引号和换行不是单字节，无法建立行偏移索引")
+            print("正在建立行索引（仅首次或文件变化后需要）...")
+            self.offsets = record_offsets(file_path)
+            self.encoding, self.delimiter = fmt.encoding, fmt.delimiter
+            try:
+                np.save(index_path, self.offsets)
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'fingerprint': fingerprint, 'encoding': self.encoding,
+                               'delimiter': self.delimiter, 'rows': len(self.offsets)}, f)
+            except OSError as e:
+                print(f"警告：索引无法保存（{e}），下次启动需要重新建立")
+
+        self.size = fingerprint['size']
+        self._file = open(file_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.header = self._parse(0, header_end(file_path)) if self.size else []
+
+    def _parse(self, start, end):
+        text = self._mmap[start:end].decode(self.encoding, errors='replace')
+        if start == 0 and text.startswith('\ufeff'):
+            text = text[1:]
+        return next(csv.reader([text.rstrip('\r\n')], delimiter=self.delimiter), [])
+
+    def __len__(self):
+        return len(self.offsets) + 1
+
+    def __getitem__(self, row_num):
+        if row_num == 0:
+            return self.header
+        start = int(self.offsets[row_num - 1])
+        end = int(self.offsets[row_num]) if row_num < len(self.offsets) else self.size
+        return self._parse(start, end)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+def open_csv_index(file_path):
+    """打开CSV的行索引，出错时返回None（与read_csv_file一致）；utf-16等无法建立索引的编码改为整个读入"""
+    try:
+        if not supports_byte_scan(sniff_csv(file_path).encoding):
+            print("该文件的编码不能按字节建立行索引，改为整个读入内存")
+            return read_csv_file(file_path)
+        index = CsvRowIndex(file_path)
+        print(f"成功打开CSV文件，共 {len(index)-1} 行数据（不含表头），使用编码: {index.encoding}")
+        return index
     except FileNotFoundError:
         print(f"错误：找不到文件 '{file_path}'")
         return None
@@ -94,8 +186,8 @@ def main():
         file_path = input("请输入CSV文件路径: ").replace("\"","")
         file_path = rf"{file_path}"
     
-    # 读取CSV文件
-    csv_data = read_csv_file(file_path)
+    # 打开CSV文件（建立或复用行偏移索引，不把整个文件读入内存）
+    csv_data = open_csv_index(file_path)
     if not csv_data:
         return
     
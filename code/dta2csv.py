@@ -1,41 +1,162 @@
-# 将DTA文件中的特定一列转换为CSV格式
+# 将DTA文件中的特定列转换为CSV格式
 # 参数:
 #   dta_path (str): DTA文件路径（如'数据.dta'）
 #   column_name (str): 需要提取的列名（如'年龄'、'销售额'）
 #   output_csv_path (str): 输出CSV文件路径（如'年龄列.csv'）
+# dta_columns_to_csv 只读取需要的列（pyreadstat usecols），分块读取并追加写入CSV，
+# 耗时和内存只与提取的列有关，不受DTA文件总宽度影响
+# dta_folder_columns_to_csv 可批量处理一个文件夹中的所有DTA文件
 # 使用deepseek-v3编写
 
+import os
+import shutil
 import pandas as pd
+import pyreadstat
+from tqdm import tqdm
+from run_report import current_stage, staged
 
-def dta_column_to_csv(dta_path, column_name, output_csv_path):
-
-    # 1. 读取DTA文件
+def _check_columns(dta_path, columns):
+    """只读取元数据检查列名是否存在，返回总行数"""
     try:
-        data = pd.read_stata(dta_path)
+        _, meta = pyreadstat.read_dta(dta_path, metadataonly=True)
     except Exception as e:
         raise ValueError(f"读取DTA文件失败：{e}")
-    
-    # 2. 检查列名是否存在
-    if column_name not in data.columns:
-        raise ValueError(f"列名 '{column_name}' 不在DTA文件中！可用列名：{data.columns.tolist()}")
-    
-    # 3. 提取特定列（保持为DataFrame，保留表头）
-    selected_column = data[[column_name]]  # 双括号确保返回DataFrame（而非Series）
-    
-    # 4. 保存为CSV（不保存索引，使用UTF-8编码）
+
+    missing = [col for col in columns if col not in meta.column_names]
+    if missing:
+        raise ValueError(f"列名 {missing} 不在DTA文件中！可用列名：{meta.column_names}")
+    return meta.number_rows
+
+def _write_columns(dta_path, columns, csv_file, write_header, chunksize, extra_columns=None):
+    """分块读取指定列并追加写入已打开的CSV文件，返回写入行数"""
+    total_rows = _check_columns(dta_path, columns)
+    rows = 0
+    # 与原来的pd.read_stata相同：有值标签的列写出标签文本，日期列转换为日期
+    chunks = pyreadstat.read_file_in_chunks(
+        pyreadstat.read_dta, dta_path,
+        chunksize=chunksize,
+        usecols=list(columns),
+        apply_value_formats=True,
+        dates_as_pandas_datetime=True
+    )
+    with tqdm(total=total_rows, desc=os.path.basename(dta_path), unit="行") as pbar:
+        for chunk, _ in chunks:
+            chunk = chunk[list(columns)]  # 保持用户指定的列顺序
+            if extra_columns:
+                for name, value in extra_columns.items():
+                    chunk[name] = value
+            chunk.to_csv(csv_file, header=write_header, index=False)
+            write_header = False
+            rows += len(chunk)
+            pbar.update(len(chunk))
+    if write_header:
+        # 没有数据行的DTA文件不会产生任何分块，仍然写出表头
+        pd.DataFrame(columns=list(columns) + list(extra_columns or {})).to_csv(csv_file, index=False)
+    return rows
+
+@staged('dta2csv')
+def dta_columns_to_csv(dta_path, columns, output_csv_path, chunksize=100000):
+    """
+    从DTA文件中提取一列或多列保存为CSV（保留表头，UTF-8编码）
+    参数:
+    dta_path (str): DTA文件路径
+    columns (str 或 list): 需要提取的列名
+    output_csv_path (str): 输出CSV文件路径
+    chunksize (int): 每次读取的行数
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+
     try:
-        selected_column.to_csv(output_csv_path, index=False, encoding='utf-8')
-        print(f"成功将列 '{column_name}' 保存到：{output_csv_path}")
+        with open(output_csv_path, 'w', newline='', encoding='utf-8') as f:
+            rows = _write_columns(dta_path, columns, f, True, chunksize)
+    except ValueError:
+        if os.path.exists(output_csv_path):
+            os.remove(output_csv_path)
+        raise
     except Exception as e:
         raise ValueError(f"保存CSV失败：{e}")
 
+    print(f"成功将列 {columns} 共 {rows} 行保存到：{output_csv_path}")
+    stage = current_stage()
+    stage.add(rows_in=rows, rows_out=rows)
+    stage.add_files_in(dta_path)
+    stage.add_files_out(output_csv_path)
+    return rows
+
+@staged('dta2csv_folder')
+def dta_folder_columns_to_csv(input_folder, columns, output_path, chunksize=100000):
+    """
+    批量提取文件夹中所有DTA文件的指定列
+    output_path 以.csv结尾时，所有文件追加到同一个CSV（增加source_file列标明来源）；
+    否则视为文件夹，每个DTA文件输出一个同名CSV
+    缺少指定列或读取失败的文件会被跳过
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+    if not os.path.isdir(input_folder):
+        raise ValueError(f"文件夹不存在: {input_folder}")
+
+    dta_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith('.dta'))
+    if not dta_files:
+        print(f"未找到.dta文件: {input_folder}")
+        return 0
+
+    combined = output_path.lower().endswith('.csv')
+    if not combined:
+        os.makedirs(output_path, exist_ok=True)
+
+    total_rows = 0
+    combined_file = open(output_path, 'w', newline='', encoding='utf-8') if combined else None
+    part_path = output_path + '.part'
+    header_written = False
+    try:
+        for filename in dta_files:
+            dta_path = os.path.join(input_folder, filename)
+            try:
+                if combined:
+                    # 先写到临时文件，整个文件成功后才追加到合并的CSV，中途失败的文件不留下部分行
+                    with open(part_path, 'w', newline='', encoding='utf-8') as part_file:
+                        rows = _write_columns(
+                            dta_path, columns, part_file, not header_written, chunksize,
+                            extra_columns={'source_file': filename}
+                        )
+                    with open(part_path, 'r', newline='', encoding='utf-8') as part_file:
+                        shutil.copyfileobj(part_file, combined_file)
+                    header_written = True
+                    total_rows += rows
+                else:
+                    csv_path = os.path.join(output_path, os.path.splitext(filename)[0] + '.csv')
+                    total_rows += dta_columns_to_csv(dta_path, columns, csv_path, chunksize)
+            except Exception as e:
+                print(f"⚠️ 处理 {filename} 失败: {e}，已跳过")
+    finally:
+        if combined_file is not None:
+            combined_file.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    print(f"批量提取完成！共处理 {len(dta_files)} 个文件，{total_rows} 行数据")
+    stage = current_stage()
+    stage.add(rows_in=total_rows, rows_out=total_rows)
+    stage.add_files_in([os.path.join(input_folder, f) for f in dta_files])
+    stage.add_files_out(output_path)
+    return total_rows
+
+def dta_column_to_csv(dta_path, column_name, output_csv_path):
+    """提取单列（保留原有调用方式）"""
+    return dta_columns_to_csv(dta_path, [column_name], output_csv_path)
+
 # ---------------------- 示例用法 ----------------------
 if __name__ == "__main__":
     # 替换为你的文件路径和列名
     dta_f = input("").replace("\"","")
     output_c = input("").replace("\"","")
-    dta_file = rf"{dta_f}"      # 输入DTA文件
-    output_csv = rf"{output_c}" # 输出CSV文件
-    target_column = "name"    # 需要提取的列名（如'gender'、'income'）
+    dta_file = rf"{dta_f}"      # 输入DTA文件（也可以是文件夹，批量处理）
+    output_csv = rf"{output_c}" # 输出CSV文件（批量处理时可以是文件夹）
+    target_columns = ["name"]   # 需要提取的列名（如'gender'、'income'），可以填多个
 
-    dta_column_to_csv(dta_file, target_column, output_csv)
\ No newline at end of file
+    if os.path.isdir(dta_file):
+        dta_folder_columns_to_csv(dta_file, target_columns, output_csv)
+    else:
+        dta_columns_to_csv(dta_file, target_columns, output_csv)
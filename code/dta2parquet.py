@@ -4,69 +4,258 @@
 #   input_folder (str): 输入文件夹路径
 #   output_folder (str): 输出文件夹路径
 #   chunksize (int): 分块大小（行数），默认10000行
+#   max_workers (int): 同时转换的文件数（进程数），默认None即CPU核数
+# 流式模式（convert_dta_to_parquet_parallel）始终分块读取.dta，
+# 通过同一个ParquetWriter按固定schema逐块写入行组，内存只与chunksize有关
 
 import os
+import json
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyreadstat
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
+from run_report import current_stage, staged
+
+# Stata存储类型（pyreadstat的readstat_variable_types）→ Arrow类型
+STATA_ARROW_TYPES = {
+    'int8': pa.int8(),
+    'int16': pa.int16(),
+    'int32': pa.int32(),
+    'float': pa.float32(),
+    'double': pa.float64(),
+    'string': pa.string(),
+}
+
+def _format_unlabeled(value):
+    """没有值标签的取值按原数字输出（1.0 → '1'）"""
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def build_arrow_schema(first_chunk, meta):
+    """
+    根据.dta元数据与第一块数据确定整个文件固定的Arrow schema
+    - 有值标签的变量 → string（写入标签文本）
+    - 第一块中已被解析为日期的变量 → %td为date32，其余为timestamp
+    - 其他变量按Stata存储类型映射
+    """
+    storage_types = getattr(meta, 'readstat_variable_types', {}) or {}
+    formats = getattr(meta, 'original_variable_types', {}) or {}
+    value_labels = meta.variable_value_labels or {}
+
+    fields = []
+    for col in first_chunk.columns:
+        if col in value_labels:
+            arrow_type = pa.string()
+        elif pd.api.types.is_datetime64_any_dtype(first_chunk[col]):
+            fmt = str(formats.get(col, ''))
+            arrow_type = pa.date32() if fmt.startswith(('%td', '%d')) else pa.timestamp('ms')
+        elif col in storage_types and storage_types[col] in STATA_ARROW_TYPES:
+            arrow_type = STATA_ARROW_TYPES[storage_types[col]]
+        else:
+            # 元数据缺失时退回到pandas推断
+            arrow_type = pa.Schema.from_pandas(first_chunk[[col]], preserve_index=False).field(col).type
+        fields.append(pa.field(col, arrow_type))
+
+    # 把值标签和变量标签存入parquet元数据，转换后不丢失
+    metadata = {
+        'stata_value_labels': json.dumps(
+            {col: {_format_unlabeled(k): v for k, v in labels.items()}
+             for col, labels in value_labels.items()},
+            ensure_ascii=False
+        ),
+        'stata_variable_labels': json.dumps(
+            dict(zip(meta.column_names, meta.column_labels or [])),
+            ensure_ascii=False
+        ),
+    }
+    return pa.schema(fields, metadata=metadata)
+
+def chunk_to_table(chunk, schema, value_labels):
+    """把一个数据块按固定schema转换为Arrow表（缺失值统一为null）"""
+    arrays = []
+    for field in schema:
+        series = chunk[field.name]
+        if field.name in value_labels:
+            labeled = series.map(value_labels[field.name])
+            unlabeled = labeled.isna() & series.notna()
+            if unlabeled.any():
+                labeled = labeled.astype(object)
+                labeled[unlabeled] = series[unlabeled].map(_format_unlabeled)
+            array = pa.array(labeled, type=pa.string(), from_pandas=True)
+        else:
+            array = pa.array(series, from_pandas=True)
+            if array.type != field.type:
+                array = array.cast(field.type)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def convert_one_dta_streaming(dta_path, parquet_path, chunksize=100000, compression='snappy'):
+    """
+    流式转换单个.dta文件：始终分块读取，每块写成一个行组
+    先写入临时文件，成功后再替换，避免留下半个parquet
+    返回转换统计信息（行数、字节数、耗时）
+    """
+    start = time.perf_counter()
+    _, meta = pyreadstat.read_dta(dta_path, metadataonly=True)
+    value_labels = meta.variable_value_labels or {}
+
+    tmp_path = parquet_path + '.tmp'
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        chunks = pyreadstat.read_file_in_chunks(
+            pyreadstat.read_dta, dta_path,
+            chunksize=chunksize,
+            dates_as_pandas_datetime=True
+        )
+        for chunk, _ in chunks:
+            if writer is None:
+                schema = build_arrow_schema(chunk, meta)
+                writer = pq.ParquetWriter(tmp_path, schema, compression=compression)
+            writer.write_table(chunk_to_table(chunk, schema, value_labels), row_group_size=chunksize)
+            rows += len(chunk)
+
+        if writer is None:
+            # 空文件：只写表头
+            empty, _ = pyreadstat.read_dta(dta_path, dates_as_pandas_datetime=True)
+            schema = build_arrow_schema(empty, meta)
+            writer = pq.ParquetWriter(tmp_path, schema, compression=compression)
+        writer.close()
+        writer = None
+        os.replace(tmp_path, parquet_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'file': os.path.basename(dta_path),
+        'rows': rows,
+        'bytes_in': os.path.getsize(dta_path),
+        'bytes_out': os.path.getsize(parquet_path),
+        'seconds': time.perf_counter() - start,
+    }
+
+def _list_dta_files(input_folder):
+    return [f for f in os.listdir(input_folder)
+            if os.path.isfile(os.path.join(input_folder, f))
+            and f.lower().endswith('.dta')]
+
+def _format_throughput(stats):
+    seconds = max(stats['seconds'], 1e-9)
+    mb = stats['bytes_in'] / 1024 / 1024
+    return (f"{stats['file']}: {stats['rows']:,}行, {mb:.1f}MB, 用时{stats['seconds']:.1f}s, "
+            f"{mb / seconds:.1f} MB/s, {stats['rows'] / seconds:,.0f} 行/s")
+
+@staged('dta2parquet')
+def convert_dta_to_parquet_parallel(input_folder, output_folder, chunksize=100000, max_workers=None):
+    """
+    流式转换文件夹中的所有.dta文件，多个文件由进程池同时转换
+    每个文件完成后输出吞吐量，返回所有成功文件的统计信息
+    有文件转换失败时，其余文件照常转换完，最后抛出RuntimeError（流水线不会把不完整的结果当作完成）
+    """
+    if not os.path.isdir(input_folder):
+        print(f"错误: 输入文件夹 '{input_folder}' 不存在")
+        return []
+
+    os.makedirs(output_folder, exist_ok=True)
+
+    dta_files = _list_dta_files(input_folder)
+    if not dta_files:
+        print(f"未找到.dta文件: {input_folder}")
+        return []
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(dta_files)))
+    print(f"找到 {len(dta_files)} 个.dta文件，使用 {max_workers} 个进程流式转换...")
+
+    results = []
+    failed = []
+    stage = current_stage()
+    stage.set(files=len(dta_files), workers=max_workers)
+    total_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for filename in dta_files:
+            dta_path = os.path.join(input_folder, filename)
+            parquet_path = os.path.join(output_folder, os.path.splitext(filename)[0] + '.parquet')
+            futures[executor.submit(convert_one_dta_streaming, dta_path, parquet_path, chunksize)] = filename
+
+        for future in tqdm(as_completed(futures), total=len(futures), desc="总体进度"):
+            filename = futures[future]
+            try:
+                stats = future.result()
+                results.append(stats)
+                stage.add(rows_in=stats['rows'], rows_out=stats['rows'],
+                          bytes_in=stats['bytes_in'], bytes_out=stats['bytes_out'])
+                tqdm.write(f"✅ {_format_throughput(stats)}")
+            except Exception as e:
+                failed.append(filename)
+                tqdm.write(f"❌ 转换 {filename} 失败: {str(e)}")
+
+    total_seconds = time.perf_counter() - total_start
+    total_mb = sum(s['bytes_in'] for s in results) / 1024 / 1024
+    print(f"转换完成! 成功 {len(results)}/{len(dta_files)} 个文件，"
+          f"共 {total_mb:.1f}MB，用时 {total_seconds:.1f}s（{total_mb / max(total_seconds, 1e-9):.1f} MB/s）")
+    if failed:
+        raise RuntimeError(f"{len(failed)} 个.dta文件转换失败: {', '.join(sorted(failed))}")
+    return results
 
 def convert_dta_to_parquet(input_folder, output_folder, chunksize=10000):
     # 检查输入文件夹是否存在
     if not os.path.isdir(input_folder):
         print(f"错误: 输入文件夹 '{input_folder}' 不存在")
         return
-    
+
     # 创建输出文件夹（如果不存在）
     os.makedirs(output_folder, exist_ok=True)
-    
+
     # 获取所有.dta文件
-    dta_files = [f for f in os.listdir(input_folder) 
-                 if os.path.isfile(os.path.join(input_folder, f)) 
-                 and f.lower().endswith('.dta')]
-    
+    dta_files = _list_dta_files(input_folder)
+
     if not dta_files:
         print(f"未找到.dta文件: {input_folder}")
         return
-    
+
     print(f"找到 {len(dta_files)} 个.dta文件，开始转换...")
-    
+
     # 遍历文件转换
     for filename in tqdm(dta_files, desc="总体进度"):
         try:
             dta_path = os.path.join(input_folder, filename)
             parquet_filename = os.path.splitext(filename)[0] + '.parquet'
             parquet_path = os.path.join(output_folder, parquet_filename)
-            
+
             # 先尝试普通模式读取（小文件更快）
             try:
                 tqdm.write(f"普通模式读取: {filename}")
                 df = pd.read_stata(dta_path)
                 df.to_parquet(parquet_path, index=False)
-                
+
             except MemoryError:
-                # 普通模式内存不足时，自动切换分块模式
+                # 普通模式内存不足时，自动切换流式模式（ParquetWriter逐块写入行组）
                 tqdm.write(f"内存不足，启用分块模式: {filename} (每次读取 {chunksize} 行)")
-                first_chunk = True
-                
-                # 分块读取并追加写入
-                for chunk in pd.read_stata(dta_path, chunksize=chunksize):
-                    chunk.to_parquet(
-                        parquet_path,
-                        index=False,
-                        mode='w' if first_chunk else 'a',  # 第一块创建，后续追加
-                        engine='pyarrow'
-                    )
-                    first_chunk = False
-            
+                stats = convert_one_dta_streaming(dta_path, parquet_path, chunksize)
+                tqdm.write(_format_throughput(stats))
+
             # 验证转换结果
             if os.path.exists(parquet_path):
                 tqdm.write(f"✅ 成功转换: {filename}")
             else:
                 tqdm.write(f"⚠️ 警告: {filename} 转换后未生成文件")
-                
+
         except Exception as e:
             tqdm.write(f"❌ 转换 {filename} 失败: {str(e)}")
             continue
-    
+
     print("转换完成!")
 
 def get_folder_path(prompt):
@@ -87,4 +276,5 @@ if __name__ == "__main__":
     input_folder =""
     output_folder =""
     chunksize = 20000
-    convert_dta_to_parquet(input_folder, output_folder, chunksize)
\ No newline at end of file
+    max_workers = None  # 同时转换的文件数，None为CPU核数；内存紧张时调小
+    convert_dta_to_parquet_parallel(input_folder, output_folder, chunksize, max_workers)
@@ -0,0 +1,103 @@
+# 说明：
+# 读取数据时统一使用的省内存列类型
+#   - 字符串列使用Arrow存储的字符串（string[pyarrow]），不再是一个个Python str对象，
+#     cardnum、组织机构代码这类短代码列内存可减少到原来的几分之一，比较与合并也更快
+#   - 取值很少的字符串列（地区、法院等）转为category
+#   - 整数列降为能容纳取值的最小类型（年份为int16），浮点列与含缺失值的列保持不变
+# 年份默认不转为category：category与数值比较（如 publish_year >= 2014）会出错，int16已足够省内存；
+# 确实需要时可以在category_columns中指定
+# 字符串缺失值仍为NaN（pandas 2.1及以上），与原来object列的行为一致
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CATEGORY_MAX_RATIO = 0.05   # 不同取值数 / 行数 不超过该比例的字符串列转为category
+CATEGORY_MIN_ROWS = 1000    # 行数太少时不自动转category
+
+def _arrow_string_dtype():
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)   # pandas 2.3及以上
+    except TypeError:
+        try:
+            return pd.StringDtype('pyarrow_numpy')          # pandas 2.1、2.2
+        except (ValueError, TypeError):
+            return pd.StringDtype('pyarrow')                # 更早的版本，缺失值为pd.NA
+
+STRING_DTYPE = _arrow_string_dtype()
+
+def arrow_types_mapper(arrow_type):
+    """Table.to_pandas / read_parquet 的types_mapper：Arrow字符串直接转为string[pyarrow]"""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return STRING_DTYPE
+    return None
+
+def _is_string_column(series):
+    if series.dtype == STRING_DTYPE:
+        return True
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')
+
+def apply_dtype_policy(df, categories=True, category_columns=None, string_columns=None, downcast=True):
+    """
+    按统一规则转换列类型（就地修改并返回df）
+    categories: 是否自动把低基数字符串列转为category（分块读取时应在合并后再做，
+                各块的category取值不同，合并后会退回object）
+    category_columns: 一定转为category的列
+    string_columns: 一定按字符串存储的列（如代码列中全是数字时）
+    """
+    category_columns = set(category_columns or [])
+    string_columns = set(string_columns or [])
+    for col in df.columns:
+        series = df[col]
+        if col in category_columns:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+            continue
+        if col in string_columns or _is_string_column(series):
+            if not _is_string_column(series):
+                # 全是数字的代码列：先转为文本（含缺失值的整数列不带.0），缺失值保持缺失
+                if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+                    series = series.astype('Int64')
+                series = series.astype(str).where(series.notna())
+            if series.dtype != STRING_DTYPE:
+                series = series.astype(STRING_DTYPE)
+            if (categories and len(series) >= CATEGORY_MIN_ROWS
+                    and series.nunique() <= CATEGORY_MAX_RATIO * len(series)):
+                series = series.astype('category')
+            df[col] = series
+        elif downcast and series.dtype.kind in 'iu':
+            df[col] = pd.to_numeric(series, downcast='integer' if series.dtype.kind == 'i' else 'unsigned')
+    return df
+
+def read_parquet_lean(file_path, columns=None, **policy):
+    """读取parquet，字符串直接读为string[pyarrow]（不经过Python对象），再应用列类型规则"""
+    return arrow_to_pandas(pq.read_table(file_path, columns=columns), **policy)
+
+def arrow_to_pandas(table, **policy):
+    """Arrow表转DataFrame并应用列类型规则"""
+    return apply_dtype_policy(table.to_pandas(types_mapper=arrow_types_mapper), **policy)
+
+def memory_mb(df):
+    """DataFrame实际占用的内存（MB，包含字符串内容）"""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+def compare_memory(file_path, columns=None):
+    """
+    对同一个parquet/CSV文件比较默认读取与按列类型规则读取的内存占用
+    返回 {'default_mb', 'lean_mb', 'dtypes'}
+    """
+    if file_path.lower().endswith('.parquet'):
+        default = pd.read_parquet(file_path, engine='pyarrow', columns=columns)
+        default = default.astype({c: object for c in default.columns if pd.api.types.is_string_dtype(default[c])})
+        lean = read_parquet_lean(file_path, columns)
+    else:
+        from csv_input import read_csv_pandas
+        default = read_csv_pandas(file_path, usecols=columns)
+        default = default.astype({c: object for c in default.columns if pd.api.types.is_string_dtype(default[c])})
+        lean = apply_dtype_policy(read_csv_pandas(file_path, usecols=columns))
+    result = {'default_mb': memory_mb(default), 'lean_mb': memory_mb(lean),
+              'dtypes': {col: str(dtype) for col, dtype in lean.dtypes.items()}}
+    print(f"{file_path}: 默认 {result['default_mb']:.1f}MB → 按列类型规则 {result['lean_mb']:.1f}MB"
+          f"（{result['lean_mb'] / max(result['default_mb'], 1e-9):.0%}）")
+    return result
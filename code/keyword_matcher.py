@@ -0,0 +1,118 @@
+# 说明：
+# 多关键词匹配（Aho-Corasick自动机）：关键词表只需构建一次，每段文本只扫描一遍即可找到所有关键词，
+# 耗时与文本长度有关，与关键词数量基本无关（原来的 keyword in text 需要对每个关键词各扫描一遍）
+# 安装了pyahocorasick（pip install pyahocorasick）时自动使用其C实现，否则使用纯Python实现，结果相同
+# 关键词文件：每行一个关键词，空行和以#开头的行会被忽略
+
+from collections import Counter
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+def load_keywords(file_path, encoding='utf-8'):
+    """从文本文件读取关键词（去除首尾空白、去重并保持顺序）"""
+    keywords = []
+    seen = set()
+    with open(file_path, 'r', encoding=encoding) as f:
+        for line in f:
+            keyword = line.strip().lstrip('\ufeff')
+            if not keyword or keyword.startswith('#') or keyword in seen:
+                continue
+            seen.add(keyword)
+            keywords.append(keyword)
+    return keywords
+
+class KeywordMatcher:
+    """
+    find_all(text)  返回文本中出现的关键词集合（用于统计"包含该关键词的行数"）
+    count_all(text) 返回每个关键词的出现次数（重叠出现分别计数，如"aa"在"aaa"中出现2次）
+    """
+    def __init__(self, keywords):
+        self.keywords = [k for k in dict.fromkeys(keywords) if k]
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for i, keyword in enumerate(self.keywords):
+                self._automaton.add_word(keyword, i)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._build()
+
+    def _build(self):
+        # goto[state]: 字符 → 下一个状态；fail[state]: 失配时跳转的状态；output[state]: 在该状态结束的关键词序号
+        goto = [{}]
+        output = [()]
+        for i, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append(())
+                state = nxt
+            output[state] = output[state] + (i,)
+
+        # 按层次（BFS）计算失配指针，并把失配状态的输出合并进来
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] = output[nxt] + output[fail[nxt]]
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def _iter_matches(self, text):
+        """依次产出每次出现的关键词序号"""
+        if self._automaton is not None:
+            for _, index in self._automaton.iter(text):
+                yield index
+            return
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                yield from output[state]
+
+    def find_all(self, text):
+        """文本中出现过的关键词（集合）"""
+        if not text:
+            return set()
+        return {self.keywords[i] for i in set(self._iter_matches(text))}
+
+    def count_all(self, text):
+        """每个关键词在文本中的出现次数"""
+        if not text:
+            return Counter()
+        return Counter(self.keywords[i] for i in self._iter_matches(text))
+
+def count_keywords(texts, matcher, with_occurrences=False):
+    """
+    统计一组文本：返回 (包含关键词的行数, 关键词总出现次数)
+    with_occurrences=False时第二项为None
+    """
+    row_counts = Counter({keyword: 0 for keyword in matcher.keywords})
+    occurrences = Counter({keyword: 0 for keyword in matcher.keywords}) if with_occurrences else None
+    for text in texts:
+        if not text:
+            continue
+        if with_occurrences:
+            counts = matcher.count_all(text)
+            occurrences.update(counts)
+            row_counts.update(counts.keys())
+        else:
+            row_counts.update(matcher.find_all(text))
+    return row_counts, occurrences
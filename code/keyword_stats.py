@@ -0,0 +1,263 @@
+# 说明：
+# 流式多进程关键词统计（统计csv文件特定词频率.py 的流式模式）
+#   - 输入可以是单个文件、文件夹或通配符，支持CSV和parquet
+#   - 大CSV按记录边界切成若干字节段（见csv_ranges.py），parquet按行组，每段由一个进程统计，
+#     各进程的结果（Counter）相加即为总结果
+#   - 多列时一行中任一列包含关键词即计入该行；group_by在同一遍扫描中按组统计
+# 进程池中执行的函数必须能被子进程导入，因此放在这个模块中
+
+import csv
+import glob
+import io
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from csv_input import iter_rows, read_header, sniff_csv
+from csv_ranges import aligned_byte_ranges, supports_byte_scan
+from keyword_matcher import KeywordMatcher
+from run_report import current_stage, staged
+
+RANGE_SIZE = 64 << 20   # 每个任务处理的CSV字节数（约64MB）
+
+_MATCHERS = {}
+
+def _get_matcher(keywords):
+    """每个进程中同一组关键词的自动机只构建一次"""
+    key = tuple(keywords)
+    if key not in _MATCHERS:
+        _MATCHERS[key] = KeywordMatcher(keywords)
+    return _MATCHERS[key]
+
+def new_stats():
+    """一组统计结果：行数、包含各关键词的行数、各关键词总出现次数"""
+    return {'rows': 0, 'counts': Counter(), 'occurrences': Counter()}
+
+def merge_stats(total, part):
+    """把part（{分组: 统计}）合并进total"""
+    for group, stats in part.items():
+        target = total.setdefault(group, new_stats())
+        target['rows'] += stats['rows']
+        target['counts'].update(stats['counts'])
+        target['occurrences'].update(stats['occurrences'])
+    return total
+
+def _group_key(value):
+    """分组值统一转为字符串（parquet中的 2019.0 与CSV中的 2019 归为同一组）"""
+    if value is None or value == '':
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _count_rows(rows, keywords, with_occurrences):
+    """rows: (分组值, [文本, ...]) 序列；返回 {分组: 统计}"""
+    matcher = _get_matcher(keywords)
+    result = {}
+    for group, texts in rows:
+        stats = result.get(group)
+        if stats is None:
+            stats = result[group] = new_stats()
+        stats['rows'] += 1
+        # 多列用\x00连接，关键词不会跨列匹配
+        text = '\x00'.join(t for t in texts if t)
+        if not text:
+            continue
+        if with_occurrences:
+            found = matcher.count_all(text)
+            stats['occurrences'].update(found)
+            stats['counts'].update(found.keys())
+        else:
+            stats['counts'].update(matcher.find_all(text))
+    return result
+
+class _RangeReader(io.RawIOBase):
+    """只读取文件[start, end)字节的只读流"""
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        n = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def _select(rows, text_indices, group_index):
+    return (
+        (_group_key(row[group_index]) if group_index is not None and group_index < len(row) else '',
+         [row[i] for i in text_indices if i < len(row)])
+        for row in rows if row
+    )
+
+def _count_csv_range(path, start, end, fmt, text_indices, group_index, keywords, with_occurrences):
+    """统计CSV文件中一个字节段（起止都在记录边界上）"""
+    # 各段从记录边界开始，表头之后不再有BOM；解码失败时换后备编码重新统计这一段
+    encodings = ('utf-8' if fmt.encoding == 'utf-8-sig' else fmt.encoding,) + fmt.fallbacks
+    for i, encoding in enumerate(encodings):
+        errors = 'replace' if i == len(encodings) - 1 else 'strict'
+        try:
+            with io.TextIOWrapper(io.BufferedReader(_RangeReader(path, start, end)),
+                                  encoding=encoding, errors=errors, newline='') as text:
+                reader = csv.reader(text, delimiter=fmt.delimiter, quotechar=fmt.quotechar)
+                return _count_rows(_select(reader, text_indices, group_index), keywords, with_occurrences)
+        except UnicodeDecodeError:
+            continue
+
+def _count_csv_file(path, fmt, text_indices, group_index, keywords, with_occurrences):
+    """按顺序统计整个CSV文件（utf-16等无法按字节切分的编码）"""
+    rows = iter_rows(path, fmt, skip_header=True)
+    return _count_rows(_select(rows, text_indices, group_index), keywords, with_occurrences)
+
+def _count_parquet_row_group(path, row_group, text_columns, group_by, keywords, with_occurrences, batch_size=65536):
+    """统计parquet文件的一个行组"""
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    read_columns = list(dict.fromkeys(text_columns + ([group_by] if group_by else [])))
+    result = {}
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[row_group], columns=read_columns):
+        data = batch.to_pydict()
+        groups = [_group_key(v) for v in data[group_by]] if group_by else [''] * batch.num_rows
+        texts = zip(*[[t if isinstance(t, str) else ('' if t is None else str(t)) for t in data[col]]
+                      for col in text_columns])
+        merge_stats(result, _count_rows(zip(groups, texts), keywords, with_occurrences))
+    return result
+
+def expand_inputs(path):
+    """单个文件、文件夹（其中的.csv和.parquet）或通配符 → 文件列表"""
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in os.listdir(path)]
+    elif any(ch in path for ch in '*?['):
+        files = glob.glob(path, recursive=True)
+    else:
+        files = [path]
+    return sorted(f for f in files if os.path.isfile(f) and f.lower().endswith(('.csv', '.parquet')))
+
+def _resolve_columns(available, columns, path):
+    """列名或列序号（从0开始）→ 列名；未指定时使用第一列"""
+    if not columns:
+        return [available[0]]
+    names = []
+    for col in columns:
+        if isinstance(col, int) or (isinstance(col, str) and col.isdigit() and col not in available):
+            names.append(available[int(col)])
+        elif col in available:
+            names.append(col)
+        else:
+            raise ValueError(f"文件 {path} 中不存在列 {col}，包含的列名：{available}")
+    return names
+
+def _plan_tasks(files, columns, group_by, keywords, with_occurrences, range_size):
+    """把每个文件拆成若干任务：CSV按字节段，parquet按行组"""
+    # 只统计CSV时不导入pyarrow，命令启动更快
+    if any(path.lower().endswith('.parquet') for path in files):
+        import pyarrow.parquet as pq
+    tasks = []
+    for path in files:
+        if path.lower().endswith('.parquet'):
+            parquet_file = pq.ParquetFile(path)
+            names = parquet_file.schema_arrow.names
+            text_columns = _resolve_columns(names, columns, path)
+            if group_by and group_by not in names:
+                raise ValueError(f"文件 {path} 中不存在分组列 {group_by}")
+            for i in range(parquet_file.num_row_groups):
+                tasks.append((path, _count_parquet_row_group,
+                              (path, i, text_columns, group_by, keywords, with_occurrences)))
+            continue
+
+        fmt = sniff_csv(path)
+        header = read_header(path, fmt)
+        if not header:
+            continue
+        text_indices = [header.index(name) for name in _resolve_columns(header, columns, path)]
+        group_index = None
+        if group_by:
+            if group_by not in header:
+                raise ValueError(f"文件 {path} 中不存在分组列 {group_by}")
+            group_index = header.index(group_by)
+        if not supports_byte_scan(fmt.encoding):
+            # 这些编码中引号和换行不是单字节，不能按字节切分
+            tasks.append((path, _count_csv_file,
+                          (path, fmt, text_indices, group_index, keywords, with_occurrences)))
+            continue
+        n_ranges = max(1, -(-os.path.getsize(path) // range_size))
+        for start, end in aligned_byte_ranges(path, n_ranges):
+            if end > start:
+                tasks.append((path, _count_csv_range,
+                              (path, start, end, fmt, text_indices, group_index,
+                               keywords, with_occurrences)))
+    return tasks
+
+@staged('count_keywords')
+def count_keywords_streaming(inputs, keywords, columns=None, group_by=None,
+                             with_occurrences=False, max_workers=None, range_size=RANGE_SIZE):
+    """
+    流式多进程统计关键词
+    参数:
+        inputs: 文件、文件夹或通配符（也可以是它们的列表）
+        keywords: 关键词列表
+        columns: 要统计的列名或列序号列表，默认第一列
+        group_by: 分组列名，None为不分组
+        with_occurrences: 是否同时统计总出现次数
+        max_workers: 进程数，默认CPU核数；1为在当前进程中顺序执行
+    返回 {分组值: {'rows': 行数, 'counts': Counter, 'occurrences': Counter}}，不分组时分组值为''
+    """
+    keywords = list(keywords)
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    files = [f for path in inputs for f in expand_inputs(path)]
+    if not files:
+        print(f"未找到CSV或parquet文件: {inputs}")
+        return {}
+    tasks = _plan_tasks(files, columns, group_by, keywords, with_occurrences, range_size)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks) or 1))
+    print(f"共 {len(files)} 个文件，拆分为 {len(tasks)} 个任务，使用 {max_workers} 个进程")
+
+    try:
+        from tqdm import tqdm as progress_bar
+    except ImportError:
+        def progress_bar(iterable, **kwargs):
+            return iterable
+
+    results = {}
+    start = time.perf_counter()
+    if max_workers == 1:
+        for _, func, args in progress_bar(tasks, desc="处理进度", unit="段"):
+            merge_stats(results, func(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, *args): path for path, func, args in tasks}
+            for future in progress_bar(as_completed(futures), total=len(futures), desc="处理进度", unit="段"):
+                merge_stats(results, future.result())
+    total_rows = sum(stats['rows'] for stats in results.values())
+    seconds = time.perf_counter() - start
+    print(f"统计完成：共 {total_rows:,} 行，用时 {seconds:.1f}s（{total_rows / max(seconds, 1e-9):,.0f} 行/s）")
+    stage = current_stage()
+    stage.add(rows_in=total_rows)
+    stage.add_files_in(files)
+    stage.set(files=len(files), tasks=len(tasks), workers=max_workers, keywords=len(keywords))
+    return results
+
+def save_stats(results, output_csv, keywords, with_occurrences=False):
+    """把统计结果保存为CSV（每个分组、每个关键词一行）"""
+    keywords = list(keywords)
+    with open(output_csv, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['group', 'keyword', 'rows_total', 'rows_containing']
+                        + (['occurrences'] if with_occurrences else []))
+        for group in sorted(results):
+            stats = results[group]
+            for keyword in keywords:
+                writer.writerow([group, keyword, stats['rows'], stats['counts'][keyword]]
+                                + ([stats['occurrences'][keyword]] if with_occurrences else []))
+    print(f"统计结果已保存到: {output_csv}")
@@ -0,0 +1,183 @@
+# 级联匹配：一次运行中对每个B文件依次尝试多种键（默认先组织机构代码、再掩码后的统一社会信用代码）
+# 分别运行 match_zzjgdm.py 和 match_shxydm.py 时，A文件要读取、扫描、写出两遍，每个B文件也要解码两遍；
+# 这里A文件只读取一次，每个B文件只读取一次（只解码需要的列）并同时构建各种键的索引
+#   - 对每个B文件，尚未匹配的行先用第一种键匹配，未匹配的再用下一种键，所有键都未匹配的行才留给下一个B文件
+#   - matched_<B文件名>.parquet 中 match_key 列记录是哪种键匹配成功的
+#   - 不再为每个B文件写出unmatched文件，所有B文件都未匹配的行写入 remaining_unmatched.parquet
+#   - 相似度阈值默认使用各键自己的值（组织机构代码0.8、信用代码0.9，见match_core.py），可用similarity_thresholds覆盖
+#   - 索引文件为 .cascade_index_<B文件名>.npy，保存各种键的索引；缺少所需的键时重新构建
+# def main()中可以设置输入文件地址
+
+import numpy as np
+import os
+import sys
+import glob
+import gc
+import time
+import logging
+import warnings
+from dtype_policy import read_parquet_lean
+from match_core import KEYS, build_indexes, match_rows, take_rows
+from partitioned_parquet import save_parquet_output
+from prefetch import OrderedWriter, PrefetchTimer, prefetch
+from run_report import current_stage, run_stage, staged
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+warnings.filterwarnings('ignore')
+
+DEFAULT_KEYS = ('zzjgdm', 'shxydm')   # 尝试的顺序
+
+def create_index_db(file_path, keys, index_file, force_rebuild=False):
+    """读取或构建单个B文件的各种键的索引，返回 {键名: 索引}"""
+    if os.path.exists(index_file) and not force_rebuild:
+        indexes = np.load(index_file, allow_pickle=True).item()
+        if all(key.name in indexes for key in keys):
+            logger.info(f"加载已存在的索引文件: {index_file}")
+            return indexes
+
+    logger.info(f"开始构建索引（{'、'.join(key.name for key in keys)}）: {os.path.basename(file_path)}")
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"fileB文件不存在: {file_path}")
+    indexes = build_indexes([file_path], keys)
+    np.save(index_file, np.array(indexes))
+    logger.info("索引构建完成：" + "，".join(f"{name} {len(index)}个键" for name, index in indexes.items()))
+    return indexes
+
+def match_cascade(fileA_df, indexes, keys, batch_size, thresholds, rows):
+    """
+    尚未匹配的行依次与各种键的索引匹配
+    返回 (匹配成功的行位置（升序）, 对应的newgcid, 匹配成功的键名, 仍未匹配的行位置, {键名: 匹配数})
+    """
+    parts = []
+    counts = {}
+    for key in keys:
+        matched_rows, gcids, rows = match_rows(fileA_df, indexes[key.name], key, batch_size,
+                                               thresholds[key.name], rows)
+        parts.append((matched_rows, gcids, key.name))
+        counts[key.name] = len(matched_rows)
+        if len(rows) == 0:
+            break
+    matched_rows = np.concatenate([part[0] for part in parts])
+    gcids = np.concatenate([part[1] for part in parts])
+    match_keys = np.repeat(np.array([part[2] for part in parts], dtype=object), [len(part[0]) for part in parts])
+    # 按A文件中的顺序输出
+    order = np.argsort(matched_rows, kind='stable')
+    return matched_rows[order], gcids[order], match_keys[order], rows, counts
+
+def read_parquet(file_path):
+    """读取单个Parquet文件（字符串列为string[pyarrow]，低基数列为category，整数降位）"""
+    try:
+        return read_parquet_lean(file_path)
+    except Exception as e:
+        logger.error(f"读取Parquet文件 {file_path} 出错: {str(e)}", exc_info=True)
+        raise
+
+# ================== 匹配流程 ==================
+@staged('match_cascade')
+def run_matching(fileA, fileB_dir, output_dir, batch_size=100000, partition_cols=None,
+                 force_rebuild_index=False, keys=DEFAULT_KEYS, similarity_thresholds=None, lookup_key=None):
+    """
+    文件A依次与fileB_dir下（含子文件夹）的每个B文件匹配，每个B文件按keys的顺序尝试各种键，结果写入output_dir
+    keys: 键名（'zzjgdm'、'shxydm'）或match_core.MatchKey；similarity_thresholds: {键名: 阈值}，未给出的使用键的默认值
+    lookup_key: 'cardnum' 或 'newgcid'，输出按该列排序并写辅助索引（见partitioned_parquet.lookup）
+    返回最终剩余未匹配的数据（DataFrame），出错时抛出异常
+    """
+    keys = [KEYS[key] if isinstance(key, str) else key for key in keys]
+    if not keys:
+        raise ValueError("至少需要一种匹配键")
+    thresholds = {key.name: key.similarity_threshold for key in keys}
+    thresholds.update(similarity_thresholds or {})
+    batch_size = int(batch_size)
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        fileB_paths = glob.glob(os.path.join(fileB_dir, "**", "*.parquet"), recursive=True)
+        fileB_paths.sort(reverse=True)  # 倒序读取文件，与两个单独的匹配程序相同
+        logger.info(f"共发现{len(fileB_paths)}个fileB文件，将按倒序处理；匹配键顺序: {' → '.join(key.name for key in keys)}")
+        if not fileB_paths:
+            raise FileNotFoundError(f"未找到任何fileB文件！检查目录：{fileB_dir}")
+
+        logger.info(f"开始读取fileA: {fileA}")
+        fileA_df = read_parquet(fileA)
+        logger.info(f"fileA初始数据量: {len(fileA_df)}条")
+        # fileA只读取一次、不再修改，尚未匹配的行用行位置数组（选择向量）记录
+        remaining = np.arange(len(fileA_df))
+        key_totals = dict.fromkeys(thresholds, 0)
+
+        stage = current_stage()
+        stage.add(rows_in=len(fileA_df))
+        stage.add_files_in([fileA] + fileB_paths)
+
+        def load_index(file_path):
+            b_basename = os.path.splitext(os.path.basename(file_path))[0]
+            with run_stage('load_index') as load_stage:
+                load_stage.set(file=os.path.basename(file_path))
+                load_stage.add_files_in(file_path)
+                return create_index_db(file_path, keys, f".cascade_index_{b_basename}.npy", force_rebuild_index)
+
+        # 匹配当前B文件时，后台线程预取下一个B文件的索引，匹配结果在后台写出
+        timer = PrefetchTimer()
+        run_start = time.perf_counter()
+        with OrderedWriter(timer) as writer:
+            for b_idx, (file_path, indexes) in enumerate(prefetch(fileB_paths, load_index, timer), 1):
+                b_filename = os.path.basename(file_path)
+                b_basename = os.path.splitext(b_filename)[0]
+                logger.info(f"\n===== 开始处理第{b_idx}个B文件: {b_filename} =====")
+
+                with run_stage('match') as match_stage:
+                    match_stage.set(file=b_filename)
+                    matched_rows, gcids, match_keys, unmatched_rows, counts = match_cascade(
+                        fileA_df, indexes, keys, batch_size, thresholds, remaining)
+                    match_stage.add(rows_in=len(remaining), rows_out=len(matched_rows))
+                    match_stage.set(**{f"matched_{name}": count for name, count in counts.items()})
+                stage.add(rows_out=len(matched_rows))
+                for name, count in counts.items():
+                    key_totals[name] += count
+
+                matched_df = take_rows(fileA_df, matched_rows, gcids)
+                matched_df['match_key'] = match_keys
+                writer.submit(save_parquet_output, matched_df, output_dir, f'matched_{b_basename}.parquet',
+                              partition_cols, sort_by=['cardnum'], lookup_key=lookup_key)
+                detail = "，".join(f"{name} {count}条" for name, count in counts.items())
+                logger.info(f"B文件匹配结果: 匹配成功{len(matched_rows)}条（{detail}）, "
+                            f"未匹配{len(unmatched_rows)}条（继续匹配下一个B文件）")
+
+                # 所有键都未匹配的行继续匹配下一个B文件
+                remaining = unmatched_rows
+                logger.info(f"剩余未匹配A文件数据量: {len(remaining)}条")
+
+                del indexes, matched_rows, gcids, match_keys, unmatched_rows, matched_df
+                gc.collect()
+
+        remaining_df = take_rows(fileA_df, remaining)
+        if not remaining_df.empty:
+            save_parquet_output(remaining_df, output_dir, 'remaining_unmatched.parquet',
+                                partition_cols, sort_by=['cardnum'], lookup_key=lookup_key)
+        logger.info(f"所有B文件处理完成！各键匹配数: {key_totals}，剩余未匹配数据: {len(remaining_df)}条")
+        stage.set(matched_by_key=key_totals)
+        timer.report(logger, time.perf_counter() - run_start)
+
+    except Exception as e:
+        logger.error(f"程序执行出错: {str(e)}", exc_info=True)
+        raise
+    return remaining_df
+
+# ================== 主程序 ==================
+def main():
+    fileA_path = input("请输入文件A（.parquet）的地址").replace("\"","")
+    fileB_path = input("请输入文件夹B的地址").replace("\"","")
+    batch_size_input = input("请输入每批量处理的数量，建议为100000")
+    output_path = input("请输入导出文件夹的地址").replace("\"","")
+    try:
+        run_matching(rf"{fileA_path}", rf"{fileB_path}", rf"{output_path}", int(batch_size_input))
+    except Exception:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
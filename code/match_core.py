@@ -0,0 +1,137 @@
+# 说明：
+# 匹配程序的公共部分：匹配键的定义、B文件索引的构建、A文件行与索引的匹配
+# match_zzjgdm.py（组织机构代码）、match_shxydm.py（掩码后的统一社会信用代码）和
+# match_cascade.py（一次运行中按顺序尝试多种键）都使用这里的函数
+#   - MatchKey：B文件中键所在的列、B文件的值和A文件cardnum转换为键的函数、名称相似度阈值
+#   - build_indexes：一次读取B文件（只解码需要的列），同时构建多种键的索引
+#   - match_rows：A文件中尚未匹配的行（选择向量）与一种键的索引匹配
+# 索引格式：{键: [(企业名称, newgcid), ...]}，与原来两个程序的索引文件相同
+
+import logging
+import os
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+from pyarrow import dataset as ds
+
+from name_matcher import CandidateScorer
+
+logger = logging.getLogger(__name__)
+
+NAME_COLUMN = '企业名称'
+VALUE_COLUMN = 'newgcid'
+
+# name: 键名（记录在match_key列中）；column: B文件中键所在的列
+# b_key / a_key: B文件的值、A文件的cardnum（字符串）转换为键的函数，返回None表示该行没有有效的键
+MatchKey = namedtuple('MatchKey', ['name', 'column', 'b_key', 'a_key', 'similarity_threshold'])
+
+def org_code(value):
+    """组织机构代码原样作为键，缺失时返回None"""
+    return None if value is None else str(value)
+
+def masked_credit_code(value):
+    """统一社会信用代码的前10位+后4位（A文件中间4位是星号），缺失或不足18位时返回None"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    code = str(value).strip()
+    if len(code) < 18:
+        return None
+    return code[:10] + code[14:]
+
+def masked_cardnum(cardnum):
+    """A文件cardnum的前10位+后4位，不足18位时返回None"""
+    if len(cardnum) < 18:
+        return None
+    return cardnum[:10] + cardnum[14:]
+
+ZZJGDM = MatchKey('zzjgdm', '组织机构代码', org_code, str, 0.8)
+SHXYDM = MatchKey('shxydm', '统一社会信用代码', masked_credit_code, masked_cardnum, 0.9)
+KEYS = {key.name: key for key in (ZZJGDM, SHXYDM)}
+
+def build_indexes(fileB_paths, keys):
+    """读取B文件一次，构建每种键的索引，返回 {键名: 索引}"""
+    indexes = {key.name: defaultdict(list) for key in keys}
+    for file_path in fileB_paths:
+        logger.info(f"处理文件: {os.path.basename(file_path)}")
+        try:
+            dataset = ds.dataset(file_path, format="parquet")
+            names = set(dataset.schema.names)
+            missing = [column for column in (NAME_COLUMN, VALUE_COLUMN) if column not in names]
+            if missing:
+                logger.warning(f"文件 {os.path.basename(file_path)} 缺少必要列: {missing}")
+                continue
+            present = []
+            for key in keys:
+                if key.column in names:
+                    present.append(key)
+                else:
+                    logger.warning(f"文件 {os.path.basename(file_path)} 缺少必要列: {key.column}")
+            columns = [NAME_COLUMN, VALUE_COLUMN] + sorted({key.column for key in present})
+
+            for batch in dataset.to_batches(columns=columns):
+                entries = list(zip(batch.column(NAME_COLUMN).to_pylist(), batch.column(VALUE_COLUMN).to_pylist()))
+                for key in present:
+                    index = indexes[key.name]
+                    for value, entry in zip(batch.column(key.column).to_pylist(), entries):
+                        k = key.b_key(value)
+                        if k is not None:
+                            index[k].append(entry)
+        except Exception as e:
+            logger.error(f"读取文件 {file_path} 出错: {str(e)}", exc_info=True)
+            continue
+    return {name: dict(index) for name, index in indexes.items()}
+
+def match_rows(fileA_df, index, key, batch_size=100000, similarity_threshold=None, rows=None):
+    """
+    A文件中尚未匹配的行与一种键的索引匹配
+    rows: 尚未匹配的行位置（升序的整数数组），None为全部行；similarity_threshold为None时使用key的阈值
+    返回 (匹配成功的行位置, 对应的newgcid, 仍未匹配的行位置)，都是numpy数组；A文件本身不会被修改或复制
+    """
+    if similarity_threshold is None:
+        similarity_threshold = key.similarity_threshold
+    if rows is None:
+        rows = np.arange(len(fileA_df))
+    matched_mask = np.zeros(len(rows), dtype=bool)
+    gcids = np.empty(len(rows), dtype=object)
+    # 名称相似度：先用上界排除候选，超大的桶建立字符倒排索引（结果与逐个计算相同，见name_matcher.py）
+    scorer = CandidateScorer(similarity_threshold)
+
+    # 分批次处理A文件，每批只取出需要的两列
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i+batch_size]
+        logger.info(f"正在处理A文件第{i}-{i+batch_size-1}行，共{len(batch)}条记录（{key.name}）")
+        cardnums = fileA_df['cardnum'].iloc[batch].to_numpy(dtype=object)
+        names = (fileA_df['name'].iloc[batch].to_numpy(dtype=object) if 'name' in fileA_df.columns
+                 else np.full(len(batch), '', dtype=object))
+
+        for j in range(len(batch)):
+            try:
+                code = key.a_key(str(cardnums[j]))
+                if code is None:
+                    continue
+                matches = index.get(code, [])
+                if not matches:
+                    continue
+                nameA = str(names[j]).upper()
+
+                # 桶内名称最相似的候选及其newgcid
+                best_ratio, best_gcid = scorer.best(code, matches, nameA)
+                if best_ratio >= similarity_threshold:
+                    matched_mask[i + j] = True
+                    gcids[i + j] = best_gcid
+
+            except Exception as e:
+                # 出错的行保留为未匹配
+                logger.warning(f"处理行数据出错: {str(e)}", exc_info=True)
+                continue
+    logger.info(f"相似度计算{scorer.scored}次（桶内候选共{scorer.total}个）")
+
+    return rows[matched_mask], gcids[matched_mask], rows[~matched_mask]
+
+def take_rows(fileA_df, rows, gcids=None):
+    """按行位置从A文件中取出输出用的数据（一次take），gcids不为None时添加newgcid列"""
+    result = fileA_df.take(rows).reset_index(drop=True)
+    if gcids is not None:
+        result['newgcid'] = gcids
+    return result
@@ -1,14 +1,15 @@
-import pandas as pd
 import numpy as np
-import pyarrow as pa
-from pyarrow import dataset as ds
-from collections import defaultdict
-from difflib import SequenceMatcher
 import os
 import sys
 import glob
 import gc
+import time
 import logging
+from dtype_policy import read_parquet_lean
+from match_core import SHXYDM, build_indexes, match_rows, take_rows
+from partitioned_parquet import save_parquet_output
+from prefetch import OrderedWriter, PrefetchTimer, prefetch
+from run_report import current_stage, run_stage, staged
 import warnings
 
 # 配置日志
@@ -20,6 +21,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 warnings.filterwarnings('ignore')
 
+SIMILARITY_THRESHOLD = 0.9  # 相似度阈值（90%）
+
 # ================== 核心优化函数 ==================
 def create_index_db(fileB_paths, index_file='.credit_index.npy', force_rebuild=False):
     """预处理B文件为内存索引（匹配前10位+后4位信用代码，跳过缺失/无效代码）"""
@@ -28,139 +31,56 @@ def create_index_db(fileB_paths, index_file='.credit_index.npy', force_rebuild=F
         return np.load(index_file, allow_pickle=True).item()
     
     logger.info(f"开始构建信用代码索引（共{len(fileB_paths)}个文件）...")
-    index = defaultdict(list)  # 键: 前10位+后4位信用代码, 值: [(企业名称, 县代码)]
-    
+    existing = []
     for file_path in fileB_paths:
-        if not os.path.exists(file_path):
+        if os.path.exists(file_path):
+            existing.append(file_path)
+        else:
             logger.error(f"文件不存在: {file_path}")
-            continue
-        logger.info(f"处理文件: {os.path.basename(file_path)}")
-        
-        try:
-            parquet_ds = ds.dataset(file_path, format="parquet")
-            
-            for batch in parquet_ds.to_batches():
-                chunk = batch.to_pandas()
-                
-                for _, row in chunk.iterrows():
-                    try:
-                        # 安全获取信用代码，缺失则跳过
-                        credit_code = row.get('统一社会信用代码', np.nan)
-                        if pd.isna(credit_code):
-                            continue
-                        credit_code_str = str(credit_code).strip()
-                        
-                        # 仅处理长度≥18位的有效信用代码
-                        if len(credit_code_str) < 18:
-                            continue
-                        
-                        # 提取前10位（0-9）和后4位（14-17），中间4位（10-13）是有效数据
-                        prefix = credit_code_str[:10]
-                        suffix = credit_code_str[14:]  # 15-18位（索引14-17）
-                        key = f"{prefix}{suffix}"
-
-
-                        # 可修改可修改可修改可修改可修改可修改可修改可修改可修改可修改可修改可修改
-                        # 将你需要的东西合并的东西加入索引，企业名称用于检查相似度
-                        # 同时修改def match_with_bfile(fileA_df, index, batch_size=100000):
-                        index[key].append((
-                        row['企业名称'], 
-                        row['newgcid']      # 添加组织机构代码
-                    ))
-                        
-                    except Exception as e:
-                        logger.debug(f"行处理异常（跳过）: {str(e)}")
-                        continue
-                        
-        except Exception as e:
-            logger.error(f"读取文件 {os.path.basename(file_path)} 出错: {str(e)}")
-            continue
+    # 键: 前10位+后4位信用代码（见match_core.masked_credit_code），值: [(企业名称, newgcid)]
+    # 索引的构建与match_zzjgdm.py、match_cascade.py共用（match_core.py），只读取需要的列
+    index = build_indexes(existing, [SHXYDM])[SHXYDM.name]
     
-    np.save(index_file, np.array(dict(index)))
+    np.save(index_file, np.array(index))
     logger.info(f"索引构建完成：共包含{len(index)}个有效信用代码索引，索引文件保存至{index_file}")
     return index
 
-def match_with_bfile(fileA_df, index, batch_size=100000):
-    """匹配A文件与B文件索引，返回匹配结果"""
-    matched = []
-    unmatched = []
-    SIMILARITY_THRESHOLD = 0.9  # 相似度阈值（90%）
-    
-    for i in range(0, len(fileA_df), batch_size):
-        batch = fileA_df.iloc[i:i+batch_size]
-        logger.info(f"正在处理A文件第{i}-{i+batch_size-1}行，共{len(batch)}条记录")
-        
-        for _, row in batch.iterrows():
-            try:
-                cardnum = str(row['cardnum'])
-                if len(cardnum) < 18:  # cardnum必须是18位才能提取有效部分
-                    unmatched.append(row.to_dict())
-                    continue
-                
-                # 提取前10位（0-9）和后4位（14-17），中间4位（10-13）是星号
-                prefix = cardnum[:10]  # 关键修改：前10位
-                suffix = cardnum[14:]  # 后4位（14-17）
-                key = f"{prefix}{suffix}"
-                
-                if not key:
-                    unmatched.append(row.to_dict())
-                    continue
-                    
-                matches = index.get(key, [])
-                if not matches:
-                    unmatched.append(row.to_dict())
-                    continue
-                    
-                best_similarity = 0.0
-                #以下是需要合并的项目
-                best_gcid = None     # 改为存储组织机构代码
-                nameA = str(row.get('name', '')).upper()
-                
-                for match in matches:
-                    #需要修改解包值
-                    nameB, gcid = match  # 解包三个值
-                    nameB_upper = str(nameB).upper()
-                    ratio = SequenceMatcher(None, nameA, nameB_upper).ratio()
-                    if ratio > best_similarity:
-                        best_similarity = ratio
-                        best_gcid = gcid        # 存储组织机构代码
-                
-                if best_similarity >= SIMILARITY_THRESHOLD:
-                    row_data = row.to_dict()
-                    row_data['newgcid'] = best_gcid        # 添加组织机构代码
-                    matched.append(row_data)
-                else:
-                    unmatched.append(row.to_dict())
-                    
-            except Exception as e:
-                logger.warning(f"处理行数据出错: {str(e)}")
-                continue
-    
-    return matched, unmatched
+def match_with_bfile(fileA_df, index, batch_size=100000, similarity_threshold=SIMILARITY_THRESHOLD, rows=None):
+    """
+    匹配A文件中尚未匹配的行与B文件索引（cardnum取前10位+后4位，中间4位是星号）
+    rows: 尚未匹配的行位置（升序的整数数组），None为全部行
+    返回 (匹配成功的行位置, 对应的newgcid, 仍未匹配的行位置)，都是numpy数组；A文件本身不会被修改或复制
+    """
+    return match_rows(fileA_df, index, SHXYDM, batch_size, similarity_threshold, rows)
 
 def read_parquet(file_path):
-    """读取单个Parquet文件"""
+    """读取单个Parquet文件（字符串列为string[pyarrow]，低基数列为category，整数降位）"""
     try:
-        return pd.read_parquet(file_path, engine='pyarrow')
+        return read_parquet_lean(file_path)
     except Exception as e:
         logger.error(f"读取Parquet文件 {file_path} 出错: {str(e)}", exc_info=True)
         raise
 
-# ================== 主程序 ==================
-def main():
-    fileA_path = input("请输入文件A（.parquet）的地址").replace("\"","")
-    fileB_path = input("请输入文件夹B的地址").replace("\"","")
-    batch_size_input = input("请输入每批量处理的数量，建议为100000")
-    output_path = input("请输入导出文件夹的地址").replace("\"","")
+# ================== 匹配流程 ==================
+@staged('match_shxydm')
+def run_matching(fileA, fileB_dir, output_dir, batch_size=100000, partition_cols=None,
+                 force_rebuild_index=False, similarity_threshold=SIMILARITY_THRESHOLD, lookup_key=None):
+    """
+    文件A依次与fileB_dir下（含子文件夹）的每个B文件匹配，结果写入output_dir
+    lookup_key: 'cardnum' 或 'newgcid'，输出按该列排序并写辅助索引，便于用partitioned_parquet.lookup按键查找
+    可在其他程序中直接调用；返回最终剩余未匹配的数据（DataFrame），出错时抛出异常
+    """
     # 配置参数
     INPUT = {
-        'fileA': rf"{fileA_path}",
-        'fileB_dir': rf"{fileB_path}",
+        'fileA': fileA,
+        'fileB_dir': fileB_dir,
         'index_file_template': ".credit_index_{}.npy",  # 模板：添加B文件基础名称作为标识
-        'force_rebuild_index': False,
-        'batch_size': int(batch_size_input)
+        'force_rebuild_index': force_rebuild_index,
+        'batch_size': int(batch_size),
+        'partition_cols': partition_cols,  # 按年份分区写出，如 ['publish_year']；None为单个parquet文件
+        'lookup_key': lookup_key  # 输出按该列排序，便于按键查找；None为原来的写法
     }
-    OUTPUT_DIR = rf"{output_path}"
+    OUTPUT_DIR = output_dir
     # 创建输出目录
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
@@ -175,47 +95,78 @@ def main():
         logger.info(f"开始读取文件A: {INPUT['fileA']}")
         fileA_df = read_parquet(INPUT['fileA'])
         logger.info(f"文件A初始数据量: {len(fileA_df)}条")
+        # 文件A只读取一次、不再修改，尚未匹配的行用行位置数组（选择向量）记录
+        remaining = np.arange(len(fileA_df))
         
-        # 逐个处理每个B文件，生成唯一索引
-        for b_idx, file_path in enumerate(fileB_paths, 1):
-            b_filename = os.path.basename(file_path)
-            b_basename = os.path.splitext(b_filename)[0]  # 提取B文件基础名称（不含扩展名）
-            logger.info(f"\n===== 开始处理第{b_idx}个B文件: {b_filename}（基础名称：{b_basename}） =====")
-            
+        stage = current_stage()
+        stage.add(rows_in=len(fileA_df))
+        stage.add_files_in([INPUT['fileA']] + fileB_paths)
+
+        def load_index(file_path):
             # 为当前B文件生成唯一索引文件（避免覆盖）
-            index_file = INPUT['index_file_template'].format(b_basename)
-            index = create_index_db(
-                fileB_paths=[file_path],
-                index_file=index_file,
-                force_rebuild=INPUT['force_rebuild_index']
-            )
-            
-            # 匹配A文件与当前B文件索引
-            matched, unmatched = match_with_bfile(fileA_df, index, INPUT['batch_size'])
-            
-            # 保存匹配结果（文件名含B文件基础名称，便于追溯）
-            matched_df = pd.DataFrame(matched)
-            matched_df.to_parquet(
-                os.path.join(OUTPUT_DIR, f'matched_{b_filename}'),  # 文件名包含B文件原始名称
-                engine='pyarrow'
-            )
-            logger.info(f"B文件匹配结果: 成功匹配{len(matched)}条, 未匹配{len(unmatched)}条")
-            
-            # 更新A文件为未匹配数据，继续匹配下一个B文件
-            fileA_df = pd.DataFrame(unmatched)
-            logger.info(f"剩余未匹配数据量: {len(fileA_df)}条")
-            
-            # 清理内存
-            del index, matched, unmatched, matched_df
-            gc.collect()
+            b_basename = os.path.splitext(os.path.basename(file_path))[0]
+            with run_stage('load_index') as load_stage:
+                load_stage.set(file=os.path.basename(file_path))
+                load_stage.add_files_in(file_path)
+                return create_index_db(
+                    fileB_paths=[file_path],
+                    index_file=INPUT['index_file_template'].format(b_basename),
+                    force_rebuild=INPUT['force_rebuild_index']
+                )
+
+        # 逐个处理每个B文件：匹配当前B文件时，后台线程预取下一个B文件的索引，匹配结果在后台写出
+        timer = PrefetchTimer()
+        run_start = time.perf_counter()
+        with OrderedWriter(timer) as writer:
+            for b_idx, (file_path, index) in enumerate(prefetch(fileB_paths, load_index, timer), 1):
+                b_filename = os.path.basename(file_path)
+                b_basename = os.path.splitext(b_filename)[0]  # 提取B文件基础名称（不含扩展名）
+                logger.info(f"\n===== 开始处理第{b_idx}个B文件: {b_filename}（基础名称：{b_basename}） =====")
+                
+                # 匹配A文件与当前B文件索引
+                with run_stage('match') as match_stage:
+                    match_stage.set(file=b_filename)
+                    matched_rows, gcids, unmatched_rows = match_with_bfile(
+                        fileA_df, index, INPUT['batch_size'], similarity_threshold, remaining)
+                    match_stage.add(rows_in=len(remaining), rows_out=len(matched_rows))
+                stage.add(rows_out=len(matched_rows))
+                
+                # 保存匹配结果（文件名含B文件基础名称，便于追溯）
+                matched_df = take_rows(fileA_df, matched_rows, gcids)
+                writer.submit(save_parquet_output, matched_df, OUTPUT_DIR, f'matched_{b_filename}',  # 文件名包含B文件原始名称
+                              INPUT['partition_cols'], sort_by=['cardnum'], lookup_key=INPUT['lookup_key'])
+                logger.info(f"B文件匹配结果: 成功匹配{len(matched_rows)}条, 未匹配{len(unmatched_rows)}条（继续匹配下一个B文件）")
+                
+                # 未匹配的行继续匹配下一个B文件（只保留行位置）
+                remaining = unmatched_rows
+                logger.info(f"剩余未匹配数据量: {len(remaining)}条")
+                
+                # 清理内存
+                del index, matched_rows, gcids, unmatched_rows, matched_df
+                gc.collect()
     
         # 保存最终未匹配数据
-        if not fileA_df.empty:
-            fileA_df.to_parquet(os.path.join(OUTPUT_DIR, 'remaining_unmatched.parquet'), engine='pyarrow')
-            logger.info(f"所有B文件处理完成！剩余未匹配数据: {len(fileA_df)}条")
+        remaining_df = take_rows(fileA_df, remaining)
+        if not remaining_df.empty:
+            save_parquet_output(remaining_df, OUTPUT_DIR, 'remaining_unmatched.parquet',
+                                INPUT['partition_cols'], sort_by=['cardnum'], lookup_key=INPUT['lookup_key'])
+            logger.info(f"所有B文件处理完成！剩余未匹配数据: {len(remaining_df)}条")
+        timer.report(logger, time.perf_counter() - run_start)
     
     except Exception as e:
         logger.error(f"程序执行出错: {str(e)}", exc_info=True)
+        raise
+    return remaining_df
+
+# ================== 主程序 ==================
+def main():
+    fileA_path = input("请输入文件A（.parquet）的地址").replace("\"","")
+    fileB_path = input("请输入文件夹B的地址").replace("\"","")
+    batch_size_input = input("请输入每批量处理的数量，建议为100000")
+    output_path = input("请输入导出文件夹的地址").replace("\"","")
+    try:
+        run_matching(rf"{fileA_path}", rf"{fileB_path}", rf"{output_path}", int(batch_size_input))
+    except Exception:
         sys.exit(1)
 
 if __name__ == "__main__":
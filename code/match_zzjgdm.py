@@ -1,22 +1,23 @@
 # 这是用于课题中匹配组织机构代码的程序
 # 运行地址在C盘-用户-mjy12中，索引文件也在那里
-# def match_with_bfile 函数中的SIMILARITY_THRESHOLD可以设置企业名称匹配的相似度下限，相似度低于下限则匹配失败，建议设置为0.85
+# SIMILARITY_THRESHOLD（或run_matching的similarity_threshold参数）可以设置企业名称匹配的相似度下限，相似度低于下限则匹配失败，建议设置为0.85
 # def main()中可以设置输入文件地址
 # 使用Doubao-Seed-1.6-flash与deepseek-v3编写
 
-import pandas as pd
 import numpy as np
-import pyarrow as pa
-from pyarrow import dataset as ds
-from collections import defaultdict
-from difflib import SequenceMatcher
 import os
 import sys
 import glob
 import gc  # 垃圾回收模块
+import time
 from multiprocessing import Pool, cpu_count
 import warnings
 import logging
+from dtype_policy import read_parquet_lean
+from match_core import ZZJGDM, build_indexes, match_rows, take_rows
+from partitioned_parquet import save_parquet_output
+from prefetch import OrderedWriter, PrefetchTimer, prefetch
+from run_report import current_stage, run_stage, staged
 
 # 配置日志
 logging.basicConfig(
@@ -27,6 +28,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 warnings.filterwarnings('ignore')
 
+SIMILARITY_THRESHOLD = 0.8  # 可根据实际数据调整相似度阈值
+
 # ================== 核心优化函数 ==================
 def create_index_db(fileB_paths, index_file='.code_index.npy', force_rebuild=False):
     """预处理单个B文件（Parquet格式）为内存索引"""
@@ -35,107 +38,53 @@ def create_index_db(fileB_paths, index_file='.code_index.npy', force_rebuild=Fal
         return np.load(index_file, allow_pickle=True).item()
     
     logger.info(f"开始构建机构代码索引（共{len(fileB_paths)}个文件）...")
-    index = defaultdict(list)
-    
     for file_path in fileB_paths:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"fileB文件不存在: {file_path}")
-        logger.info(f"处理文件: {os.path.basename(file_path)}")
-        
-        try:
-            parquet_ds = ds.dataset(file_path, format="parquet")
-            
-            for batch in parquet_ds.to_batches():
-                chunk = batch.to_pandas()
-                
-                for _, row in chunk.iterrows():
-                    try:
-                        code = str(row['组织机构代码'])
-                        index[code].append((
-                        row['企业名称'], 
-                        row['newgcid']
-                    ))
-                    except KeyError as e:
-                        logger.warning(f"文件 {os.path.basename(file_path)} 缺少必要列: {e}")
-                        continue
-                        
-        except Exception as e:
-            logger.error(f"读取文件 {file_path} 出错: {str(e)}", exc_info=True)
-            continue
+    # 索引的构建与match_shxydm.py、match_cascade.py共用（match_core.py），只读取需要的列
+    index = build_indexes(fileB_paths, [ZZJGDM])[ZZJGDM.name]
     
-    np.save(index_file, np.array(dict(index)))
+    np.save(index_file, np.array(index))
     logger.info(f"索引构建完成：共包含{len(index)}个组织机构代码，索引文件保存至{index_file}")
     return index
 
-def match_with_bfile(fileA_df, index, batch_size=100000):
-    """匹配单个B文件与当前A文件，返回匹配和未匹配结果"""
-    matched = []
-    unmatched = []
-    SIMILARITY_THRESHOLD = 0.8  # 可根据实际数据调整相似度阈值
-    
-    # 分批次处理A文件以节省内存
-    for i in range(0, len(fileA_df), batch_size):
-        batch = fileA_df.iloc[i:i+batch_size]
-        logger.info(f"正在处理A文件第{i}-{i+batch_size-1}行，共{len(batch)}条记录")
-        
-        for _, row in batch.iterrows():
-            try:
-                code = str(row['cardnum'])
-                nameA = str(row.get('name', '')).upper()
-                
-                matches = index.get(code, [])
-                if not matches:
-                    unmatched.append(row.to_dict())
-                    continue
-                    
-                best_ratio = 0.0
-                best_gcid= None  # 改为存储统一社会信用代码
-
-                
-                for nameB, gcid in matches:
-                    ratio = SequenceMatcher(None, nameA, str(nameB).upper()).ratio()
-                    if ratio > best_ratio:
-                        best_ratio = ratio
-                        best_gcid= gcid # 存储统一社会信用代码
-                        
-                if best_ratio >= SIMILARITY_THRESHOLD:
-                    row_data = row.to_dict()
-                    row_data['newgcid'] = best_gcid  # 添加统一社会信用代码
-
-                    matched.append(row_data)
-                else:
-                    unmatched.append(row.to_dict())
-                    
-            except Exception as e:
-                logger.warning(f"处理行数据出错: {str(e)}", exc_info=True)
-                continue
-    
-    return matched, unmatched
+def match_with_bfile(fileA_df, index, batch_size=100000, similarity_threshold=SIMILARITY_THRESHOLD, rows=None):
+    """
+    匹配单个B文件与A文件中尚未匹配的行
+    rows: 尚未匹配的行位置（升序的整数数组），None为全部行
+    返回 (匹配成功的行位置, 对应的newgcid, 仍未匹配的行位置)，都是numpy数组；A文件本身不会被修改或复制
+    """
+    return match_rows(fileA_df, index, ZZJGDM, batch_size, similarity_threshold, rows)
 
 def read_parquet(file_path):
-    """读取单个Parquet文件"""
+    """读取单个Parquet文件（字符串列为string[pyarrow]，低基数列为category，整数降位）"""
     try:
-        return pd.read_parquet(file_path, engine='pyarrow')
+        return read_parquet_lean(file_path)
     except Exception as e:
         logger.error(f"读取Parquet文件 {file_path} 出错: {str(e)}", exc_info=True)
         raise
 
-# ================== 主程序 ==================
-def main():
-    fileA_path = input("请输入文件A（.parquet）的地址").replace("\"","")
-    fileB_path = input("请输入文件夹B的地址").replace("\"","")
-    batch_size_input = input("请输入每批量处理的数量，建议为100000")
-    output_path =input("请输入导出文件夹的地址").replace("\"","")
-
+# ================== 匹配流程 ==================
+@staged('match_zzjgdm')
+def run_matching(fileA, fileB_dir, output_dir, batch_size=100000, partition_cols=None,
+                 force_rebuild_index=False, similarity_threshold=SIMILARITY_THRESHOLD, lookup_key=None):
+    """
+    文件A依次与fileB_dir下（含子文件夹）的每个B文件匹配，结果写入output_dir
+    lookup_key: 'cardnum' 或 'newgcid'，输出按该列排序并写辅助索引，便于用partitioned_parquet.lookup按键查找
+    可在其他程序中直接调用；返回最终剩余未匹配的数据（DataFrame），出错时抛出异常
+    """
     # 配置参数
     INPUT = {
-        'fileA': rf"{fileA_path}",
-        'fileB_dir': rf"{fileB_path}",
+        'fileA': fileA,
+        'fileB_dir': fileB_dir,
         'index_file_template': ".code_index_B{}.npy",  # 为每个B文件创建独立索引
-        'force_rebuild_index': False,
-        'batch_size': int(batch_size_input)  # A文件分块处理大小
+        'force_rebuild_index': force_rebuild_index,
+        'batch_size': int(batch_size),  # A文件分块处理大小
+        # 输出写成按年份分区的parquet数据集（如 ['publish_year']），None为单个parquet文件
+        'partition_cols': partition_cols,
+        'lookup_key': lookup_key  # 输出按该列排序，便于按键查找；None为原来的写法
     }
-    OUTPUT_DIR = rf"{output_path}"
+    OUTPUT_DIR = output_dir
     
     # 创建输出目录
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -157,55 +106,84 @@ def main():
         logger.info(f"开始读取fileA: {INPUT['fileA']}")
         fileA_df = read_parquet(INPUT['fileA'])
         logger.info(f"fileA初始数据量: {len(fileA_df)}条")
+        # fileA只读取一次、不再修改，尚未匹配的行用行位置数组（选择向量）记录
+        remaining = np.arange(len(fileA_df))
         
-        # 逐个处理每个B文件
-        for b_idx, file_path in enumerate(fileB_paths, 1):
-            b_filename = os.path.basename(file_path)  # 获取完整文件名（含扩展名）
-            b_basename = os.path.splitext(b_filename)[0]  # 去除扩展名，保留基础名称（如"企业数据2023"）
-            logger.info(f"\n===== 开始处理第{b_idx}个B文件: {b_filename}（基础名称：{b_basename}） =====")
-            
+        stage = current_stage()
+        stage.add(rows_in=len(fileA_df))
+        stage.add_files_in([INPUT['fileA']] + fileB_paths)
+
+        def load_index(file_path):
             # 构建当前B文件的索引（文件名含基础名称，避免冲突）
-            index_file = INPUT['index_file_template'].format(b_basename)
-            index = create_index_db(
-                fileB_paths=[file_path],
-                index_file=index_file,
-                force_rebuild=INPUT['force_rebuild_index']
-            )
-            
-            # 匹配当前B文件与A文件
-            matched, unmatched = match_with_bfile(fileA_df, index, INPUT['batch_size'])
-            
-            # 保存匹配结果（文件名含B文件基础名称）
-            matched_df = pd.DataFrame(matched)
-            unmatched_df = pd.DataFrame(unmatched)
-            matched_df.to_parquet(
-                os.path.join(OUTPUT_DIR, f'matched_{b_basename}.parquet'),
-                engine='pyarrow'
-            )
-            unmatched_df.to_parquet(
-                os.path.join(OUTPUT_DIR, f'unmatched_{b_basename}.parquet'),
-                engine='pyarrow'
-            )
-            logger.info(f"保存B文件匹配结果: 匹配成功{len(matched)}条, 未匹配{len(unmatched)}条")
-            
-            # 从A文件中剔除匹配成功的数据（保留未匹配数据继续匹配下一个B文件）
-            fileA_df = unmatched_df
-            logger.info(f"剩余未匹配A文件数据量: {len(fileA_df)}条")
-            
-            # 清理内存（删除临时变量，强制垃圾回收）
-            del index, matched, unmatched, matched_df, unmatched_df
-            gc.collect()
+            b_basename = os.path.splitext(os.path.basename(file_path))[0]
+            with run_stage('load_index') as load_stage:
+                load_stage.set(file=os.path.basename(file_path))
+                load_stage.add_files_in(file_path)
+                return create_index_db(
+                    fileB_paths=[file_path],
+                    index_file=INPUT['index_file_template'].format(b_basename),
+                    force_rebuild=INPUT['force_rebuild_index']
+                )
+
+        def save_results(matched_df, unmatched_df, b_basename):
+            save_parquet_output(matched_df, OUTPUT_DIR, f'matched_{b_basename}.parquet',
+                                INPUT['partition_cols'], sort_by=['cardnum'], lookup_key=INPUT['lookup_key'])
+            save_parquet_output(unmatched_df, OUTPUT_DIR, f'unmatched_{b_basename}.parquet',
+                                INPUT['partition_cols'], sort_by=['cardnum'], lookup_key=INPUT['lookup_key'])
+
+        # 逐个处理每个B文件：匹配当前B文件时，后台线程预取下一个B文件的索引，上一个B文件的结果在后台写出
+        timer = PrefetchTimer()
+        run_start = time.perf_counter()
+        with OrderedWriter(timer) as writer:
+            for b_idx, (file_path, index) in enumerate(prefetch(fileB_paths, load_index, timer), 1):
+                b_filename = os.path.basename(file_path)  # 获取完整文件名（含扩展名）
+                b_basename = os.path.splitext(b_filename)[0]  # 去除扩展名，保留基础名称（如"企业数据2023"）
+                logger.info(f"\n===== 开始处理第{b_idx}个B文件: {b_filename}（基础名称：{b_basename}） =====")
+                
+                # 匹配当前B文件与A文件
+                with run_stage('match') as match_stage:
+                    match_stage.set(file=b_filename)
+                    matched_rows, gcids, unmatched_rows = match_with_bfile(
+                        fileA_df, index, INPUT['batch_size'], similarity_threshold, remaining)
+                    match_stage.add(rows_in=len(remaining), rows_out=len(matched_rows))
+                stage.add(rows_out=len(matched_rows))
+                
+                # 保存匹配结果（文件名含B文件基础名称）
+                matched_df = take_rows(fileA_df, matched_rows, gcids)
+                unmatched_df = take_rows(fileA_df, unmatched_rows)
+                writer.submit(save_results, matched_df, unmatched_df, b_basename)
+                logger.info(f"B文件匹配结果: 匹配成功{len(matched_rows)}条, 未匹配{len(unmatched_rows)}条（后台写出）")
+                
+                # 未匹配的行继续匹配下一个B文件（只保留行位置）
+                remaining = unmatched_rows
+                logger.info(f"剩余未匹配A文件数据量: {len(remaining)}条")
+                
+                # 清理内存（删除临时变量，强制垃圾回收）
+                del index, matched_rows, gcids, unmatched_rows, matched_df, unmatched_df
+                gc.collect()
     
         # 保存最终未匹配数据（如果还有剩余）
-        if not fileA_df.empty:
-            fileA_df.to_parquet(
-                os.path.join(OUTPUT_DIR, 'remaining_unmatched.parquet'),
-                engine='pyarrow'
-            )
-            logger.info(f"所有B文件处理完成！剩余未匹配数据: {len(fileA_df)}条，已保存至remaining_unmatched.parquet")
+        remaining_df = take_rows(fileA_df, remaining)
+        if not remaining_df.empty:
+            save_parquet_output(remaining_df, OUTPUT_DIR, 'remaining_unmatched.parquet',
+                                INPUT['partition_cols'], sort_by=['cardnum'], lookup_key=INPUT['lookup_key'])
+            logger.info(f"所有B文件处理完成！剩余未匹配数据: {len(remaining_df)}条，已保存至remaining_unmatched.parquet")
+        timer.report(logger, time.perf_counter() - run_start)
     
     except Exception as e:
         logger.error(f"程序执行出错: {str(e)}", exc_info=True)
+        raise
+    return remaining_df
+
+# ================== 主程序 ==================
+def main():
+    fileA_path = input("请输入文件A（.parquet）的地址").replace("\"","")
+    fileB_path = input("请输入文件夹B的地址").replace("\"","")
+    batch_size_input = input("请输入每批量处理的数量，建议为100000")
+    output_path = input("请输入导出文件夹的地址").replace("\"","")
+    try:
+        run_matching(rf"{fileA_path}", rf"{fileB_path}", rf"{output_path}", int(batch_size_input))
+    except Exception:
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+# 说明：
+# 匹配程序中企业名称相似度（difflib.SequenceMatcher）的候选筛选，结果与逐个计算完全相同
+#   - 每个候选先用 real_quick_ratio / quick_ratio（相似度的上界）排除，上界低于阈值的不再计算ratio
+#   - 候选超过 LARGE_BUCKET 个的桶（分支机构共用的组织机构代码、信用代码掩码后冲突的键），
+#     第一次用到时为桶内名称建立字符倒排索引，只有与名称A共有足够字符的候选才会被计算：
+#       相似度 = 2M/(la+lb) ≥ t 且 M ≤ lb  ⇒  共有字符数 M ≥ t·la/(2-t)
+#     把名称A的字符按在桶内出现的次数从少到多排序，满足条件的候选一定包含其中最少见的
+#     la - ceil(t·la/(2-t)) + 1 个字符之一，因此只需合并这几个字符的倒排列表
+#     （"有限公司"等常见字排在最后，通常不会被用到）
+#   - 没有使用字符二元组：M中可能包含长度为1的匹配块，二元组重合数不能给出相似度的上界，会漏掉候选
+# 同分时取桶中靠前的候选，与原来的逐个比较一致
+
+import math
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+LARGE_BUCKET = 64   # 候选数超过这个值的桶建立倒排索引
+
+def _tokens(name):
+    """名称中的字符，重复出现的字符编号区分：'AAB' → ('A',1), ('A',2), ('B',1)"""
+    seen = defaultdict(int)
+    tokens = []
+    for ch in name:
+        seen[ch] += 1
+        tokens.append((ch, seen[ch]))
+    return tokens
+
+class BucketIndex:
+    """一个超大桶中名称的字符倒排索引"""
+    def __init__(self, names):
+        self.names = names
+        self.postings = defaultdict(list)   # (字符, 第几次出现) → 包含它的候选位置（升序）
+        self.token_sets = []                 # 每个候选的字符集合，交集大小即quick_ratio中的共有字符数
+        for pos, name in enumerate(names):
+            tokens = _tokens(name)
+            self.token_sets.append(frozenset(tokens))
+            for token in tokens:
+                self.postings[token].append(pos)
+
+    def candidates(self, nameA, threshold):
+        """可能达到阈值的候选位置（升序）；不能排除时返回None"""
+        la = len(nameA)
+        if la == 0 or threshold <= 0:
+            return None
+        if threshold > 1:
+            return []
+        # 减去1e-9使need偏小（多保留候选），避免浮点误差漏掉恰好等于阈值的候选
+        need = math.ceil(threshold * la / (2 - threshold) - 1e-9)
+        prefix_len = la - need + 1
+        if prefix_len <= 0:
+            return []
+        tokens = sorted(_tokens(nameA), key=lambda token: len(self.postings.get(token, ())))
+        found = set()
+        for token in tokens[:prefix_len]:
+            found.update(self.postings.get(token, ()))
+        return sorted(found)
+
+    def bounds(self, nameA, positions):
+        """各候选相似度的上界（与SequenceMatcher.quick_ratio相同），用集合交集计算，不逐个建立SequenceMatcher"""
+        tokens = frozenset(_tokens(nameA))
+        la = len(nameA)
+        for pos in positions:
+            length = la + len(self.names[pos])
+            yield pos, (2.0 * len(tokens & self.token_sets[pos]) / length if length else 1.0)
+
+class CandidateScorer:
+    """
+    一个B文件索引的名称比较：best(key, matches, nameA) 返回 (最高相似度, 对应的值)
+    最高相似度低于阈值时返回的结果只表示"未达到阈值"（上界已低于阈值的候选不会计算）
+    """
+    def __init__(self, threshold, large_bucket=LARGE_BUCKET):
+        self.threshold = threshold
+        self.large_bucket = large_bucket
+        self._large = {}       # 超大桶：键 → BucketIndex（含大写名称），小桶不缓存
+        self.total = 0          # 桶内候选总数
+        self.scored = 0         # 实际计算ratio的次数
+
+    def _small_bounds(self, nameA, names):
+        for pos, nameB in enumerate(names):
+            matcher = SequenceMatcher(None, nameA, nameB)
+            yield pos, (matcher.quick_ratio() if matcher.real_quick_ratio() >= self.threshold else 0.0)
+
+    def best(self, key, matches, nameA):
+        if len(matches) > self.large_bucket:
+            index = self._large.get(key)
+            if index is None:
+                index = self._large[key] = BucketIndex([str(match[0]).upper() for match in matches])
+            positions = index.candidates(nameA, self.threshold)
+            names = index.names
+            bounds = index.bounds(nameA, range(len(names)) if positions is None else positions)
+        else:
+            names = [str(match[0]).upper() for match in matches]
+            bounds = self._small_bounds(nameA, names)
+        self.total += len(names)
+
+        best_ratio = 0.0
+        best_value = None
+        for pos, bound in bounds:
+            # 上界低于阈值，或不超过当前最高值（只有更高才会替换）时，不会改变结果
+            if bound < self.threshold or (best_ratio and bound <= best_ratio):
+                continue
+            self.scored += 1
+            ratio = SequenceMatcher(None, nameA, names[pos]).ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_value = matches[pos][1]
+        return best_ratio, best_value
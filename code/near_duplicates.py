@@ -0,0 +1,222 @@
+# 说明：
+# duty文本的近似重复检测（SimHash），清洗后、生成批量推理jsonl之前使用
+# 很多判决文书的duty只是当事人名称、金额、日期不同，逐条推理既花钱又会在分析中重复计权
+#   - 签名：数字串统一替换为0、去掉空白后，取从每个字符开始的 SHINGLE_BYTES 个UTF-8字节作为特征，
+#     64位哈希按位投票得到SimHash；用numpy按批直接处理pyarrow的字符串缓冲区，不逐条循环
+#   - 聚类：汉明距离 ≤ d 的两个签名，把64位分成 d+KEY_BLOCKS 块时至少有KEY_BLOCKS块完全相同（抽屉原理），
+#     因此对每种块组合建一张表（按这几块的位排序），同一桶内与前 MAX_WINDOW 个签名比较，
+#     距离 ≤ d 的连边，用并查集合并成簇。每张表一次排序，不做两两比较，千万行也是近线性的
+#   - 大桶内只比较相邻的签名，极少数相距较远的近似重复可能分在不同簇（偏保守，不会误合并）；
+#     d越大合并越多，短文本中不相关文本被误合并的可能也越大
+#   - 簇ID为簇内第一行的位置（dup_cluster），该行即代表行（dup_representative），dup_size为簇大小；
+#     空文本或短于SHINGLE_BYTES的文本各自成簇
+# 用法：
+#   df = mark_near_duplicates(df, 'duty')            # 企业数据清洗.py 的run_cleaning中默认执行
+#   python change2json.py 时 representatives_only=True 只为代表行生成请求，
+#   attach_jsonl_content 会把代表行的推理结果填给同簇的其他行
+
+import itertools
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from run_report import current_stage, staged
+
+NEAR_DUP_DISTANCE = 6       # 汉明距离不超过这个值视为近似重复（64位中）
+SHINGLE_BYTES = 9           # 特征长度（字节），约3个汉字
+BATCH_BYTES = 2 ** 21       # 每批计算的文本字节数，控制中间结果的内存
+KEY_BLOCKS = 2              # 64位分成 d+KEY_BLOCKS 块，每张表以其中KEY_BLOCKS块为键
+MAX_WINDOW = 16             # 桶内最多与前几个签名比较（不超过MAX_WINDOW+1个签名的桶即两两比较）
+DIGITS_PATTERN = r'[0-9０-９]+'
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def _mix(h):
+    """splitmix64的混合函数，把输入打散到64位"""
+    h = h + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def _string_buffers(array):
+    """large_string数组的 (偏移, UTF-8字节)，偏移从0开始"""
+    _, offset_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offset_buffer, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, np.uint8)
+    return offsets - offsets[0], data[offsets[0]:offsets[-1]]
+
+def _normalize(array):
+    """数字串替换为0、去掉空白"""
+    array = pc.replace_substring_regex(array, DIGITS_PATTERN, '0')
+    return pc.replace_substring_regex(array, r'\s+', '')
+
+def _simhash_batch(array, shingle_bytes):
+    """一批文本（large_string数组）的签名和特征数"""
+    offsets, data = _string_buffers(_normalize(array))
+    # 每个字符的起始字节（不是UTF-8后续字节 10xxxxxx）都作为一个特征的开始
+    is_start = (data & 0xC0) != 0x80
+    cum_starts = np.concatenate(([0], np.cumsum(is_start, dtype=np.int64)))
+    last_start = np.maximum(offsets[1:] - shingle_bytes + 1, offsets[:-1])
+    counts = np.where(offsets[1:] - offsets[:-1] >= shingle_bytes,
+                      cum_starts[last_start] - cum_starts[offsets[:-1]], 0)
+    signatures = np.zeros(len(counts), dtype=np.uint64)
+    rows = np.flatnonzero(counts)
+    if len(rows) == 0:
+        return signatures, counts
+    row_counts = counts[rows]
+    segment_starts = np.cumsum(row_counts) - row_counts
+    # 所有特征的起始字节位置：每行第一个字符在start_positions中的序号 + 行内序号
+    start_positions = np.flatnonzero(is_start)
+    first = np.repeat(cum_starts[offsets[rows]] - segment_starts, row_counts)
+    starts = start_positions[first + np.arange(row_counts.sum())]
+    # 每次从任意字节位置读8个字节（非对齐视图），特征的哈希 = 逐个8字节块异或后混合
+    padded = np.concatenate((data, np.zeros(8, dtype=np.uint8)))
+    words = np.ndarray((len(data) + 1,), dtype='<u8', buffer=padded, strides=(1,))
+    h = np.zeros(len(starts), dtype=np.uint64)
+    for offset in range(0, shingle_bytes, 8):
+        word = words[starts + offset]
+        if shingle_bytes - offset < 8:
+            word &= np.uint64((1 << (8 * (shingle_bytes - offset))) - 1)
+        h = _mix(h ^ word)
+    # 逐位按文本分段求和（先取出连续的字节平面，再在平面内移位，比展开成 特征数×64 的矩阵快）
+    planes = h.view(np.uint8).reshape(-1, 8)
+    votes = []
+    for byte in range(8):
+        plane = np.ascontiguousarray(planes[:, byte])
+        votes.extend(np.add.reduceat((plane >> bit) & 1, segment_starts, dtype=np.int32) for bit in range(8))
+    votes = np.stack(votes)
+    packed = np.packbits(2 * votes > row_counts, axis=0, bitorder='little')
+    signatures[rows] = np.ascontiguousarray(packed.T).view('<u8').ravel()
+    return signatures, counts
+
+def simhash(texts, shingle_bytes=SHINGLE_BYTES):
+    """
+    计算文本的64位SimHash
+    返回 (签名 uint64数组, 是否有效 bool数组)；空文本或短于shingle_bytes的文本无效
+    """
+    array = pa.array(texts, type=pa.large_string(), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    n = len(array)
+    signatures = np.zeros(n, dtype=np.uint64)
+    valid = np.zeros(n, dtype=bool)
+    if n == 0:
+        return signatures, valid
+    offsets, _ = _string_buffers(array)
+
+    # 按文本字节数分批（每批单独规范化），中间结果的内存与总行数无关
+    begin = 0
+    while begin < n:
+        end = int(np.searchsorted(offsets, offsets[begin] + BATCH_BYTES, 'right')) - 1
+        end = min(max(end, begin + 1), n)
+        signatures[begin:end], counts = _simhash_batch(array.slice(begin, end - begin), shingle_bytes)
+        valid[begin:end] = counts > 0
+        begin = end
+    valid &= ~np.asarray(array.is_null(), dtype=bool)
+    return signatures, valid
+
+def _merge(labels, left, right):
+    """
+    并查集的向量化版本（挂接+路径压缩）：按边(left, right)合并，labels为每个节点所在分量的最小编号
+    输入输出的labels都满足 labels[labels] == labels
+    """
+    while len(left):
+        lu = labels[left]
+        lv = labels[right]
+        differ = lu != lv
+        if not differ.any():
+            break
+        lu, lv = lu[differ], lv[differ]
+        low = np.minimum(lu, lv)
+        np.minimum.at(labels, lu, low)
+        np.minimum.at(labels, lv, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        left, right = left[differ], right[differ]
+    return labels
+
+def _bucket_pairs(sorted_key, max_window):
+    """排序后键相同、相距不超过max_window的位置对 (i, i+w)"""
+    idx = np.flatnonzero(sorted_key[1:] == sorted_key[:-1])
+    w = 1
+    while len(idx) and w <= max_window:
+        yield idx, idx + w
+        w += 1
+        # i与i+w同桶时i与i+w-1必然同桶，所以只需在上一轮的位置中筛选
+        idx = idx[idx + w < len(sorted_key)]
+        idx = idx[sorted_key[idx + w] == sorted_key[idx]]
+
+def cluster_signatures(signatures, valid=None, max_distance=NEAR_DUP_DISTANCE, key_blocks=KEY_BLOCKS,
+                       max_window=MAX_WINDOW):
+    """
+    按汉明距离聚类，返回每行所在簇的代表行位置（簇内第一行）
+    valid为False的行各自成簇
+    """
+    n = len(signatures)
+    cluster = np.arange(n, dtype=np.int64)
+    rows = np.arange(n) if valid is None else np.flatnonzero(valid)
+    if len(rows) == 0:
+        return cluster
+    distinct, first_row, inverse = np.unique(signatures[rows], return_index=True, return_inverse=True)
+    first_row = rows[first_row]
+
+    blocks = max_distance + key_blocks
+    bounds = np.linspace(0, 64, blocks + 1).astype(int)
+    block_masks = [((1 << int(hi)) - 1) ^ ((1 << int(lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    labels = np.arange(len(distinct))
+    if max_distance > 0:
+        for combo in itertools.combinations(block_masks, key_blocks):
+            key = distinct & np.uint64(sum(combo))
+            # distinct已升序，稳定排序后桶内仍按签名排列
+            order = np.argsort(key, kind='stable')
+            sorted_key = key[order]
+            # 只处理成员分属不同簇的桶（近似重复的大桶通常在前几张表后就已经是同一簇）
+            starts = np.flatnonzero(np.concatenate(([True], sorted_key[1:] != sorted_key[:-1])))
+            sorted_labels = labels[order]
+            mixed = np.minimum.reduceat(sorted_labels, starts) != np.maximum.reduceat(sorted_labels, starts)
+            keep = np.repeat(mixed, np.diff(np.append(starts, len(order))))
+            order, sorted_key = order[keep], sorted_key[keep]
+            left, right = [], []
+            for i, j in _bucket_pairs(sorted_key, max_window):
+                a, b = order[j], order[i]
+                # 已在同一簇的不再计算距离（前面的表已经把大部分近似重复连起来了）
+                a, b = a[labels[a] != labels[b]], b[labels[a] != labels[b]]
+                close = _popcount(distinct[a] ^ distinct[b]) <= max_distance
+                left.append(a[close])
+                right.append(b[close])
+            # 每张表合并一次，后面的表只需处理新的连接（行数很少或桶都已合并时可能没有候选对）
+            if left:
+                labels = _merge(labels, np.concatenate(left), np.concatenate(right))
+
+    # 分量的代表行 = 分量内最早出现的行
+    representative = np.full(len(distinct), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(representative, labels, first_row)
+    cluster[rows] = representative[labels[inverse.ravel()]]
+    return cluster
+
+@staged('near_dup')
+def mark_near_duplicates(df, column='duty', max_distance=NEAR_DUP_DISTANCE, shingle_bytes=SHINGLE_BYTES):
+    """添加 dup_cluster、dup_size、dup_representative 三列（原地修改并返回df）"""
+    signatures, valid = simhash(df[column], shingle_bytes)
+    cluster = cluster_signatures(signatures, valid, max_distance)
+    sizes = np.bincount(cluster, minlength=len(df))
+    df['dup_cluster'] = cluster
+    df['dup_size'] = sizes[cluster].astype(np.int32)
+    df['dup_representative'] = cluster == np.arange(len(df))
+
+    clusters = int(df['dup_representative'].sum())
+    print(f"近似重复检测：{len(df)}条文本归为{clusters}个簇，"
+          f"{len(df) - clusters}条为近似重复（汉明距离≤{max_distance}）")
+    stage = current_stage()
+    stage.add(rows_in=len(df), rows_out=clusters)
+    stage.set(clusters=clusters, max_distance=max_distance)
+    return df
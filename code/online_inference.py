@@ -0,0 +1,355 @@
+# 说明：
+# 在线推理：把 change2json.py 生成的批量推理jsonl中的请求，直接并发发送到兼容chat/completions的HTTP接口
+# 适合急用的小批量数据（批量推理排队往往需要几个小时）
+#   - asyncio + aiohttp，连接池大小与并发数相同
+#   - 每分钟请求数（rpm）和每分钟token数（tpm）限速（令牌桶），token数按文本长度估计，收到响应后按usage修正
+#   - 429、5xx、超时和连接错误自动重试，指数退避（有Retry-After时按其等待）
+#   - 结果写成与批量推理结果相同的格式（custom_id + response.body），企业数据清洗.py 的parse_jsonl可以直接读取，
+#     输出文件按 qy-prompt1-<分块>.jsonl 命名即可被 attach_jsonl_content 关联回各分块
+#   - 每条结果写完立即flush；中断后重新运行会跳过输出文件中已成功的custom_id（断点续跑）
+#   - 失败的请求写入 <输出文件>.errors（不用.jsonl后缀，以免被attach_jsonl_content当作结果），重新运行时会再次发送
+# 用法：
+#   python online_inference.py qy-prompt1-1.jsonl 结果/qy-prompt1-1.jsonl --url https://.../api/v3/chat/completions \
+#       --model 模型或接入点ID --api-key-env ARK_API_KEY --concurrency 16 --rpm 1000 --tpm 500000
+#   python online_inference.py --mock-server --port 8000     启动本地模拟接口（返回"mock: <用户内容>"），用于测试
+# 需要安装aiohttp（pip install aiohttp）
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from run_report import current_stage, staged
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TIMEOUT = 120       # 单个请求的超时（秒）
+MAX_BACKOFF = 60            # 重试等待的上限（秒）
+BURST_SECONDS = 1           # 限速时最多攒下几秒的额度（避免开始时一次发出一整分钟的请求）
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+        import aiohttp.web
+    except ImportError as e:
+        raise ImportError("在线推理需要安装aiohttp: pip install aiohttp") from e
+    return aiohttp
+
+def estimate_tokens(body):
+    """按字符数估计请求的token数（中文约1字1token），加上max_tokens"""
+    chars = sum(len(str(message.get('content', ''))) for message in body.get('messages', []))
+    return chars + int(body.get('max_tokens') or 0)
+
+def is_success(item):
+    """结果行是否为成功的响应（与parse_jsonl能取出content的条件一致）"""
+    response = item.get('response') or {}
+    choices = (response.get('body') or {}).get('choices') or []
+    return bool(choices) and bool((choices[0].get('message') or {}).get('content'))
+
+def load_done_ids(output_path):
+    """输出文件中已成功的custom_id（不完整的最后一行会被忽略）"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if is_success(item):
+                done.add(item.get('custom_id'))
+    return done
+
+class RateLimiter:
+    """
+    每分钟请求数和token数的令牌桶；None为不限制
+    token额度可以透支：估计值超过桶容量的请求在桶满时发出，之后的请求等到额度还清
+    """
+    def __init__(self, rpm=None, tpm=None, burst_seconds=BURST_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._request_capacity = max(1.0, rpm * burst_seconds / 60) if rpm else 0.0
+        self._token_capacity = tpm * burst_seconds / 60 if tpm else 0.0
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self._request_capacity, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self._token_capacity, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens=0):
+        # 按到达顺序排队，前面的请求没有额度时后面的也等待
+        async with self._lock:
+            needed = min(tokens, self._token_capacity)
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < needed:
+                    wait = max(wait, (needed - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+    def adjust(self, tokens):
+        """实际用量与估计的差额（可以为负数）"""
+        if self.tpm:
+            self._tokens -= tokens
+
+def _backoff(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(MAX_BACKOFF, float(retry_after))
+        except ValueError:
+            pass
+    return min(MAX_BACKOFF, 2 ** attempt) * (0.5 + random.random())
+
+async def _send(session, url, headers, request, limiter, max_retries):
+    """发送一个请求（含重试），返回要写出的结果行"""
+    aiohttp = _import_aiohttp()
+    body = request['body']
+    estimated = estimate_tokens(body)
+    error = None
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(estimated)
+        retry_after = None
+        try:
+            async with session.post(url, json=body, headers=headers) as resp:
+                text = await resp.text()
+                if resp.status == 200:
+                    data = json.loads(text)
+                    used = (data.get('usage') or {}).get('total_tokens')
+                    if used is not None:
+                        limiter.adjust(used - estimated)
+                    return {'custom_id': request['custom_id'],
+                            'response': {'status_code': 200, 'body': data}, 'error': None}
+                error = {'code': resp.status, 'message': text[:500]}
+                if resp.status not in RETRY_STATUS:
+                    break
+                retry_after = resp.headers.get('Retry-After')
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            error = {'code': type(e).__name__, 'message': str(e)[:500]}
+        if attempt < max_retries:
+            await asyncio.sleep(_backoff(attempt, retry_after))
+    return {'custom_id': request['custom_id'], 'response': None, 'error': error}
+
+def _open_append(path):
+    """追加打开；上次中断留下的不完整行先补上换行，避免与新结果连在一起"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    f = open(path, 'a', encoding='utf-8')
+    if needs_newline:
+        f.write('\n')
+    return f
+
+async def run_requests_async(requests_path, output_path, url, api_key=None, model=None,
+                             concurrency=DEFAULT_CONCURRENCY, rpm=None, tpm=None, max_retries=5,
+                             timeout=DEFAULT_TIMEOUT):
+    """并发发送requests_path中的请求，结果追加写入output_path；返回统计信息"""
+    aiohttp = _import_aiohttp()
+    done = load_done_ids(output_path)
+    headers = {'Content-Type': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f"Bearer {api_key}"
+    limiter = RateLimiter(rpm, tpm)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    stats = {'total': 0, 'skipped': 0, 'ok': 0, 'failed': 0}
+
+    try:
+        from tqdm import tqdm
+        progress = tqdm(desc="在线推理", unit="条")
+    except ImportError:
+        progress = None
+
+    output = _open_append(output_path)
+    errors_path = output_path + '.errors'
+    errors = open(errors_path, 'w', encoding='utf-8')
+
+    async def producer():
+        # 逐行读取请求，不把整个文件读入内存
+        with open(requests_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                stats['total'] += 1
+                if request['custom_id'] in done:
+                    stats['skipped'] += 1
+                    continue
+                if model and 'model' not in request['body']:
+                    request['body']['model'] = model
+                await queue.put(request)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker(session):
+        while True:
+            request = await queue.get()
+            if request is None:
+                return
+            result = await _send(session, url, headers, request, limiter, max_retries)
+            # 事件循环是单线程的，整行一次写出不会与其他结果交错
+            if result['error'] is None:
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+                stats['ok'] += 1
+            else:
+                errors.write(json.dumps(result, ensure_ascii=False) + '\n')
+                errors.flush()
+                stats['failed'] += 1
+            if progress is not None:
+                progress.update(1)
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    try:
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            await asyncio.gather(producer(), *(worker(session) for _ in range(concurrency)))
+    finally:
+        output.close()
+        errors.close()
+        if not stats['failed']:
+            os.remove(errors_path)
+        if progress is not None:
+            progress.close()
+    stats['seconds'] = time.perf_counter() - start
+    print(f"在线推理完成：共{stats['total']}条，跳过已完成{stats['skipped']}条，成功{stats['ok']}条，"
+          f"失败{stats['failed']}条，用时{stats['seconds']:.1f}s")
+    if stats['failed']:
+        print(f"失败的请求见 {errors_path}，重新运行即可重试")
+    return stats
+
+@staged('online_inference')
+def run_inference(requests_path, output_path, url, api_key=None, model=None, concurrency=DEFAULT_CONCURRENCY,
+                  rpm=None, tpm=None, max_retries=5, timeout=DEFAULT_TIMEOUT):
+    """run_requests_async的同步版本，供其他脚本直接调用"""
+    stats = asyncio.run(run_requests_async(requests_path, output_path, url, api_key, model,
+                                           concurrency, rpm, tpm, max_retries, timeout))
+    stage = current_stage()
+    stage.add(rows_in=stats['total'], rows_out=stats['ok'])
+    stage.add_files_in(requests_path)
+    return stats
+
+# ================== 本地模拟接口（测试用） ==================
+class MockServer:
+    """
+    兼容chat/completions的本地模拟接口，返回 "mock: <最后一条消息内容>"
+    latency: 每个请求的延迟（秒）；fail_every: 每n个请求返回一次429（0为不失败）
+    记录收到的请求数和最大同时处理数，便于检查并发限制
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, fail_every=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._runner = None
+
+    async def _handle(self, request):
+        web = _import_aiohttp().web
+        self.requests += 1
+        if self.fail_every and self.requests % self.fail_every == 0:
+            return web.json_response({'error': {'message': 'rate limited'}}, status=429, headers={'Retry-After': '0'})
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            body = await request.json()
+            await asyncio.sleep(self.latency)
+            content = body['messages'][-1]['content']
+            return web.json_response({
+                'id': f"mock-{self.requests}",
+                'object': 'chat.completion',
+                'model': body.get('model', 'mock'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': f"mock: {content}"}}],
+                'usage': {'total_tokens': estimate_tokens(body) + len(content) + 6},
+            })
+        finally:
+            self.active -= 1
+
+    async def start(self):
+        web = _import_aiohttp().web
+        app = web.Application()
+        app.router.add_post('/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        self.url = await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+async def _serve_forever(port, latency, fail_every):
+    server = MockServer(port=port, latency=latency, fail_every=fail_every)
+    url = await server.start()
+    print(f"模拟接口已启动: {url}（Ctrl+C 退出）")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并发发送批量推理jsonl中的请求（在线推理）")
+    parser.add_argument('requests', nargs='?', help="change2json.py 生成的请求jsonl")
+    parser.add_argument('output', nargs='?', help="结果jsonl（已存在时跳过其中已成功的请求）")
+    parser.add_argument('--url', help="chat/completions接口地址")
+    parser.add_argument('--model', help="模型名或接入点ID（请求中没有model时添加）")
+    parser.add_argument('--api-key-env', default='ARK_API_KEY', help="保存API Key的环境变量名")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同时进行的请求数")
+    parser.add_argument('--rpm', type=float, help="每分钟请求数上限")
+    parser.add_argument('--tpm', type=float, help="每分钟token数上限")
+    parser.add_argument('--retries', type=int, default=5, help="每个请求的最大重试次数")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="单个请求的超时（秒）")
+    parser.add_argument('--mock-server', action='store_true', help="启动本地模拟接口")
+    parser.add_argument('--port', type=int, default=8000, help="模拟接口端口")
+    parser.add_argument('--latency', type=float, default=0.05, help="模拟接口每个请求的延迟（秒）")
+    parser.add_argument('--fail-every', type=int, default=0, help="模拟接口每n个请求返回一次429")
+    args = parser.parse_args(argv)
+
+    if args.mock_server:
+        asyncio.run(_serve_forever(args.port, args.latency, args.fail_every))
+        return 0
+    if not (args.requests and args.output and args.url):
+        parser.error("需要 请求jsonl、结果jsonl 和 --url")
+    stats = run_inference(args.requests, args.output, args.url, os.environ.get(args.api_key_env), args.model,
+                          args.concurrency, args.rpm, args.tpm, args.retries, args.timeout)
+    return 1 if stats['failed'] else 0
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except KeyboardInterrupt:
+        print("已中断，重新运行即可从中断处继续")
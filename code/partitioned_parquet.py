@@ -0,0 +1,235 @@
+# 说明：
+# 按年份等列写出hive分区的parquet数据集（如 输出文件夹/publish_year=2019/part1-0.parquet）
+# 每个分区内的数据按排序列排好再写，行组自带min/max统计信息，
+# 读取时按年份筛选只会打开对应的分区目录，并可利用统计信息跳过行组
+# 企业数据清洗.py、match_zzjgdm.py、match_shxydm.py、match_cascade.py 的输出，以及合并parquet文件.py 的读取都使用这里的函数
+# 便于按键查找的输出（匹配程序的lookup_key参数）：
+#   - 按查找键（cardnum或newgcid）排序，行组较小（LOOKUP_ROW_GROUP行），带min/max统计信息，
+#     查找排序键时只读取值落在[min, max]内的几个行组
+#   - 另一个键列无序，单文件输出时为它写一个辅助索引 <文件名>.parquet.<列名>.lookup
+#     （键 → 所在行组，本身也按键排序、带统计信息；扩展名不是.parquet，不会被 *.parquet 匹配到）
+#   - pyarrow支持时同时为两列写parquet布隆过滤器，供DuckDB、Spark等读取时跳过行组
+#   - lookup(路径, 列名, 值列表) 只读取可能包含这些值的行组；分区数据集目录交给pyarrow按统计信息筛选
+
+import glob
+import inspect
+import os
+import shutil
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from convert_engine import to_expression
+
+LOOKUP_COLUMNS = ('cardnum', 'newgcid')   # 下游按这些列查找匹配结果
+LOOKUP_ROW_GROUP = 20000                   # 便于查找的输出每个行组的行数（默认写出时一个行组可达百万行）
+INDEX_ROW_GROUP = 65536                    # 辅助索引文件每个行组的行数
+BLOOM_FPP = 0.01                           # 布隆过滤器的误判率
+LOOKUP_INDEX_SUFFIX = '.lookup'
+
+def reset_dataset_dir(root):
+    """清空并重新创建数据集目录（分区数据集是追加写入的，重跑前需要先清空）"""
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root, exist_ok=True)
+
+def _to_table(data, partition_cols):
+    if isinstance(data, pa.Table):
+        return data
+    data = data.copy(deep=False)
+    for col in partition_cols:
+        # 含缺失值的年份列在pandas中是float，转为可空整数，避免出现 publish_year=2019.0
+        if pd.api.types.is_float_dtype(data[col]) and (data[col].dropna() % 1 == 0).all():
+            data[col] = data[col].astype('Int64')
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+def write_partitioned(data, root, partition_cols=('publish_year',), sort_by=None,
+                      basename_template='part-{i}.parquet', row_group_size=100000, bloom_columns=None):
+    """
+    把DataFrame或Arrow表写入hive分区数据集
+    参数:
+    data: pandas.DataFrame 或 pyarrow.Table
+    root (str): 数据集根目录
+    partition_cols: 分区列，如 ['publish_year']
+    sort_by: 分区内的排序列，如 ['case_year', 'cardnum']
+    basename_template (str): 文件名模板，必须包含 {i}；多次写入同一目录时需各不相同
+    row_group_size (int): 每个行组的最大行数
+    bloom_columns: 为这些列写parquet布隆过滤器（pyarrow支持时）
+    """
+    partition_cols = list(partition_cols)
+    table = _to_table(data, partition_cols)
+    if table.num_rows == 0:
+        return 0
+    sort_keys = partition_cols + [col for col in (sort_by or [])
+                                  if col not in partition_cols and col in table.schema.names]
+    table = table.sort_by([(col, 'ascending') for col in sort_keys])
+
+    partitioning = ds.partitioning(
+        pa.schema([table.schema.field(col) for col in partition_cols]),
+        flavor='hive'
+    )
+    ds.write_dataset(
+        table, root,
+        format='parquet',
+        partitioning=partitioning,
+        basename_template=basename_template,
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=min(row_group_size, table.num_rows),
+        file_options=_dataset_write_options(bloom_columns, row_group_size),
+    )
+    return table.num_rows
+
+def _dataset_write_options(bloom_columns, row_group_size):
+    file_format = ds.ParquetFileFormat()
+    if bloom_columns:
+        try:
+            return file_format.make_write_options(
+                write_statistics=True, bloom_filter_options=_bloom_filter_options(bloom_columns, row_group_size))
+        except TypeError:
+            pass  # 旧版pyarrow不能写布隆过滤器
+    return file_format.make_write_options(write_statistics=True)
+
+def save_parquet_output(df, output_dir, filename, partition_cols=None, sort_by=None, lookup_key=None):
+    """
+    保存匹配结果：未指定分区列时写成单个 filename；
+    指定分区列时写成同名（去掉.parquet）的分区数据集目录
+    数据缺少分区列（如没有匹配结果的空表）时退回单文件
+    lookup_key: 'cardnum' 或 'newgcid'，写成按该列排序、便于查找的输出（见write_lookup_file）；
+    数据中没有该列时（如未匹配的数据没有newgcid）按LOOKUP_COLUMNS中的其他列排序
+    """
+    sort_key = None
+    if lookup_key:
+        sort_key = next((col for col in [lookup_key, *LOOKUP_COLUMNS] if col in df.columns), None)
+    if partition_cols and all(col in df.columns for col in partition_cols):
+        root = os.path.join(output_dir, os.path.splitext(filename)[0])
+        reset_dataset_dir(root)
+        if sort_key:
+            write_partitioned(df, root, partition_cols, [sort_key], row_group_size=LOOKUP_ROW_GROUP,
+                              bloom_columns=[col for col in LOOKUP_COLUMNS if col in df.columns])
+        else:
+            write_partitioned(df, root, partition_cols, sort_by)
+        return root
+    path = os.path.join(output_dir, filename)
+    # 旧的辅助索引与新写出的文件不对应，先删除
+    for index_path in glob.glob(glob.escape(path) + '.*' + LOOKUP_INDEX_SUFFIX):
+        os.remove(index_path)
+    if sort_key:
+        write_lookup_file(df, path, sort_key, [col for col in LOOKUP_COLUMNS if col in df.columns])
+    else:
+        df.to_parquet(path, engine='pyarrow')
+    return path
+
+def _bloom_filter_options(columns, row_group_size):
+    # 每个行组的每列一个布隆过滤器，不同值的个数不超过行组的行数
+    return {col: {'ndv': max(int(row_group_size), 1), 'fpp': BLOOM_FPP} for col in columns}
+
+def _writer_options(columns, row_group_size, sort_column=None):
+    """ParquetWriter的统计信息、页索引、排序列、布隆过滤器参数，旧版pyarrow不支持的参数不传"""
+    supported = inspect.signature(pq.ParquetWriter).parameters
+    options = {'write_statistics': True}
+    if 'write_page_index' in supported:
+        options['write_page_index'] = True
+    if sort_column is not None and 'sorting_columns' in supported:
+        options['sorting_columns'] = [pq.SortingColumn(sort_column)]
+    if columns and 'bloom_filter_options' in supported:
+        options['bloom_filter_options'] = _bloom_filter_options(columns, row_group_size)
+    return options
+
+def lookup_index_path(path, column):
+    """单文件输出中column列的辅助索引文件"""
+    return f"{path}.{column}{LOOKUP_INDEX_SUFFIX}"
+
+def write_lookup_file(data, path, sort_key, key_columns=LOOKUP_COLUMNS, row_group_size=LOOKUP_ROW_GROUP):
+    """
+    写出便于按键查找的单个parquet文件：按sort_key排序，每row_group_size行一个行组，
+    key_columns中的其他列各写一个辅助索引（键 → 行组），返回写出的行数
+    """
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    table = table.sort_by([(sort_key, 'ascending')])
+    key_columns = [col for col in key_columns if col in table.schema.names]
+    options = _writer_options(key_columns, row_group_size, table.schema.get_field_index(sort_key))
+    with pq.ParquetWriter(path, table.schema, **options) as writer:
+        writer.write_table(table, row_group_size=row_group_size)
+
+    row_groups = pa.array(np.arange(table.num_rows, dtype=np.int32) // row_group_size)
+    for col in key_columns:
+        if col == sort_key:
+            continue
+        pairs = pa.table({'key': table.column(col), 'row_group': row_groups})
+        pairs = pairs.filter(pc.is_valid(pairs['key'])).group_by(['key', 'row_group']).aggregate([])
+        pairs = pairs.sort_by([('key', 'ascending'), ('row_group', 'ascending')])
+        # 记录主文件的行数，主文件被其他程序覆盖后不再使用这个索引
+        pairs = pairs.replace_schema_metadata({'num_rows': str(table.num_rows)})
+        with pq.ParquetWriter(lookup_index_path(path, col), pairs.schema,
+                              **_writer_options([], INDEX_ROW_GROUP, 0)) as writer:
+            writer.write_table(pairs, row_group_size=INDEX_ROW_GROUP)
+    return table.num_rows
+
+def _lookup_values(values, value_type):
+    """查找值转为列的类型，去掉缺失值、去重并排序"""
+    array = pa.array(list(values), from_pandas=True)
+    array = pc.unique(pc.drop_null(array.cast(value_type)))
+    return array.take(pc.sort_indices(array))
+
+def _row_groups_by_statistics(parquet_file, column, sorted_values):
+    """[min, max]内有查找值的行组（没有统计信息的行组不能排除）"""
+    position = parquet_file.metadata.schema.names.index(column)
+    groups = []
+    for i in range(parquet_file.num_row_groups):
+        stats = parquet_file.metadata.row_group(i).column(position).statistics
+        if stats is None or not stats.has_min_max:
+            groups.append(i)
+            continue
+        k = bisect_left(sorted_values, stats.min)
+        if k < len(sorted_values) and sorted_values[k] <= stats.max:
+            groups.append(i)
+    return groups
+
+def plan_lookup(path, column, values):
+    """
+    单个parquet文件中可能包含column列这些值的行组编号
+    有辅助索引时查索引，否则按行组的min/max统计信息筛选（排序列只剩几个行组，无序列通常全部保留）
+    """
+    parquet_file = pq.ParquetFile(path)
+    value_array = _lookup_values(values, parquet_file.schema_arrow.field(column).type)
+    if len(value_array) == 0:
+        return []
+    index_path = lookup_index_path(path, column)
+    if os.path.exists(index_path):
+        metadata = pq.read_schema(index_path).metadata or {}
+        if metadata.get(b'num_rows') == str(parquet_file.metadata.num_rows).encode():
+            found = lookup(index_path, 'key', value_array, columns=['row_group'])
+            return sorted(set(found.column('row_group').to_pylist()))
+    return _row_groups_by_statistics(parquet_file, column, value_array.to_pylist())
+
+def lookup(path, column, values, columns=None):
+    """
+    读取column列等于values中任意值的行，返回pyarrow.Table（需要时调用.to_pandas()）
+    path: save_parquet_output写出的单个文件（只读取plan_lookup给出的行组）或分区数据集目录
+    columns: 只读取这些列，None为全部
+    """
+    if os.path.isdir(path):
+        # 分区数据集：pyarrow按行组统计信息跳过不含这些值的行组
+        value_array = _lookup_values(values, open_partitioned(path).schema.field(column).type)
+        return open_partitioned(path).to_table(columns=columns, filter=ds.field(column).isin(value_array))
+    parquet_file = pq.ParquetFile(path)
+    value_array = _lookup_values(values, parquet_file.schema_arrow.field(column).type)
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, column]))
+    table = parquet_file.read_row_groups(plan_lookup(path, column, value_array), columns=read_columns)
+    table = table.filter(pc.is_in(table.column(column), value_set=value_array))
+    return table if columns is None else table.select(list(columns))
+
+def open_partitioned(root):
+    """打开hive分区数据集（分区列会作为普通列出现）"""
+    return ds.dataset(root, format='parquet', partitioning='hive')
+
+def read_partitioned(root, filters=None, columns=None):
+    """
+    读取分区数据集，filters写法同pandas.read_parquet，
+    如 [('publish_year', '>=', 2019)]，只会读取满足条件的分区
+    返回pyarrow.Table（需要时调用.to_pandas()）
+    """
+    return open_partitioned(root).to_table(columns=columns, filter=to_expression(filters))
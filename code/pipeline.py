@@ -0,0 +1,302 @@
+# 说明：
+# 简单的流程运行器：每个阶段声明 输入、参数、输出，运行前计算缓存键
+#   缓存键 = 阶段函数所在模块及其导入的本地模块（同一文件夹中的.py，逐层查找）的代码 + 参数 + 所有输入文件的内容哈希
+#   例如修改 match_core.py、name_matcher.py 也会使匹配阶段重跑
+# 缓存键与上次成功运行时相同、且输出都在（未被改动）时跳过该阶段，并说明跳过或重跑的原因
+# 上游阶段的输出是下游阶段的输入：只改匹配阈值时，转换和清洗的缓存键不变，只重跑匹配
+# 文件内容哈希按 (路径, 大小, 修改时间) 缓存，文件未变化时不会重新读取
+# 运行记录保存在 cache_dir（默认 .pipeline_cache）中，删除该文件夹即全部重跑
+# 示例见 全流程.py
+
+import ast
+import hashlib
+import inspect
+import json
+import os
+import time
+from functools import partial
+
+HASH_BUFFER = 1 << 20
+
+def _canonical(value):
+    """参数转为稳定的JSON文本（字典按键排序，无法序列化的对象用str）"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+class FileHashCache:
+    """文件内容哈希（sha256），按 (大小, 修改时间) 缓存到json文件"""
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._entries = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self._entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BUFFER), b''):
+                digest.update(block)
+        self._entries[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def digest(self, path):
+        """文件或文件夹（所有文件的相对路径与内容）的哈希，不存在时返回None"""
+        if os.path.isfile(path):
+            return self.file_digest(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).replace(os.sep, '/').encode('utf-8'))
+                digest.update(self.file_digest(full).encode('ascii'))
+        return digest.hexdigest()
+
+def _imported_names(source, path):
+    """源码中所有import语句（包括函数内的延迟导入）导入的模块名；相对导入转换为相对本文件夹的名称"""
+    names = []
+    for node in ast.walk(ast.parse(source, filename=path)):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            prefix = '.' * node.level
+            names.append(prefix + base)
+            # from 包 import 子模块
+            names.extend(prefix + (base + '.' if base else '') + alias.name for alias in node.names)
+    return names
+
+def _local_files(name, base_dir, current_dir):
+    """模块名对应的本地源文件（不在base_dir中的模块返回空列表）"""
+    if name.startswith('.'):
+        root = current_dir
+        name = name.lstrip('.')
+    else:
+        root = base_dir
+    parts = [part for part in name.split('.') if part]
+    files = []
+    for k in range(1, len(parts) + 1):
+        stem = os.path.join(root, *parts[:k])
+        for candidate in (stem + '.py', os.path.join(stem, '__init__.py')):
+            if os.path.isfile(candidate):
+                files.append(candidate)
+    return files
+
+def code_files(func):
+    """
+    阶段函数所在模块（第一个）及其逐层导入的本地模块的源文件（同一文件夹中的.py及包），
+    取不到源文件时返回空列表
+    """
+    while isinstance(func, partial):
+        func = func.func
+    try:
+        # @staged等装饰器（functools.wraps）包装的函数取原函数所在的模块
+        start = os.path.abspath(inspect.getsourcefile(inspect.unwrap(func)))
+    except (TypeError, OSError):
+        return []
+    base_dir = os.path.dirname(start)
+    seen = set()
+    pending = [start]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            names = _imported_names(source, path)
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            continue
+        for name in names:
+            pending.extend(os.path.abspath(p) for p in _local_files(name, base_dir, os.path.dirname(path)))
+    seen.discard(start)
+    return [start] + sorted(seen)
+
+def code_digest(func):
+    """
+    阶段函数所在模块及其导入的本地模块源文件的哈希（partial取其原函数），
+    取不到源文件时用函数源码
+    """
+    files = code_files(func)
+    if files:
+        # 按相对阶段模块所在文件夹的路径记录，项目文件夹移动后缓存键不变
+        base_dir = os.path.dirname(files[0])
+        digest = hashlib.sha256()
+        for path in sorted(files):
+            digest.update(os.path.relpath(path, base_dir).replace(os.sep, '/').encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+    while isinstance(func, partial):
+        func = func.func
+    try:
+        return hashlib.sha256(inspect.getsource(inspect.unwrap(func)).encode('utf-8')).hexdigest()
+    except (TypeError, OSError):
+        return getattr(func, '__qualname__', repr(func))
+
+class Stage:
+    """
+    一个阶段：运行时调用 func(**params)
+    inputs/outputs 为文件或文件夹路径列表；params 中的路径参数也会计入缓存键
+    version 可手动修改以强制重跑（如修改了函数调用的其他模块）
+    """
+    def __init__(self, name, func, inputs=(), params=None, outputs=(), version=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = dict(params or {})
+        self.outputs = list(outputs)
+        self.version = version
+
+class Pipeline:
+    def __init__(self, cache_dir='.pipeline_cache'):
+        self.cache_dir = cache_dir
+        self.stages = []
+        self.hashes = FileHashCache(os.path.join(cache_dir, 'file_hashes.json'))
+
+    def add(self, name, func, inputs=(), params=None, outputs=(), version=None):
+        if any(stage.name == name for stage in self.stages):
+            raise ValueError(f"阶段名重复: {name}")
+        stage = Stage(name, func, inputs, params, outputs, version)
+        self.stages.append(stage)
+        return stage
+
+    # ---------- 运行记录 ----------
+    def _record_path(self, stage):
+        safe = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in stage.name)
+        return os.path.join(self.cache_dir, 'stages', f'{safe}.json')
+
+    def _load_record(self, stage):
+        path = self._record_path(stage)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_record(self, stage, record):
+        path = self._record_path(stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+    # ---------- 缓存键 ----------
+    def _components(self, stage):
+        inputs = {}
+        for path in stage.inputs:
+            digest = self.hashes.digest(path)
+            if digest is None:
+                raise FileNotFoundError(f"阶段 {stage.name} 的输入不存在: {path}")
+            inputs[path] = digest
+        return {
+            'code': code_digest(stage.func),
+            'version': stage.version,
+            'params': json.loads(_canonical(stage.params)),
+            'inputs': inputs,
+        }
+
+    @staticmethod
+    def _key(components):
+        return hashlib.sha256(_canonical(components).encode('utf-8')).hexdigest()
+
+    def _explain(self, stage, components, record):
+        """与上次运行记录比较，返回重跑原因列表（为空表示可以跳过）"""
+        if record is None:
+            return ["没有运行记录（首次运行）"]
+        reasons = []
+        old = record['components']
+        if old.get('code') != components['code']:
+            reasons.append("阶段代码（或其导入的本地模块）有变化")
+        if old.get('version') != components['version']:
+            reasons.append(f"version: {old.get('version')} → {components['version']}")
+        old_params, new_params = old.get('params', {}), components['params']
+        for name in sorted(set(old_params) | set(new_params)):
+            if old_params.get(name) != new_params.get(name):
+                reasons.append(f"参数 {name}: {old_params.get(name, '（无）')} → {new_params.get(name, '（无）')}")
+        old_inputs, new_inputs = old.get('inputs', {}), components['inputs']
+        for path in sorted(set(old_inputs) | set(new_inputs)):
+            if path not in old_inputs:
+                reasons.append(f"新增输入: {path}")
+            elif path not in new_inputs:
+                reasons.append(f"去掉了输入: {path}")
+            elif old_inputs[path] != new_inputs[path]:
+                reasons.append(f"输入内容有变化: {path}")
+        for path in stage.outputs:
+            digest = self.hashes.digest(path)
+            if digest is None:
+                reasons.append(f"输出不存在: {path}")
+            elif digest != record.get('outputs', {}).get(path):
+                reasons.append(f"输出在上次运行后被修改: {path}")
+        return reasons
+
+    # ---------- 运行 ----------
+    def run(self, force=(), dry_run=False):
+        """
+        按添加顺序运行各阶段
+        force: 强制重跑的阶段名（列表），或True表示全部重跑
+        dry_run: 只说明每个阶段会跳过还是重跑，不实际运行
+        返回 [{'stage', 'action', 'reasons', 'seconds'}, ...]
+        """
+        report = []
+        will_run = set()
+        for stage in self.stages:
+            produced_upstream = [s.name for s in self.stages if s.name in will_run
+                                 and set(s.outputs) & set(stage.inputs)]
+            if dry_run and produced_upstream:
+                # 上游还没有真正重跑，输入内容未知
+                reasons = [f"上游阶段将重跑: {', '.join(produced_upstream)}"]
+                components = None
+            else:
+                components = self._components(stage)
+                reasons = self._explain(stage, components, self._load_record(stage))
+            if force is True or stage.name in (force or ()):
+                reasons.insert(0, "指定了强制重跑")
+
+            if not reasons:
+                key = self._key(components)
+                print(f"[跳过] {stage.name}: 缓存键 {key[:12]} 未变化，输出完整")
+                report.append({'stage': stage.name, 'action': 'skip', 'reasons': [], 'seconds': 0.0})
+                continue
+
+            will_run.add(stage.name)
+            print(f"[{'将重跑' if dry_run else '运行'}] {stage.name}:")
+            for reason in reasons:
+                print(f"    - {reason}")
+            if dry_run:
+                report.append({'stage': stage.name, 'action': 'run', 'reasons': reasons, 'seconds': 0.0})
+                continue
+
+            start = time.perf_counter()
+            stage.func(**stage.params)
+            seconds = time.perf_counter() - start
+
+            outputs = {}
+            for path in stage.outputs:
+                digest = self.hashes.digest(path)
+                if digest is None:
+                    raise FileNotFoundError(f"阶段 {stage.name} 运行后没有生成输出: {path}")
+                outputs[path] = digest
+            self._save_record(stage, {
+                'key': self._key(components),
+                'components': components,
+                'outputs': outputs,
+                'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'seconds': seconds,
+            })
+            self.hashes.save()
+            print(f"    完成，用时 {seconds:.1f}s")
+            report.append({'stage': stage.name, 'action': 'run', 'reasons': reasons, 'seconds': seconds})
+        self.hashes.save()
+        return report
@@ -0,0 +1,133 @@
+# 说明：
+# 匹配程序（match_zzjgdm.py、match_shxydm.py、match_cascade.py）中B文件的预取和异步写出
+#   - prefetch：后台线程提前加载/构建下一个B文件的索引，主线程同时匹配当前B文件；
+#     加载前先取得一个名额（共2个），主线程处理完一个索引才归还，内存中最多同时有两个索引
+#   - OrderedWriter：写parquet放到一个后台线程中按提交顺序执行，提交下一批前等待上一批写完，
+#     输出文件与顺序执行时完全相同
+#   - PrefetchTimer：统计加载、写出用时和主线程等待时间，结束时报告节省的时间
+# 构建索引是纯Python循环，与匹配争用GIL；节省主要来自读取parquet/npy索引文件和写parquet的I/O
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from run_report import run_stage
+
+MAX_INDEXES = 2   # 内存中最多同时存在的索引数（正在匹配的 + 预取的）
+
+class PrefetchTimer:
+    """记录后台工作（加载、写出）的用时与主线程等待的时间"""
+    def __init__(self):
+        self.background = 0.0   # 后台线程工作的总时间
+        self.waited = 0.0       # 主线程等待后台线程的总时间
+        self._lock = threading.Lock()
+
+    def add_background(self, seconds):
+        with self._lock:
+            self.background += seconds
+
+    def add_waited(self, seconds):
+        with self._lock:
+            self.waited += seconds
+
+    def report(self, logger, total_seconds):
+        saved = max(0.0, self.background - self.waited)
+        logger.info(f"总用时 {total_seconds:.1f}s；加载索引和写出共 {self.background:.1f}s，"
+                    f"其中主线程等待 {self.waited:.1f}s，预取与异步写出节省约 {saved:.1f}s"
+                    f"（顺序执行预计 {total_seconds + saved:.1f}s）")
+        return saved
+
+_DONE = object()
+
+def prefetch(items, load, timer=None, max_items=MAX_INDEXES):
+    """
+    依次产出 (item, load(item))，后台线程提前加载后面的item
+    加载出错时在主线程中抛出；提前结束（break或异常）时后台线程会在加载完当前item后停止
+    """
+    slots = threading.Semaphore(max_items)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        for item in items:
+            slots.acquire()
+            if stop.is_set():
+                break
+            start = time.perf_counter()
+            try:
+                value = load(item)
+            except BaseException as e:
+                results.put((item, None, e))
+                return
+            if timer is not None:
+                timer.add_background(time.perf_counter() - start)
+            results.put((item, value, None))
+        results.put(_DONE)
+
+    thread = threading.Thread(target=worker, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            entry = results.get()
+            if timer is not None:
+                timer.add_waited(time.perf_counter() - start)
+            if entry is _DONE:
+                break
+            item, value, error = entry
+            if error is not None:
+                raise error
+            del entry
+            yield item, value
+            # 调用方处理完这个item（已del引用）后才归还名额
+            del value
+            slots.release()
+    finally:
+        stop.set()
+        slots.release()
+        thread.join()
+
+class OrderedWriter:
+    """在一个后台线程中按提交顺序执行写出任务，同一时间最多有一个任务未完成"""
+    def __init__(self, timer=None):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self._pending = None
+        self._timer = timer
+
+    def _run(self, func, args, kwargs):
+        start = time.perf_counter()
+        with run_stage('write') as stage:
+            stage.set(func=func.__name__)
+            result = func(*args, **kwargs)
+        if self._timer is not None:
+            self._timer.add_background(time.perf_counter() - start)
+        return result
+
+    def wait(self):
+        """等待上一个写出任务完成，写出出错时在这里抛出"""
+        if self._pending is None:
+            return None
+        start = time.perf_counter()
+        try:
+            return self._pending.result()
+        finally:
+            self._pending = None
+            if self._timer is not None:
+                self._timer.add_waited(time.perf_counter() - start)
+
+    def submit(self, func, *args, **kwargs):
+        self.wait()
+        self._pending = self._executor.submit(self._run, func, args, kwargs)
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
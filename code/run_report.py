@@ -0,0 +1,288 @@
+# 说明：
+# 统一的运行报告：每个阶段的墙钟时间、CPU时间、输入/输出行数和字节数、行/s、峰值内存（RSS）
+# 用法（各工具的入口函数中）：
+#     with run_stage('dta2parquet') as stage:
+#         ...
+#         stage.add(rows_out=rows)
+#         stage.add_files_out(paths)
+# 或者用装饰器 @staged('dta2parquet') 把整个函数记为一个阶段，函数中用 current_stage().add(...) 计数
+# 开启方式（默认关闭，关闭时run_stage返回一个什么都不做的对象，不计时、不统计文件大小）：
+#   - 环境变量 SJTU_RUN_REPORT=报告.json（可选 SJTU_RUN_TRACE=trace.json）
+#   - 命令行 python -m sjtu_tools --report 报告.json [--trace trace.json] <子命令> ...
+#   - 代码中调用 enable('报告.json')，结束时 finish()（未调用时在程序退出时自动写出）
+# trace文件是Chrome trace格式，可以在 chrome://tracing 或 https://ui.perfetto.dev 中打开
+# 峰值内存是进程到该阶段结束为止的最高值；进程池中子进程的峰值单独记录（peak_rss_children_mb）
+
+import atexit
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+MB = 1024 * 1024
+
+def _linux_vm_hwm():
+    # ru_maxrss会在fork/exec时继承父进程的峰值，Linux上改用本进程的VmHWM
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def peak_rss():
+    """(本进程峰值RSS, 已结束子进程中的最大峰值RSS)，单位MB；取不到时为None"""
+    try:
+        import resource
+    except ImportError:
+        # Windows没有resource模块，有psutil时用其peak_wset
+        try:
+            import psutil
+        except ImportError:
+            return None, None
+        return psutil.Process().memory_info().peak_wset / MB, None
+    # ru_maxrss在Linux上单位是KB，在macOS上是字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    rss = _linux_vm_hwm() if sys.platform.startswith('linux') else None
+    if rss is None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / MB
+    return rss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / MB
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+def _file_bytes(paths):
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+class _NullStage:
+    """报告关闭时使用：所有方法都不做任何事"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, **counts):
+        pass
+
+    def set(self, **fields):
+        pass
+
+    def add_files_in(self, paths):
+        pass
+
+    def add_files_out(self, paths):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Stage:
+    """一个阶段的计时与计数，作为上下文管理器使用"""
+    COUNTERS = ('rows_in', 'rows_out', 'bytes_in', 'bytes_out')
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.fields = {}
+
+    def add(self, **counts):
+        """累加 rows_in / rows_out / bytes_in / bytes_out"""
+        for key, value in counts.items():
+            if key not in self.counts:
+                raise ValueError(f"未知的计数项: {key}，可用：{self.COUNTERS}")
+            self.counts[key] += int(value or 0)
+
+    def set(self, **fields):
+        """记录其他信息（如文件名、进程数），写入报告中该阶段的extra"""
+        self.fields.update(fields)
+
+    def add_files_in(self, paths):
+        self.add(bytes_in=_file_bytes(paths))
+
+    def add_files_out(self, paths):
+        self.add(bytes_out=_file_bytes(paths))
+
+    def __enter__(self):
+        stack = self.report._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = _children_cpu()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        self.report._stack().pop()
+        rss, rss_children = peak_rss()
+        rows = self.counts['rows_out'] or self.counts['rows_in']
+        data_bytes = self.counts['bytes_out'] or self.counts['bytes_in']
+        self.report._record({
+            'name': self.name,
+            'parent': self.parent,
+            'thread': threading.current_thread().name,
+            'start_s': round(self._wall - self.report.started, 6),
+            'wall_s': round(wall, 6),
+            'cpu_s': round(time.process_time() - self._cpu, 6),
+            'cpu_children_s': round(_children_cpu() - self._children_cpu, 6),
+            **self.counts,
+            'rows_per_s': round(rows / wall, 1) if rows and wall > 0 else None,
+            'mb_per_s': round(data_bytes / MB / wall, 2) if data_bytes and wall > 0 else None,
+            'peak_rss_mb': None if rss is None else round(rss, 1),
+            'peak_rss_children_mb': None if rss_children is None else round(rss_children, 1),
+            'status': 'ok' if exc_type is None else f"error: {exc_type.__name__}: {exc}",
+            'extra': self.fields,
+        })
+        return False
+
+class RunReport:
+    """一次运行中所有阶段的记录"""
+    def __init__(self, report_path=None, trace_path=None, tool=None):
+        self.report_path = report_path
+        self.trace_path = trace_path
+        self.tool = tool or os.path.basename(sys.argv[0] or 'python')
+        self.pid = os.getpid()
+        self.started = time.perf_counter()
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._cpu = time.process_time()
+        self._children_cpu = _children_cpu()
+        self.stages = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _record(self, entry):
+        with self._lock:
+            self.stages.append(entry)
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def summary(self):
+        rss, rss_children = peak_rss()
+        return {
+            'tool': self.tool,
+            'argv': sys.argv,
+            'started_at': self.started_at,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'wall_s': round(time.perf_counter() - self.started, 6),
+            'cpu_s': round(time.process_time() - self._cpu, 6),
+            'cpu_children_s': round(_children_cpu() - self._children_cpu, 6),
+            'peak_rss_mb': None if rss is None else round(rss, 1),
+            'peak_rss_children_mb': None if rss_children is None else round(rss_children, 1),
+            'stages': sorted(self.stages, key=lambda s: s['start_s']),
+        }
+
+    def trace_events(self):
+        """Chrome trace格式的事件（每个阶段一个完整事件 ph='X'，时间单位微秒）"""
+        threads = {}
+        events = []
+        for entry in sorted(self.stages, key=lambda s: s['start_s']):
+            tid = threads.setdefault(entry['thread'], len(threads) + 1)
+            args = {key: entry[key] for key in Stage.COUNTERS + ('rows_per_s', 'cpu_s', 'peak_rss_mb', 'status')}
+            args.update(entry['extra'])
+            events.append({'name': entry['name'], 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                           'ts': entry['start_s'] * 1e6, 'dur': entry['wall_s'] * 1e6, 'args': args})
+        for name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}})
+        return events
+
+    def save(self):
+        paths = []
+        if self.report_path:
+            _write_json(self.report_path, self.summary())
+            paths.append(self.report_path)
+        if self.trace_path:
+            _write_json(self.trace_path, {'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'})
+            paths.append(self.trace_path)
+        if paths:
+            print(f"运行报告已保存到: {', '.join(paths)}")
+        return paths
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+_REPORT = None
+
+def enable(report_path=None, trace_path=None, tool=None):
+    """开启运行报告（重复调用时返回已开启的报告）；程序退出时自动写出"""
+    global _REPORT
+    if _REPORT is None:
+        _REPORT = RunReport(report_path, trace_path, tool)
+        atexit.register(_save_at_exit)
+    return _REPORT
+
+def finish():
+    """写出报告并关闭；返回写出的文件路径列表"""
+    global _REPORT
+    report, _REPORT = _REPORT, None
+    return report.save() if report is not None else []
+
+def _save_at_exit():
+    # 只有开启报告的进程写出（fork出的子进程会继承_REPORT）
+    if _REPORT is not None and _REPORT.pid == os.getpid():
+        finish()
+
+def active():
+    return _REPORT
+
+def run_stage(name):
+    """报告开启时返回计时的Stage，否则返回什么都不做的对象"""
+    if _REPORT is None:
+        return _NULL_STAGE
+    return _REPORT.stage(name)
+
+def current_stage():
+    """当前线程中最内层的阶段；报告关闭或不在阶段中时返回什么都不做的对象"""
+    if _REPORT is None:
+        return _NULL_STAGE
+    stack = _REPORT._stack()
+    return stack[-1] if stack else _NULL_STAGE
+
+def staged(name):
+    """装饰器：函数的每次调用记为一个阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _REPORT is None:
+                return func(*args, **kwargs)
+            with _REPORT.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _enable_from_env():
+    report_path = os.environ.get('SJTU_RUN_REPORT')
+    trace_path = os.environ.get('SJTU_RUN_TRACE')
+    if not (report_path or trace_path):
+        return
+    # 进程池的子进程（spawn时会重新导入本模块）不开启，只由主进程记录
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        enable(report_path, trace_path)
+
+_enable_from_env()
@@ -0,0 +1,55 @@
+# 说明：
+# 把code文件夹中的各个脚本作为一个包来调用（脚本本身仍可单独运行）
+# 使用前把code文件夹加入PYTHONPATH（或在code文件夹中运行），然后：
+#   命令行：python -m sjtu_tools --help
+#   程序中：import sjtu_tools; sjtu_tools.convert('a.dta', 'a.parquet')
+# 导入本包不会导入pandas、pyarrow等较重的库，第一次用到某个函数时才导入对应的模块
+
+import importlib
+
+# 对外提供的函数 → (模块名, 函数名)
+_EXPORTS = {
+    # 匹配
+    'match_zzjgdm': ('match_zzjgdm', 'run_matching'),
+    'match_shxydm': ('match_shxydm', 'run_matching'),
+    'match_cascade': ('match_cascade', 'run_matching'),
+    'lookup': ('partitioned_parquet', 'lookup'),
+    # 清洗
+    'clean_data': ('企业数据清洗', 'clean_data'),
+    'save_parts': ('企业数据清洗', 'save_parts'),
+    'attach_jsonl_content': ('企业数据清洗', 'attach_jsonl_content'),
+    'run_cleaning': ('企业数据清洗', 'run_cleaning'),
+    'mark_near_duplicates': ('near_duplicates', 'mark_near_duplicates'),
+    # 转换
+    'convert': ('convert_engine', 'convert'),
+    'convert_dta_to_parquet_parallel': ('dta2parquet', 'convert_dta_to_parquet_parallel'),
+    'dta_columns_to_csv': ('dta2csv', 'dta_columns_to_csv'),
+    'csv_to_dta_streaming': ('csv2dta', 'csv_to_dta_streaming'),
+    'parquet_to_csv': ('parquet2csv', 'parquet_to_csv'),
+    'parquet_to_csv_parallel': ('parquet2csv', 'parquet_to_csv_parallel'),
+    'merge_parquet_files_streaming': ('合并parquet文件', 'merge_parquet_files_streaming'),
+    # 均分与抽样
+    'split_csv': ('均分csv文件', 'split_csv_streaming'),
+    'sample_file': ('随机抽取csv文件特定列', 'sample_file'),
+    # 关键词统计
+    'count_keywords_streaming': ('keyword_stats', 'count_keywords_streaming'),
+    'load_keywords': ('keyword_matcher', 'load_keywords'),
+    # 批量推理jsonl
+    'csv_to_batch_jsonl': ('change2json', 'csv_to_batch_jsonl'),
+    'run_inference': ('online_inference', 'run_inference'),
+    # 流程缓存（未变化的阶段重跑时跳过）
+    'Pipeline': ('pipeline', 'Pipeline'),
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _EXPORTS[name]
+    value = getattr(importlib.import_module(module_name), attr)
+    globals()[name] = value  # 之后直接从模块字典中取
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
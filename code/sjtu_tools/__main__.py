@@ -0,0 +1,6 @@
+import sys
+from sjtu_tools.cli import main
+
+# 必须有这个判断：Windows上多进程的子进程会重新导入主模块
+if __name__ == "__main__":
+    sys.exit(main())
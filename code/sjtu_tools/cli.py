@@ -0,0 +1,216 @@
+# 说明：
+# 统一的命令行入口，子命令：match、lookup、clean、convert、split、sample、count、jsonl、infer
+# 这里只导入argparse等标准库，执行某个子命令时才导入它需要的模块（以及pandas、pyarrow等），
+# 因此 --help 和参数错误提示几乎是立即返回的
+# 示例：
+#   python -m sjtu_tools count 数据文件夹 --keywords 关键词.txt --columns duty --group-by publish_year
+#   python -m sjtu_tools split 清洗数据.csv 清洗数据 10
+#   python -m sjtu_tools convert 输入文件夹 --split 10 --to 清洗数据_{part}.csv
+#   python -m sjtu_tools --report 报告.json --trace trace.json split 清洗数据.csv 清洗数据 10
+
+import argparse
+import sys
+
+def _split_list(text):
+    return [item.strip() for item in text.split(',') if item.strip()] if text else None
+
+def _read_prompt(args):
+    if args.prompt_file:
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    return args.prompt or ""
+
+# ================== 各子命令 ==================
+def cmd_match(args):
+    if args.kind == 'cascade':
+        from match_cascade import DEFAULT_KEYS, run_matching
+        run_matching(args.fileA, args.fileB_dir, args.output_dir, args.batch_size,
+                     _split_list(args.partition_cols), args.rebuild_index, _split_list(args.keys) or DEFAULT_KEYS,
+                     lookup_key=args.lookup_key)
+        return
+    if args.kind == 'zzjgdm':
+        from match_zzjgdm import run_matching
+    else:
+        from match_shxydm import run_matching
+    run_matching(args.fileA, args.fileB_dir, args.output_dir, args.batch_size,
+                 _split_list(args.partition_cols), args.rebuild_index, lookup_key=args.lookup_key)
+
+def cmd_lookup(args):
+    from partitioned_parquet import lookup
+    df = lookup(args.path, args.column, args.values, _split_list(args.columns)).to_pandas()
+    if args.output:
+        df.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"共找到 {len(df)} 行，已保存到 {args.output}")
+    else:
+        print(df.to_string(index=False))
+
+def cmd_clean(args):
+    import 企业数据清洗
+    file_names = args.files or 企业数据清洗.file_names
+    if args.no_near_dup:
+        near_dup_distance = None
+    elif args.near_dup_distance is None:
+        from near_duplicates import NEAR_DUP_DISTANCE
+        near_dup_distance = NEAR_DUP_DISTANCE
+    else:
+        near_dup_distance = args.near_dup_distance
+    企业数据清洗.run_cleaning(args.input_dir, file_names, args.output_dir, args.jsonl_dir,
+                           args.parts, args.partitioned_dir, near_dup_distance=near_dup_distance)
+
+def cmd_convert(args):
+    from convert_engine import main as convert_main
+    convert_main(args.engine_args)
+
+def cmd_split(args):
+    from 均分csv文件 import split_csv_streaming
+    split_csv_streaming(args.input, args.output_prefix, args.n, args.by_bytes, args.workers)
+
+def cmd_sample(args):
+    from 随机抽取csv文件特定列 import sample_file
+    sample_file(args.input, args.output, args.n, _split_list(args.columns), args.seed,
+                args.method, args.encoding)
+
+def cmd_count(args):
+    from keyword_matcher import load_keywords
+    from keyword_stats import count_keywords_streaming, save_stats
+    keywords = load_keywords(args.keywords)
+    results = count_keywords_streaming(args.inputs, keywords, _split_list(args.columns), args.group_by,
+                                       args.occurrences, args.workers)
+    for group in sorted(results):
+        stats = results[group]
+        title = f"{args.group_by} = {group}，" if args.group_by else ""
+        print(f"{title}共 {stats['rows']} 行")
+        for keyword in keywords:
+            line = f"  {keyword}: {stats['counts'][keyword]} 行"
+            if args.occurrences:
+                line += f"，共出现 {stats['occurrences'][keyword]} 次"
+            print(line)
+    if args.output:
+        save_stats(results, args.output, keywords, args.occurrences)
+
+def cmd_jsonl(args):
+    from change2json import csv_to_batch_jsonl
+    text_column = int(args.text_column) if args.text_column.isdigit() else args.text_column
+    csv_to_batch_jsonl(args.input, args.output, _read_prompt(args), text_column, args.representatives_only)
+
+def cmd_infer(args):
+    import os
+    from online_inference import run_inference
+    stats = run_inference(args.requests, args.output, args.url, os.environ.get(args.api_key_env), args.model,
+                          args.concurrency, args.rpm, args.tpm, args.retries)
+    if stats['failed']:
+        sys.exit(1)
+
+# ================== 参数 ==================
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m sjtu_tools', description="房价与失信行为研究 数据处理工具")
+    parser.add_argument('--report', help="把运行报告（各阶段用时、行数、字节数、峰值内存）写入这个json文件")
+    parser.add_argument('--trace', help="同时写出Chrome trace格式的文件（chrome://tracing 中打开）")
+    sub = parser.add_subparsers(dest='command', metavar='命令')
+    sub.required = True
+
+    p = sub.add_parser('match', help="文件A与文件夹B中的企业数据匹配")
+    p.add_argument('kind', choices=['zzjgdm', 'shxydm', 'cascade'],
+                   help="按组织机构代码、统一社会信用代码匹配，或cascade（一次运行中依次尝试多种键）")
+    p.add_argument('fileA', help="文件A（.parquet）")
+    p.add_argument('fileB_dir', help="文件夹B")
+    p.add_argument('output_dir', help="输出文件夹")
+    p.add_argument('--batch-size', type=int, default=100000, help="每批处理的行数")
+    p.add_argument('--partition-cols', help="按这些列分区写出，如 publish_year")
+    p.add_argument('--rebuild-index', action='store_true', help="重新构建B文件索引")
+    p.add_argument('--keys', help="cascade时依次尝试的键，逗号分隔，默认 zzjgdm,shxydm")
+    p.add_argument('--lookup-key', choices=['cardnum', 'newgcid'],
+                   help="输出按该列排序、写小行组和辅助索引，便于之后用lookup命令按键查找")
+    p.set_defaults(func=cmd_match)
+
+    p = sub.add_parser('lookup', help="按cardnum或newgcid查找匹配结果（只读取可能包含这些值的行组）")
+    p.add_argument('path', help="匹配结果文件（.parquet）或分区数据集文件夹")
+    p.add_argument('column', help="查找的列，如 newgcid")
+    p.add_argument('values', nargs='+', help="要查找的值")
+    p.add_argument('--columns', help="只输出这些列，逗号分隔")
+    p.add_argument('--output', help="结果保存为CSV，默认打印")
+    p.set_defaults(func=cmd_lookup)
+
+    p = sub.add_parser('clean', help="清洗企业失信数据并分块")
+    p.add_argument('input_dir', help="输入文件夹")
+    p.add_argument('output_dir', help="输出文件夹")
+    p.add_argument('--files', nargs='+', help="要清洗的CSV文件名，默认使用 企业数据清洗.py 中的file_names")
+    p.add_argument('--parts', type=int, default=10, help="分块数")
+    p.add_argument('--jsonl-dir', help="推理结果jsonl所在文件夹，指定时把结果关联回各分块")
+    p.add_argument('--partitioned-dir', help="同时写出按年份分区的parquet数据集")
+    p.add_argument('--near-dup-distance', type=int,
+                   help="duty近似重复的SimHash汉明距离阈值，默认为near_duplicates.NEAR_DUP_DISTANCE")
+    p.add_argument('--no-near-dup', action='store_true', help="不做近似重复检测")
+    p.set_defaults(func=cmd_clean)
+
+    p = sub.add_parser('convert', help="格式转换（参数同 convert_engine.py，用 convert -- --help 查看）")
+    p.add_argument('engine_args', nargs=argparse.REMAINDER, help="传给convert_engine的参数")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('split', help="把CSV均分为n份")
+    p.add_argument('input', help="输入CSV")
+    p.add_argument('output_prefix', help="输出文件前缀（生成 前缀_1.csv ...）")
+    p.add_argument('n', type=int, help="份数")
+    p.add_argument('--by-bytes', action='store_true', help="按字节大致均分（不统计行数，更快）")
+    p.add_argument('--workers', type=int, default=1, help="同时写出的文件数")
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser('sample', help="随机抽取n行指定列")
+    p.add_argument('input', help="输入文件（.csv 或 .parquet）")
+    p.add_argument('output', help="输出CSV")
+    p.add_argument('n', type=int, help="抽取行数")
+    p.add_argument('--columns', required=True, help="要保存的列，逗号分隔")
+    p.add_argument('--seed', type=int, help="随机种子")
+    p.add_argument('--method', choices=['reservoir', 'block'], default='reservoir', help="抽样方式")
+    p.add_argument('--encoding', help="CSV编码，默认自动判断")
+    p.set_defaults(func=cmd_sample)
+
+    p = sub.add_parser('count', help="统计关键词出现的行数")
+    p.add_argument('inputs', nargs='+', help="CSV/parquet文件、文件夹或通配符")
+    p.add_argument('--keywords', required=True, help="关键词文件（每行一个）")
+    p.add_argument('--columns', help="要统计的列名或列序号，逗号分隔，默认第一列")
+    p.add_argument('--group-by', help="分组列，如 publish_year")
+    p.add_argument('--occurrences', action='store_true', help="同时统计总出现次数")
+    p.add_argument('--workers', type=int, help="进程数，默认CPU核数")
+    p.add_argument('--output', help="结果保存为CSV")
+    p.set_defaults(func=cmd_count)
+
+    p = sub.add_parser('jsonl', help="CSV转批量推理jsonl")
+    p.add_argument('input', help="输入CSV")
+    p.add_argument('output', help="输出jsonl，可包含{part}")
+    p.add_argument('--text-column', default='9', help="题干所在列（列序号或列名），默认第10列")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument('--prompt', help="固定提示词")
+    group.add_argument('--prompt-file', help="从文件读取固定提示词")
+    p.add_argument('--representatives-only', action='store_true',
+                   help="只为近似重复簇的代表行生成请求（需要clean时做了近似重复检测）")
+    p.set_defaults(func=cmd_jsonl)
+
+    p = sub.add_parser('infer', help="并发发送jsonl中的请求（在线推理，可断点续跑）")
+    p.add_argument('requests', help="jsonl命令生成的请求文件")
+    p.add_argument('output', help="结果jsonl（已存在时跳过其中已成功的请求）")
+    p.add_argument('--url', required=True, help="chat/completions接口地址")
+    p.add_argument('--model', help="模型名或接入点ID")
+    p.add_argument('--api-key-env', default='ARK_API_KEY', help="保存API Key的环境变量名")
+    p.add_argument('--concurrency', type=int, default=16, help="同时进行的请求数")
+    p.add_argument('--rpm', type=float, help="每分钟请求数上限")
+    p.add_argument('--tpm', type=float, help="每分钟token数上限")
+    p.add_argument('--retries', type=int, default=5, help="每个请求的最大重试次数")
+    p.set_defaults(func=cmd_infer)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'convert' and args.engine_args[:1] == ['--']:
+        args.engine_args = args.engine_args[1:]
+    if not (args.report or args.trace):
+        args.func(args)
+        return 0
+    import run_report
+    run_report.enable(args.report, args.trace, tool=f"sjtu_tools {args.command}")
+    try:
+        with run_report.run_stage(args.command):
+            args.func(args)
+    finally:
+        run_report.finish()
+    return 0
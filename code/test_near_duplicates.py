@@ -0,0 +1,60 @@
+# near_duplicates.py 的回归测试：行数很少、全部相同、没有候选对的输入不应出错
+# 运行：在code文件夹中 python -m pytest test_near_duplicates.py
+import random
+
+import numpy as np
+import pandas as pd
+
+from near_duplicates import cluster_signatures, mark_near_duplicates, simhash
+
+TEMPLATES = ["被执行人{}拒不履行（2019）沪0115执{}号判决书确定的给付义务，涉案金额{}万元，已被列入失信被执行人名单",
+             "原告{}诉被告上海某某贸易有限公司买卖合同纠纷一案，判决被告于判决生效之日起十日内支付货款{}元及利息{}元"]
+SUBJECTS = ["被执行人", "该公司", "法定代表人", "被申请人"]
+ACTIONS = ["未按执行通知书履行", "拒不履行生效法律文书确定的义务", "违反限制消费令", "转移财产规避执行"]
+OBJECTS = ["给付货款", "支付工程款", "偿还借款本息", "支付劳动报酬"]
+
+def mixed_length_text(rng):
+    """长度从几个字到约200字的失信描述（仿照benchmark.py的合成数据），部分文本为空或过短而无效"""
+    parts = [f"{rng.choice(SUBJECTS)}{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}{rng.randint(1, 999)}万元"
+             for _ in range(rng.choice((0, 1, 1, 2, 3, 5, 8)))]
+    return "，".join(parts) or rng.choice(SUBJECTS + ["", "无"])
+
+def test_two_unrelated_texts():
+    df = mark_near_duplicates(pd.DataFrame({'duty': ["被执行人张三拒不履行判决书确定的义务",
+                                                     "原告李四诉被告某公司买卖合同纠纷一案"]}))
+    assert df['dup_cluster'].tolist() == [0, 1]
+    assert df['dup_representative'].all()
+
+def test_identical_texts():
+    df = mark_near_duplicates(pd.DataFrame({'duty': ["同样的文本内容很长一段"] * 3}))
+    assert df['dup_cluster'].tolist() == [0, 0, 0]
+    assert df['dup_size'].tolist() == [3, 3, 3]
+    assert df['dup_representative'].tolist() == [True, False, False]
+
+def test_tiny_and_empty_inputs():
+    for texts in ([], ["一段足够长的文本内容"], ["", None, "短"]):
+        df = mark_near_duplicates(pd.DataFrame({'duty': pd.Series(texts, dtype=object)}))
+        assert df['dup_cluster'].tolist() == list(range(len(texts)))
+    assert cluster_signatures(np.zeros(0, dtype=np.uint64)).tolist() == []
+
+def test_two_templates():
+    rng = random.Random(0)
+    texts = [TEMPLATES[i % 2].format(rng.choice("张王李赵"), rng.randint(1, 9999), rng.randint(1, 999))
+             for i in range(100)]
+    df = mark_near_duplicates(pd.DataFrame({'duty': texts}))
+    # 数字统一替换后同一模板的文本只差姓名，应聚为少数几个簇，不同模板不能合并
+    assert df['dup_representative'].sum() <= 8
+    for cluster, group in df.groupby('dup_cluster').groups.items():
+        assert len({i % 2 for i in group}) == 1
+
+def test_mixed_length_texts():
+    for rows in (9, 47):
+        rng = random.Random(rows)
+        texts = [mixed_length_text(rng) for _ in range(rows)]
+        df = mark_near_duplicates(pd.DataFrame({'duty': texts}))
+        _, valid = simhash(texts)
+        cluster = df['dup_cluster'].to_numpy()
+        # 簇ID是簇内第一行；无效（过短）的文本各自成簇，有效文本的代表行也有效
+        assert (cluster <= np.arange(rows)).all()
+        assert (cluster[~valid] == np.flatnonzero(~valid)).all()
+        assert valid[cluster[valid]].all()
@@ -4,6 +4,11 @@ import re
 import json
 from glob import glob
 from tqdm import tqdm
+from csv_input import read_csv_chunks, read_csv_pandas
+from dtype_policy import apply_dtype_policy, memory_mb
+from near_duplicates import NEAR_DUP_DISTANCE, mark_near_duplicates
+from partitioned_parquet import reset_dataset_dir, write_partitioned
+from run_report import current_stage, staged
 
 # ==================== 配置参数 ====================
 input_dir = r"C:\Users\mjy12\Desktop\企业失信\shuru"
@@ -14,65 +19,102 @@ min_length = 20         # 最小duty长度
 min_year = 2014         # 最小年份
 CHUNK_SIZE = 100000     # CSV分块读取大小
 NUM_PARTS = 10          # 最终清洗数据分块数
+# duty近似重复检测（SimHash汉明距离阈值，见near_duplicates.py），None为不检测
+# 检测后分块中多出 dup_cluster、dup_size、dup_representative 三列，
+# change2json.py 可以只为代表行生成请求（representatives_only=True）
+near_dup_distance = NEAR_DUP_DISTANCE
 
-# ==================== 初始化 ====================
-os.makedirs(output_dir, exist_ok=True)
-removed_file = os.path.join(output_dir, "企业删除数据.csv")
-if os.path.exists(removed_file):
-    os.remove(removed_file)
+# 清洗数据额外写成按年份分区的parquet数据集（如 publish_year=2019/），None为不写
+# 下游按年份筛选时只需读取对应分区，可用 合并parquet文件.py 或 partitioned_parquet.read_partitioned 读取
+partitioned_output_dir = None   # 例如 os.path.join(output_dir, "企业清洗数据_分区")
+PARTITION_COLS = ["publish_year"]
+PARTITION_SORT_BY = ["case_year"]
 
-total_clean = 0
-total_removed = 0
-final_clean_chunks = []
+file_names = ["qiye_all_part1.csv", "qiye_all_part2.csv", "qiye_all_part3.csv"]
 
 # ==================== 清洗数据主流程 ====================
-file_names = ["qiye_all_part1.csv", "qiye_all_part2.csv", "qiye_all_part3.csv"]
+@staged('clean')
+def clean_data(input_dir, file_names, removed_file, min_length=min_length, min_year=min_year):
+    """分块读取并清洗数据，被删除的数据追加写入removed_file，返回有效数据"""
+    if os.path.exists(removed_file):
+        os.remove(removed_file)
 
-print("开始清洗数据...")
-for file_name in file_names:
-    file_path = os.path.join(input_dir, file_name)
-    try:
-        for chunk in tqdm(pd.read_csv(file_path, chunksize=CHUNK_SIZE), 
-                          desc=f"处理 {file_name}"):
-            # 数据清洗条件
-            length_mask = chunk['duty'].notna() & (chunk['duty'].str.len() >= min_length)
-            year_mask = (chunk['publish_year'] >= min_year) & (chunk['case_year'] >= min_year)
-            valid_mask = length_mask & year_mask
-
-            # 分割有效/无效数据
-            df_clean = chunk[valid_mask].copy()
-            df_removed = chunk[~valid_mask]
-
-            # 保存被删除数据（追加模式，仅首行写表头）
-            df_removed.to_csv(removed_file, mode='a', index=False, 
-                             header=not os.path.exists(removed_file))
-
-            # 收集有效数据块
-            final_clean_chunks.append(df_clean)
-            total_clean += len(df_clean)
-            total_removed += len(df_removed)
+    total_clean = 0
+    total_removed = 0
+    final_clean_chunks = []
 
-    except Exception as e:
-        print(f"处理文件 {file_name} 出错: {str(e)}")
-        continue
+    print("开始清洗数据...")
+    for file_name in file_names:
+        file_path = os.path.join(input_dir, file_name)
+        try:
+            for chunk in tqdm(read_csv_chunks(file_path, CHUNK_SIZE),
+                              desc=f"处理 {file_name}"):
+                # 字符串列转为string[pyarrow]、整数降位（category在合并后再转）
+                apply_dtype_policy(chunk, categories=False)
+                # 数据清洗条件
+                length_mask = chunk['duty'].notna() & (chunk['duty'].str.len() >= min_length)
+                year_mask = (chunk['publish_year'] >= min_year) & (chunk['case_year'] >= min_year)
+                valid_mask = length_mask & year_mask
 
-# 合并所有有效数据
-final_clean_data = pd.concat(final_clean_chunks, ignore_index=True)
+                # 分割有效/无效数据
+                df_clean = chunk[valid_mask].copy()
+                df_removed = chunk[~valid_mask]
+
+                # 保存被删除数据（追加模式，仅首行写表头）
+                df_removed.to_csv(removed_file, mode='a', index=False,
+                                 header=not os.path.exists(removed_file))
+
+                # 收集有效数据块
+                final_clean_chunks.append(df_clean)
+                total_clean += len(df_clean)
+                total_removed += len(df_removed)
+
+        except Exception as e:
+            print(f"处理文件 {file_name} 出错: {str(e)}")
+            continue
+
+    print(f"\n清洗完成！有效数据：{total_clean}条，被删除数据：{total_removed}条")
+    # 合并所有有效数据
+    final_clean_data = apply_dtype_policy(pd.concat(final_clean_chunks, ignore_index=True))
+    print(f"有效数据占用内存：{memory_mb(final_clean_data):.1f}MB")
+    stage = current_stage()
+    stage.add(rows_in=total_clean + total_removed, rows_out=total_clean)
+    stage.add_files_in([os.path.join(input_dir, name) for name in file_names])
+    stage.set(removed_rows=total_removed)
+    return final_clean_data
 
 # ==================== 分块保存并添加局部ID（关键修改！） ====================
-chunk_size = len(final_clean_data) // NUM_PARTS
-for part_idx in range(NUM_PARTS):
-    start = part_idx * chunk_size
-    end = start + chunk_size if part_idx < NUM_PARTS - 1 else len(final_clean_data)
-    part = final_clean_data.iloc[start:end].copy()
-    
-    # 为每个分块添加局部ID（从1开始递增）
-    part['local_id'] = range(1, len(part) + 1)  # 分块内局部唯一ID
-    
-    part_path = os.path.join(output_dir, f"个人清洗数据_分块_{part_idx+1}.csv")
-    part.to_csv(part_path, index=False, encoding='utf-8')
-
-print(f"\n清洗完成！有效数据：{total_clean}条，被删除数据：{total_removed}条")
+@staged('save_parts')
+def save_parts(final_clean_data, output_dir, num_parts, partitioned_dir=None):
+    """
+    均分为num_parts块保存为CSV，每块添加局部ID
+    指定partitioned_dir时，同时把各分块（含part与local_id列）写入按年份分区的parquet数据集
+    """
+    if partitioned_dir:
+        reset_dataset_dir(partitioned_dir)
+
+    chunk_size = len(final_clean_data) // num_parts
+    for part_idx in range(num_parts):
+        start = part_idx * chunk_size
+        end = start + chunk_size if part_idx < num_parts - 1 else len(final_clean_data)
+        part = final_clean_data.iloc[start:end].copy()
+
+        # 为每个分块添加局部ID（从1开始递增）
+        part['local_id'] = range(1, len(part) + 1)  # 分块内局部唯一ID
+
+        part_path = os.path.join(output_dir, f"个人清洗数据_分块_{part_idx+1}.csv")
+        part.to_csv(part_path, index=False, encoding='utf-8')
+
+        if partitioned_dir:
+            part['part'] = part_idx + 1
+            write_partitioned(part, partitioned_dir, PARTITION_COLS, PARTITION_SORT_BY,
+                              basename_template=f"part{part_idx + 1}-{{i}}.parquet")
+
+    if partitioned_dir:
+        print(f"分区数据集已保存至: {partitioned_dir}")
+    stage = current_stage()
+    stage.add(rows_in=len(final_clean_data), rows_out=len(final_clean_data))
+    stage.add_files_out([os.path.join(output_dir, f"个人清洗数据_分块_{k}.csv") for k in range(1, num_parts + 1)])
 
 # ==================== 关联JSONL内容（基于分块局部ID） ====================
 def extract_part_num(filename):
@@ -80,97 +122,139 @@ def extract_part_num(filename):
     nums = re.findall(r'(\d+)', filename)
     return nums[-1] if nums else None
 
-# 构建JSONL文件映射（分块编号 -> 文件路径）
-jsonl_pattern1 = os.path.join(jsonl_dir, "qy-prompt1-*.jsonl")
-jsonl_pattern2 = os.path.join(jsonl_dir, "qy-prompt2-*.jsonl")
-jsonl_files1 = sorted(glob(jsonl_pattern1))
-jsonl_files2 = sorted(glob(jsonl_pattern2))
-
-jsonl_map1 = {extract_part_num(f): f for f in jsonl_files1 if extract_part_num(f)}
-jsonl_map2 = {extract_part_num(f): f for f in jsonl_files2 if extract_part_num(f)}
-
-# 处理每个分块（基于局部ID匹配）
-for part_idx in range(1, NUM_PARTS + 1):
-    part_num = str(part_idx)
-    part_path = os.path.join(output_dir, f"个人清洗数据_分块_{part_num}.csv")
-    
-    # 读取分块数据（含local_id）
-    df = pd.read_csv(part_path, encoding='utf-8')
-    if 'local_id' not in df.columns:
-        print(f"警告：分块{part_num}缺少'local_id'列，可能是分块阶段错误！")
-        continue
-
-    # 获取对应的JSONL文件（分块编号必须一致）
-    jsonl_file1 = jsonl_map1.get(part_num)
-    jsonl_file2 = jsonl_map2.get(part_num)
-    print(f"\n处理分块{part_num}：")
-    print(f"  prompt1文件: {jsonl_file1 if jsonl_file1 else '未找到'}")
-    print(f"  prompt2文件: {jsonl_file2 if jsonl_file2 else '未找到'}")
-
-    # 解析JSONL并构建local_id->content映射（关键修改！）
-    def parse_jsonl(file_path):
-        local_id_content = {}
-        if not file_path or not os.path.exists(file_path):
-            return local_id_content
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        item = json.loads(line)
-                        # 提取custom_id中的局部ID（如'request-5'提取5）
-                        custom_id = item.get('custom_id', '')
-                        match = re.search(r'\d+', str(custom_id))
-                        if not match:
-                            continue
-                        local_id = int(match.group())  # 分块内局部ID
-                        
-                        # 鲁棒提取content（覆盖多种JSON结构）
-                        content = None
-                        if 'response' in item:
-                            body = item['response'].get('body', {})
-                            choices = body.get('choices', [])
-                            if choices:
-                                message = choices[0].get('message', {})
-                                content = message.get('content')
-                        elif 'message' in item:
-                            content = item['message'].get('content')
-                        elif 'content' in item:
-                            content = item.get('content')
-                        
-                        if content:
-                            local_id_content[local_id] = content
-                    except json.JSONDecodeError:
-                        continue
-        except Exception as e:
-            print(f"  解析{file_path}出错: {str(e)}")
+# 解析JSONL并构建local_id->content映射（关键修改！）
+def parse_jsonl(file_path):
+    local_id_content = {}
+    if not file_path or not os.path.exists(file_path):
         return local_id_content
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                    # 提取custom_id中的局部ID（如'request-5'提取5）
+                    custom_id = item.get('custom_id', '')
+                    match = re.search(r'\d+', str(custom_id))
+                    if not match:
+                        continue
+                    local_id = int(match.group())  # 分块内局部ID
+
+                    # 鲁棒提取content（覆盖多种JSON结构）
+                    content = None
+                    if 'response' in item:
+                        body = item['response'].get('body', {})
+                        choices = body.get('choices', [])
+                        if choices:
+                            message = choices[0].get('message', {})
+                            content = message.get('content')
+                    elif 'message' in item:
+                        content = item['message'].get('content')
+                    elif 'content' in item:
+                        content = item.get('content')
+
+                    if content:
+                        local_id_content[local_id] = content
+                except json.JSONDecodeError:
+                    continue
+    except Exception as e:
+        print(f"  解析{file_path}出错: {str(e)}")
+    return local_id_content
+
+def fill_near_duplicates(df, column, cluster_content):
+    """记录本分块代表行的结果，同簇其他行没有结果时使用代表行的结果，返回填充的行数"""
+    shared = df['dup_size'] > 1
+    representatives = df[shared & df['dup_representative'] & df[column].notna()]
+    cluster_content.update(zip(representatives['dup_cluster'], representatives[column]))
+    missing = shared & df[column].isna()
+    df.loc[missing, column] = df.loc[missing, 'dup_cluster'].map(cluster_content)
+    return int(df.loc[missing, column].notna().sum())
+
+@staged('attach_jsonl')
+def attach_jsonl_content(output_dir, jsonl_dir, num_parts):
+    """把两个prompt的推理结果按local_id关联回各分块CSV"""
+    # 构建JSONL文件映射（分块编号 -> 文件路径）
+    jsonl_pattern1 = os.path.join(jsonl_dir, "qy-prompt1-*.jsonl")
+    jsonl_pattern2 = os.path.join(jsonl_dir, "qy-prompt2-*.jsonl")
+    jsonl_files1 = sorted(glob(jsonl_pattern1))
+    jsonl_files2 = sorted(glob(jsonl_pattern2))
+
+    jsonl_map1 = {extract_part_num(f): f for f in jsonl_files1 if extract_part_num(f)}
+    jsonl_map2 = {extract_part_num(f): f for f in jsonl_files2 if extract_part_num(f)}
+
+    # 有近似重复的簇：代表行的dup_cluster → 推理结果（代表行总在同簇其他行之前，按分块顺序处理即可）
+    cluster_content1 = {}
+    cluster_content2 = {}
+
+    # 处理每个分块（基于局部ID匹配）
+    for part_idx in range(1, num_parts + 1):
+        part_num = str(part_idx)
+        part_path = os.path.join(output_dir, f"个人清洗数据_分块_{part_num}.csv")
+
+        # 读取分块数据（含local_id）
+        df = apply_dtype_policy(read_csv_pandas(part_path))
+        if 'local_id' not in df.columns:
+            print(f"警告：分块{part_num}缺少'local_id'列，可能是分块阶段错误！")
+            continue
+
+        # 获取对应的JSONL文件（分块编号必须一致）
+        jsonl_file1 = jsonl_map1.get(part_num)
+        jsonl_file2 = jsonl_map2.get(part_num)
+        print(f"\n处理分块{part_num}：")
+        print(f"  prompt1文件: {jsonl_file1 if jsonl_file1 else '未找到'}")
+        print(f"  prompt2文件: {jsonl_file2 if jsonl_file2 else '未找到'}")
+
+        # 构建两个prompt的映射（基于分块内local_id）
+        id_content1 = parse_jsonl(jsonl_file1)
+        id_content2 = parse_jsonl(jsonl_file2)
+
+        # 关联content到分块数据（用local_id匹配）
+        df['content1'] = df['local_id'].map(id_content1)
+        df['content2'] = df['local_id'].map(id_content2)
+        if 'dup_cluster' in df.columns:
+            filled = fill_near_duplicates(df, 'content1', cluster_content1)
+            filled += fill_near_duplicates(df, 'content2', cluster_content2)
+            if filled:
+                print(f"  近似重复行使用代表行的结果: {filled}条")
+
+        # 统计匹配情况
+        total = len(df)
+        matched1 = df['content1'].notna().sum()
+        matched2 = df['content2'].notna().sum()
+        print(f"  分块数据量: {total}")
+        print(f"  content1匹配数: {matched1}（未匹配数: {total - matched1}）")
+        print(f"  content2匹配数: {matched2}（未匹配数: {total - matched2}）")
 
-    # 构建两个prompt的映射（基于分块内local_id）
-    id_content1 = parse_jsonl(jsonl_file1)
-    id_content2 = parse_jsonl(jsonl_file2)
+        # 检查是否完全匹配（根据需求调整）
+        if matched1 != total or matched2 != total:
+            print(f"  警告：分块{part_num}存在未匹配的content！")
+        else:
+            print(f"  分块{part_num} content1和content2全部匹配成功！")
 
-    # 关联content到分块数据（用local_id匹配）
-    df['content1'] = df['local_id'].map(id_content1)
-    df['content2'] = df['local_id'].map(id_content2)
+        # 保存结果（覆盖原分块文件）
+        df.to_csv(part_path, index=False, encoding='utf-8-sig')
+        stage = current_stage()
+        stage.add(rows_out=total)
+        stage.add_files_in([path for path in (jsonl_file1, jsonl_file2) if path])
+        stage.add_files_out(part_path)
 
-    # 统计匹配情况
-    total = len(df)
-    matched1 = df['content1'].notna().sum()
-    matched2 = df['content2'].notna().sum()
-    print(f"  分块数据量: {total}")
-    print(f"  content1匹配数: {matched1}（未匹配数: {total - matched1}）")
-    print(f"  content2匹配数: {matched2}（未匹配数: {total - matched2}）")
+    print("\n所有分块处理完成！")
 
-    # 检查是否完全匹配（根据需求调整）
-    if matched1 != total or matched2 != total:
-        print(f"  警告：分块{part_num}存在未匹配的content！")
-    else:
-        print(f"  分块{part_num} content1和content2全部匹配成功！")
+@staged('run_cleaning')
+def run_cleaning(input_dir, file_names, output_dir, jsonl_dir=None, num_parts=NUM_PARTS, partitioned_dir=None,
+                 min_length=min_length, min_year=min_year, near_dup_distance=near_dup_distance):
+    """完整流程：清洗 →（near_dup_distance不为None时）标记近似重复 → 分块保存 →（指定jsonl_dir时）关联推理结果"""
+    os.makedirs(output_dir, exist_ok=True)
+    removed_file = os.path.join(output_dir, "企业删除数据.csv")
 
-    # 保存结果（覆盖原分块文件）
-    df.to_csv(part_path, index=False, encoding='utf-8-sig')
+    final_clean_data = clean_data(input_dir, file_names, removed_file, min_length, min_year)
+    if near_dup_distance is not None:
+        mark_near_duplicates(final_clean_data, 'duty', near_dup_distance)
+    save_parts(final_clean_data, output_dir, num_parts, partitioned_dir)
+    if jsonl_dir:
+        attach_jsonl_content(output_dir, jsonl_dir, num_parts)
 
-print("\n所有分块处理完成！")
\ No newline at end of file
+if __name__ == "__main__":
+    run_cleaning(input_dir, file_names, output_dir, jsonl_dir, NUM_PARTS, partitioned_output_dir)
@@ -0,0 +1,92 @@
+# 全流程：dta → parquet转换、企业数据清洗、批量推理jsonl生成、组织机构代码匹配
+# 每个阶段的输入、参数、输出都在下面声明，重跑时没有变化的阶段会被跳过（见pipeline.py），
+# 例如只修改SIMILARITY_THRESHOLD时，只会重跑匹配阶段
+# 用法：
+#   python 全流程.py                 运行（跳过未变化的阶段）
+#   python 全流程.py --dry-run       只显示每个阶段会跳过还是重跑及原因
+#   python 全流程.py --force 清洗     强制重跑指定阶段（可写多个）
+import argparse
+import os
+from near_duplicates import NEAR_DUP_DISTANCE as DEFAULT_NEAR_DUP_DISTANCE
+from pipeline import Pipeline
+
+# ==================== 配置参数 ====================
+DTA_DIR = r"C:\Users\mjy12\Desktop\工商数据\dta"            # 工商登记.dta文件夹
+PARQUET_DIR = r"C:\Users\mjy12\Desktop\工商数据\parquet"    # 转换后的parquet（匹配时的文件夹B）
+
+CLEAN_INPUT_DIR = r"C:\Users\mjy12\Desktop\企业失信\shuru"
+CLEAN_OUTPUT_DIR = r"C:\Users\mjy12\Desktop\企业失信\shuchu"
+CLEAN_FILES = ["qiye_all_part1.csv", "qiye_all_part2.csv", "qiye_all_part3.csv"]
+MIN_LENGTH = 20
+MIN_YEAR = 2014
+NUM_PARTS = 10
+NEAR_DUP_DISTANCE = DEFAULT_NEAR_DUP_DISTANCE  # duty近似重复检测的汉明距离阈值（默认值见near_duplicates.py），None为不检测
+REPRESENTATIVES_ONLY = True     # 只为近似重复簇的代表行生成推理请求
+
+JSONL_DIR = r"C:\Users\mjy12\Desktop\企业失信\jsonl"
+PROMPT_FILE = r"C:\Users\mjy12\Desktop\企业失信\prompt1.txt"
+TEXT_COLUMN = "duty"
+
+MATCH_FILE_A = r"C:\Users\mjy12\Desktop\匹配\fileA.parquet"
+MATCH_OUTPUT_DIR = r"C:\Users\mjy12\Desktop\匹配\zzjgdm结果"
+MATCH_BATCH_SIZE = 100000
+SIMILARITY_THRESHOLD = 0.8
+MATCH_LOOKUP_KEY = None         # 'newgcid' 或 'cardnum'：匹配结果按该列排序并写辅助索引，便于下游按键查找
+
+CACHE_DIR = ".pipeline_cache"
+
+def part_csv(k):
+    return os.path.join(CLEAN_OUTPUT_DIR, f"个人清洗数据_分块_{k}.csv")
+
+def build_pipeline():
+    # 各模块在这里才导入，--dry-run时也需要它们的源文件计算缓存键
+    from dta2parquet import convert_dta_to_parquet_parallel
+    from 企业数据清洗 import run_cleaning
+    from change2json import csv_to_batch_jsonl
+    from match_zzjgdm import run_matching
+
+    pipeline = Pipeline(CACHE_DIR)
+    pipeline.add(
+        "dta转parquet", convert_dta_to_parquet_parallel,
+        inputs=[DTA_DIR],
+        params={'input_folder': DTA_DIR, 'output_folder': PARQUET_DIR},
+        outputs=[PARQUET_DIR],
+    )
+    # 不在这里关联推理结果：attach_jsonl_content会覆盖分块文件，使本阶段的输出被视为已修改
+    pipeline.add(
+        "清洗", run_cleaning,
+        inputs=[os.path.join(CLEAN_INPUT_DIR, name) for name in CLEAN_FILES],
+        params={'input_dir': CLEAN_INPUT_DIR, 'file_names': CLEAN_FILES, 'output_dir': CLEAN_OUTPUT_DIR,
+                'num_parts': NUM_PARTS, 'min_length': MIN_LENGTH, 'min_year': MIN_YEAR,
+                'near_dup_distance': NEAR_DUP_DISTANCE},
+        outputs=[part_csv(k) for k in range(1, NUM_PARTS + 1)],
+    )
+    with open(PROMPT_FILE, 'r', encoding='utf-8') as f:
+        prompt = f.read().strip()
+    for k in range(1, NUM_PARTS + 1):
+        output = os.path.join(JSONL_DIR, f"qy-prompt1-{k}.jsonl")
+        pipeline.add(
+            f"jsonl-{k}", csv_to_batch_jsonl,
+            inputs=[part_csv(k)],
+            params={'csv_file_name': part_csv(k), 'output_jsonl_file': output,
+                    'promptA': prompt, 'text_column': TEXT_COLUMN,
+                    'representatives_only': REPRESENTATIVES_ONLY and NEAR_DUP_DISTANCE is not None},
+            outputs=[output],
+        )
+    pipeline.add(
+        "匹配组织机构代码", run_matching,
+        inputs=[MATCH_FILE_A, PARQUET_DIR],
+        params={'fileA': MATCH_FILE_A, 'fileB_dir': PARQUET_DIR, 'output_dir': MATCH_OUTPUT_DIR,
+                'batch_size': MATCH_BATCH_SIZE, 'similarity_threshold': SIMILARITY_THRESHOLD,
+                'lookup_key': MATCH_LOOKUP_KEY},
+        outputs=[MATCH_OUTPUT_DIR],
+    )
+    return pipeline
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="运行全流程，跳过未变化的阶段")
+    parser.add_argument('--dry-run', action='store_true', help="只显示每个阶段会跳过还是重跑")
+    parser.add_argument('--force', nargs='*', default=(), help="强制重跑的阶段名")
+    args = parser.parse_args()
+    os.makedirs(JSONL_DIR, exist_ok=True)
+    build_pipeline().run(force=args.force, dry_run=args.dry_run)
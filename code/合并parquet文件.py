@@ -7,9 +7,20 @@
 #   output_file (str): 合并后Parquet文件的保存路径（默认：当前目录下merged.parquet）
 #   include_subfolders (bool): 是否包含子文件夹中的Parquet文件（默认：False）
 #   csv_output_file (str): 合并后CSV文件的保存路径（默认：None，即不转换为CSV）
+#   row_group_size (int): 流式合并时每个行组的行数（默认：500000）
+#   partitioning (str): 输入为hive分区数据集（如 publish_year=2019/）时填 'hive'，分区列会作为普通列写出
+#   filters (list): 行筛选条件，如 [('publish_year', '>=', 2019)]，分区数据集只读取满足条件的分区
+# merge_parquet_files_streaming 不把数据读入内存，而是按批次流式写出，
+# 内存只与row_group_size有关，与文件数量和总行数无关
+# 读取后的对齐、筛选和写出使用convert_engine.py中的函数（align_to_schema、filter_rows、run_chain）
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
 import os
+from convert_engine import align_to_schema, filter_rows, open_sink, run_chain, to_expression
+from run_report import current_stage, staged
 
 def merge_parquet_files(folder_path, output_file='merged.parquet', include_subfolders=False, csv_output_file=None):
 
@@ -24,7 +35,7 @@ def merge_parquet_files(folder_path, output_file='merged.parquet', include_subfo
         parquet_files = list(Path(folder_path).glob('*.parquet'))   # 仅当前文件夹
     
     if not parquet_files:
-        print(f"未找到Parquet文件（格式为.parquet）")
+        print("未找到Parquet文件（格式为.parquet）")
         return
     
     print(f"找到 {len(parquet_files)} 个Parquet文件，开始合并...")
@@ -60,12 +71,152 @@ def merge_parquet_files(folder_path, output_file='merged.parquet', include_subfo
             raise Exception(f"CSV文件保存失败: {str(e)}")
 
 
+def unify_parquet_schemas(parquet_files):
+    """
+    合并多个文件的schema：某些文件缺少的列填充为null，
+    兼容类型自动放宽（如int32→int64、int→double、null→任意类型）
+    无法读取schema的文件会被跳过，返回(统一后的schema, 可用文件列表)
+    """
+    schemas = []
+    usable = []
+    for file in parquet_files:
+        try:
+            schemas.append(pq.read_schema(file).remove_metadata())
+            usable.append(file)
+        except Exception as e:
+            print(f"⚠️ 读取文件 {Path(file).name} 失败: {str(e)}，已跳过")
+    if not schemas:
+        return None, []
+    try:
+        schema = pa.unify_schemas(schemas, promote_options="permissive")
+    except TypeError:
+        # 旧版本pyarrow不支持promote_options，只能合并完全一致的同名列
+        schema = pa.unify_schemas(schemas)
+    return schema, usable
+
+def open_parquet_dataset(parquet_files, partitioning=None, base_dir=None):
+    """把文件列表作为一个dataset打开；partitioning='hive'时从相对base_dir的路径解析分区列"""
+    return ds.dataset([str(f) for f in parquet_files], format='parquet',
+                      partitioning=partitioning,
+                      partition_base_dir=str(base_dir) if base_dir else None)
+
+def select_partition_files(parquet_files, partitioning, base_dir, filters=None):
+    """
+    只根据目录路径按筛选条件挑出需要读取的文件，不满足条件的分区不再读取schema
+    （dataset发现分区时只会读取第一个文件的schema）；
+    第一个文件无法读取导致dataset建立失败时返回全部文件，交给unify_parquet_schemas跳过坏文件
+    """
+    try:
+        dataset = open_parquet_dataset(parquet_files, partitioning, base_dir)
+        return [fragment.path for fragment in dataset.get_fragments(filter=to_expression(filters))]
+    except Exception as e:
+        print(f"⚠️ 按分区筛选文件失败: {str(e)}，改为读取全部文件")
+        return [str(f) for f in parquet_files]
+
+def partition_fields(dataset, schema):
+    """dataset中由目录解析出的分区列（不在文件schema中的列）"""
+    return [field for field in dataset.schema if schema.get_field_index(field.name) == -1]
+
+def iter_unified_batches(parquet_files, schema, batch_size=65536, partitioning=None, base_dir=None, filters=None):
+    """
+    依次流式读取每个文件的记录批次，并对齐到统一schema
+    分区数据集先按筛选条件跳过不满足条件的分区目录，
+    再把分区列补回批次、在对齐后的批次上按行筛选
+    """
+    dataset = open_parquet_dataset(parquet_files, partitioning, base_dir)
+    expression = to_expression(filters)
+    get_keys = getattr(ds, 'get_partition_keys', None) or ds._get_partition_keys
+
+    def aligned():
+        for fragment in dataset.get_fragments(filter=expression):
+            keys = get_keys(fragment.partition_expression) if partitioning else {}
+            for batch in fragment.to_batches(batch_size=batch_size):
+                yield None, align_to_schema(batch, schema, constants=keys)
+
+    stream = aligned() if expression is None else filter_rows(aligned(), expression)
+    for _, batch in stream:
+        yield batch
+
+@staged('merge_parquet')
+def merge_parquet_files_streaming(folder_path, output_file='merged.parquet', include_subfolders=False,
+                                  csv_output_file=None, row_group_size=500000, partitioning=None, filters=None):
+    """
+    流式合并文件夹中的Parquet文件
+    所有文件作为一个pyarrow dataset逐批读取，写入同一个ParquetWriter；
+    指定csv_output_file时，CSV由同一批次流同时写出，不再重新读取合并结果
+    partitioning='hive'时把文件夹当作分区数据集读取（自动包含子文件夹），配合filters按分区裁剪
+    """
+    if not os.path.isdir(folder_path):
+        raise ValueError(f"文件夹不存在: {folder_path}")
+
+    if include_subfolders or partitioning:
+        parquet_files = sorted(Path(folder_path).rglob('*.parquet'))
+    else:
+        parquet_files = sorted(Path(folder_path).glob('*.parquet'))
+    # 避免把输出文件本身当作输入
+    output_abspath = os.path.abspath(output_file)
+    parquet_files = [f for f in parquet_files if os.path.abspath(f) != output_abspath]
+
+    if not parquet_files:
+        print("未找到Parquet文件（格式为.parquet）")
+        return
+
+    print(f"找到 {len(parquet_files)} 个Parquet文件，开始流式合并...")
+    if partitioning:
+        # 先按分区筛选文件，只合并剩下文件的schema；没有满足条件的分区时仍用全部文件的schema写出空文件
+        selected = select_partition_files(parquet_files, partitioning, folder_path, filters)
+        print(f"分区裁剪后需要读取 {len(selected)}/{len(parquet_files)} 个文件")
+        parquet_files = selected or parquet_files
+    schema, parquet_files = unify_parquet_schemas(parquet_files)
+    if schema is None:
+        print("❌ 所有文件读取失败，合并未完成")
+        return
+    if partitioning:
+        dataset = open_parquet_dataset(parquet_files, partitioning, folder_path)
+        for field in partition_fields(dataset, schema):
+            schema = schema.append(field)
+
+    # 同一批次流同时写出parquet（攒够row_group_size行写一个行组）和CSV；没有数据时也按schema写出空文件
+    sinks = [open_sink(output_file, row_group_size=row_group_size, schema=schema)]
+    if csv_output_file:
+        sinks.append(open_sink(csv_output_file, schema=schema))
+    source = iter_unified_batches(parquet_files, schema, partitioning=partitioning,
+                                  base_dir=folder_path, filters=filters)
+    try:
+        total_rows = run_chain(source, sinks)['rows']
+    except Exception as e:
+        if csv_output_file:
+            raise Exception(f"合并或CSV文件保存失败: {str(e)}")
+        raise
+
+    print(f"✅ 合并完成！共 {total_rows} 行数据")
+    print(f"📁 Parquet文件已保存至: {os.path.abspath(output_file)}")
+    if csv_output_file:
+        print(f"📄 CSV文件已保存至: {os.path.abspath(csv_output_file)}")
+    # 行数和输出字节数已由run_chain记录
+    stage = current_stage()
+    stage.add_files_in(parquet_files)
+    stage.add_files_out([output_file] + ([csv_output_file] if csv_output_file else []))
+    return total_rows
+
+
 if __name__ == "__main__":
     print("===== Parquet文件合并与CSV转换工具 =====")
     folder_path = input("请输入需要合并的parquet文件夹位置")
     output_file = input("请为生成的parquet文件命名")
     include_subfolders = input("是否包含子文件夹中的Parquet文件？(y/n，默认n): ").strip().lower() == 'y'
+    partitioning = 'hive' if input("输入是否为按年份分区的数据集（如 publish_year=2019/）？(y/n，默认n): ").strip().lower() == 'y' else None
+    filters = None
+    if partitioning:
+        year_input = input("只读取的年份范围（如 publish_year>=2019，留空为全部）: ").strip()
+        if year_input:
+            from convert_engine import parse_filter_string
+            filters = parse_filter_string(year_input)
     
+    # 流式合并的行组大小
+    row_group_size_input = input("每个行组的行数（默认500000）: ").strip()
+    row_group_size = int(row_group_size_input) if row_group_size_input else 500000
+
     # 询问是否转换为CSV
     convert_to_csv = input("是否将合并后的文件转换为CSV文件？(y/n，默认n): ").strip().lower() == 'y'
     csv_output_file = None
@@ -76,11 +227,14 @@ if __name__ == "__main__":
             csv_output_file = os.path.splitext(output_file)[0] + '.csv'
     
     try:
-        merge_parquet_files(
+        merge_parquet_files_streaming(
             folder_path=folder_path,
             output_file=output_file,
             include_subfolders=include_subfolders,
-            csv_output_file=csv_output_file
+            csv_output_file=csv_output_file,
+            row_group_size=row_group_size,
+            partitioning=partitioning,
+            filters=filters
         )
     except Exception as e:
         print(f"❌ 操作失败: {str(e)}")
\ No newline at end of file
@@ -1,6 +1,12 @@
 import csv
 import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+from csv_input import iter_rows, sniff_csv
+from csv_ranges import aligned_byte_ranges, count_records, header_end, record_start_offsets, supports_byte_scan
+from run_report import current_stage, staged
+
+COPY_BUFFER = 16 << 20  # 按原始字节复制时每次读写16MB
 
 def split_csv_with_header(input_file, output_prefix, n):
     """
@@ -10,11 +16,10 @@ def split_csv_with_header(input_file, output_prefix, n):
         output_prefix: 输出文件的前缀
         n: 要分割成的份数
     """
-    # 读取原始CSV文件
-    with open(input_file, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        header = next(reader)  # 读取标题行
-        rows = list(reader)    # 读取剩余数据行
+    # 读取原始CSV文件（编码和分隔符自动判断）
+    reader = iter_rows(input_file)
+    header = next(reader)  # 读取标题行
+    rows = list(reader)    # 读取剩余数据行
     
     # 计算每份的行数
     total_rows = len(rows)
@@ -34,6 +39,101 @@ def split_csv_with_header(input_file, output_prefix, n):
         
         print(f"已创建文件: {output_file} (包含 {end - start} 行数据)")
 
+def _copy_range(input_file, output_file, header, start, end):
+    """写入表头，再把输入文件[start, end)的原始字节复制到输出文件"""
+    with open(input_file, 'rb') as src, open(output_file, 'wb') as dst:
+        dst.write(header)
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = src.read(min(COPY_BUFFER, remaining))
+            if not block:
+                break
+            dst.write(block)
+            remaining -= len(block)
+
+def _split_rows(input_file, output_prefix, n, fmt):
+    """
+    逐行解析均分（用于utf-16等不能按字节找记录边界的编码），分配方式与split_csv_with_header一致
+    先数一遍行数，再读第二遍依次写出，不把整个文件读入内存；输出为utf-8编码
+    """
+    total_rows = sum(1 for _ in iter_rows(input_file, fmt, skip_header=True))
+    rows_per_file = math.ceil(total_rows / n)
+    reader = iter_rows(input_file, fmt)
+    header = next(reader, [])
+    output_files = []
+    for i in range(n):
+        count = max(0, min(rows_per_file, total_rows - i * rows_per_file))
+        output_file = f"{output_prefix}_{i+1}.csv"
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for _ in range(count):
+                writer.writerow(next(reader))
+        print(f"已创建文件: {output_file} (包含 {count} 行数据)")
+        output_files.append(output_file)
+    return total_rows, output_files
+
+@staged('split_csv')
+def split_csv_streaming(input_file, output_prefix, n, by_bytes=False, workers=1):
+    """
+    流式均分CSV，内存占用与文件大小无关
+    参数:
+        input_file: 输入的CSV文件路径
+        output_prefix: 输出文件的前缀
+        n: 要分割成的份数
+        by_bytes: False时按行数均分（与split_csv_with_header的分配完全一致），
+                  先快速扫描一遍统计行数；True时按字节大致均分，只在记录边界处切分
+        workers: 同时写出的文件数
+    记录边界只认引号外的换行，字段内含换行的记录不会被切开；
+    输出直接复制原始字节（表头+数据段），不重新解析和加引号；
+    utf-16/utf-32编码的文件不能按字节扫描，改为逐行解析并按行数均分（忽略by_bytes和workers）
+    """
+    if n < 1:
+        raise ValueError("份数必须大于0")
+    fmt = sniff_csv(input_file)
+    if not supports_byte_scan(fmt.encoding):
+        total_rows, output_files = _split_rows(input_file, output_prefix, n, fmt)
+        stage = current_stage()
+        stage.add(rows_in=total_rows, rows_out=total_rows)
+        stage.add_files_in(input_file)
+        stage.add_files_out(output_files)
+        return output_files
+    data_start = header_end(input_file)
+    with open(input_file, 'rb') as f:
+        header = f.read(data_start)
+    if not header.endswith(b'\n'):
+        header += b'\r\n'  # 只有表头且没有换行的文件
+
+    if by_bytes:
+        ranges = aligned_byte_ranges(input_file, n)
+        ranges += [(ranges[-1][1], ranges[-1][1])] * (n - len(ranges))
+        counts = [None] * n
+    else:
+        total_rows = count_records(input_file)
+        rows_per_file = math.ceil(total_rows / n)
+        starts = [min(i * rows_per_file, total_rows) for i in range(n + 1)]
+        offsets = record_start_offsets(input_file, starts)
+        ranges = list(zip(offsets[:-1], offsets[1:]))
+        counts = [end - start for start, end in zip(starts[:-1], starts[1:])]
+
+    output_files = [f"{output_prefix}_{i+1}.csv" for i in range(n)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(
+            lambda args: _copy_range(input_file, args[0], header, *args[1]),
+            zip(output_files, ranges)
+        ))
+
+    for output_file, count, (start, end) in zip(output_files, counts, ranges):
+        detail = f"{count} 行数据" if count is not None else f"{(end - start) / 1024 / 1024:.1f}MB数据"
+        print(f"已创建文件: {output_file} (包含 {detail})")
+    stage = current_stage()
+    if not by_bytes:
+        stage.add(rows_in=total_rows, rows_out=total_rows)
+    stage.add_files_in(input_file)
+    stage.add_files_out(output_files)
+    return output_files
+
 if __name__ == "__main__":
     # 获取用户输入
     n = int(input("请输入要分割的份数: "))
@@ -45,4 +145,4 @@ if __name__ == "__main__":
     if not os.path.exists(input_file):
         print("错误: 输入文件不存在!")
     else:
-        split_csv_with_header(input_file, output_prefix, n)
\ No newline at end of file
+        split_csv_streaming(input_file, output_prefix, n)
\ No newline at end of file
@@ -1,47 +1,49 @@
-import csv
+# 统计关键词在CSV文本中出现的行数
+# count_keywords_in_csv：单个单列CSV文件，整体读入后逐行统计
+# count_keywords_streaming：流式多进程统计，可处理大文件和多个文件
+#   - 输入可以是单个文件、文件夹或通配符（如 D:\数据\*.csv），支持CSV和parquet
+#   - columns指定要统计的列（多列时一行中任一列包含即计入该行）
+#   - 大CSV按记录边界切成若干字节段，parquet按行组，由进程池并行统计后合并结果
+#   - group_by指定分组列（如 publish_year），在同一遍扫描中按组统计
+#   流式统计的实现在 keyword_stats.py
+import itertools
 import sys
 import os
+from csv_input import iter_rows, sniff_csv
+from keyword_matcher import KeywordMatcher, count_keywords, load_keywords
+from keyword_stats import count_keywords_streaming, save_stats
 
-def count_keywords_in_csv(file_path):
+# 默认关键词；关键词较多时写在文本文件中（每行一个），运行时输入文件路径即可
+DEFAULT_KEYWORDS = ["a", "b", "c"]
+
+def count_keywords_in_csv(file_path, keywords=None, with_occurrences=False):
     """
     读取CSV文件并统计关键词出现次数
     csv文件为单列
-    请在counters处修改关键词
+    keywords: 关键词列表，默认使用DEFAULT_KEYWORDS
+    返回 {关键词: 包含该关键词的行数}；
+    with_occurrences=True时返回 (行数统计, {关键词: 总出现次数})
     """
-    # 初始化计数器
-    counters = {
-        "a": 0,
-        "b": 0,
-        "c": 0
-    }
-    
-    # 尝试使用不同编码读取文件
-    encodings = ['utf-8', 'gbk', 'latin-1', 'utf-16']
-    csv_data = None
-    encoding_used = None
+    matcher = KeywordMatcher(keywords or DEFAULT_KEYWORDS)
     
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', newline='', encoding=encoding) as file:
-                reader = csv.reader(file)
-                csv_data = list(reader)
-                encoding_used = encoding
-                break
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"使用编码 {encoding} 读取文件时出错: {str(e)}")
-            continue
+    # 编码和分隔符由文件开头的样本判断，之后逐行流式读取，不把整个文件读入内存
+    try:
+        fmt = sniff_csv(file_path)
+        rows = iter_rows(file_path, fmt)
+        first_row = next(rows, None)
+    except Exception as e:
+        print(f"读取文件时出错: {str(e)}")
+        return None
     
-    if csv_data is None:
-        print(f"错误：无法解码文件 '{file_path}'，尝试了多种编码")
+    if first_row is None:
+        print(f"错误：文件 '{file_path}' 为空")
         return None
     
-    print(f"成功读取CSV文件，共 {len(csv_data)} 行数据，使用编码: {encoding_used}")
+    print(f"开始读取CSV文件，使用编码: {fmt.encoding}")
     
     # 检查CSV是否只有一列
-    if len(csv_data) > 0 and len(csv_data[0]) > 1:
-        print(f"警告：CSV文件包含 {len(csv_data[0])} 列数据，程序将只处理第一列")
+    if len(first_row) > 1:
+        print(f"警告：CSV文件包含 {len(first_row)} 列数据，程序将只处理第一列")
     
     # 确保tqdm正确导入
     try:
@@ -52,15 +54,13 @@ def count_keywords_in_csv(file_path):
         def progress_bar(iterable, **kwargs):
             return iterable
     
-    # 处理每一行数据，显示进度条
-    for row in progress_bar(csv_data, desc="处理进度", unit="行"):
-        if row:  # 跳过空行
-            text = row[0]  # 只处理第一列
-            # 检查每个关键词
-            for keyword in counters.keys():
-                if keyword in text:
-                    counters[keyword] += 1
-    
+    # 处理每一行数据，显示进度条；所有关键词在一次扫描中匹配
+    csv_data = itertools.chain([first_row], rows)
+    texts = (row[0] for row in progress_bar(csv_data, desc="处理进度", unit="行") if row)  # 只处理第一列，跳过空行
+    counters, occurrences = count_keywords(texts, matcher, with_occurrences)
+    counters = dict(counters)
+    if with_occurrences:
+        return counters, dict(occurrences)
     return counters
 
 def main():
@@ -69,11 +69,16 @@ def main():
     print("          CSV文件关键词统计工具          ")
     print("="*70)
     
-    # 获取CSV文件路径
+    # 获取CSV文件路径（流式模式下也可以是文件夹或通配符）
     if len(sys.argv) > 1:
         file_path = sys.argv[1]
     else:
-        file_path = input("请输入CSV文件路径: ")
+        file_path = input("请输入CSV文件路径（流式模式下可输入文件夹或通配符）: ").strip().replace("\"", "")
+    
+    streaming = input("是否使用流式多进程模式？(y/n，默认n): ").strip().lower() == 'y'
+    if streaming:
+        main_streaming(file_path)
+        return
     
     # 检查文件是否存在
     if not os.path.exists(file_path):
@@ -84,16 +89,60 @@ def main():
     if not file_path.lower().endswith('.csv'):
         print(f"警告：文件 '{file_path}' 不是CSV格式，仍将尝试读取")
     
+    # 关键词文件（每行一个关键词），留空使用DEFAULT_KEYWORDS
+    if len(sys.argv) > 2:
+        keyword_file = sys.argv[2]
+    else:
+        keyword_file = input("请输入关键词文件路径（留空使用默认关键词）: ").strip().replace("\"", "")
+    keywords = None
+    if keyword_file:
+        keywords = load_keywords(keyword_file)
+        print(f"已读取 {len(keywords)} 个关键词")
+    with_occurrences = input("是否同时统计总出现次数？(y/n，默认n): ").strip().lower() == 'y'
+    
     # 统计关键词
-    results = count_keywords_in_csv(file_path)
+    results = count_keywords_in_csv(file_path, keywords, with_occurrences)
     
     if results:
+        counters, occurrences = results if with_occurrences else (results, None)
         print("\n" + "="*70)
         print("统计结果:")
         print("-"*70)
-        for keyword, count in results.items():
-            print(f"{keyword}: {count} 次")
+        for keyword, count in counters.items():
+            if occurrences is None:
+                print(f"{keyword}: {count} 行")
+            else:
+                print(f"{keyword}: {count} 行，共出现 {occurrences[keyword]} 次")
         print("="*70)
 
+def main_streaming(path):
+    """流式模式的交互输入"""
+    keyword_file = input("请输入关键词文件路径（留空使用默认关键词）: ").strip().replace("\"", "")
+    keywords = load_keywords(keyword_file) if keyword_file else DEFAULT_KEYWORDS
+    columns = input("请输入要统计的列名或列序号（用逗号分隔，留空为第一列）: ").strip()
+    columns = [col.strip() for col in columns.split(',') if col.strip()] or None
+    group_by = input("请输入分组列名（如 publish_year，留空不分组）: ").strip() or None
+    with_occurrences = input("是否同时统计总出现次数？(y/n，默认n): ").strip().lower() == 'y'
+    output_csv = input("请输入结果保存路径（.csv，留空只显示）: ").strip().replace("\"", "")
+
+    results = count_keywords_streaming(path, keywords, columns, group_by, with_occurrences)
+    if not results:
+        return
+    print("\n" + "="*70)
+    print("统计结果:")
+    for group in sorted(results):
+        stats = results[group]
+        print("-"*70)
+        if group_by:
+            print(f"{group_by} = {group}（共 {stats['rows']} 行）")
+        for keyword in keywords:
+            line = f"{keyword}: {stats['counts'][keyword]} 行"
+            if with_occurrences:
+                line += f"，共出现 {stats['occurrences'][keyword]} 次"
+            print(line)
+    print("="*70)
+    if output_csv:
+        save_stats(results, output_csv, keywords, with_occurrences)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,33 +1,154 @@
+# 从CSV（或parquet）文件中随机抽取n行，只保存指定的列
+# 抽样方式：
+#   reservoir（默认）：只读取需要的列，分块单遍扫描，每行分配随机键、保留键最小的n行，
+#                      内存只与n有关，等概率无放回，相同随机种子结果相同
+#   block：快速近似抽样，随机跳到文件中的若干字节位置，各读取连续的几行，不扫描整个文件
+#          （长行被抽中的概率略高，字段内含换行时可能跳过个别行，适合快速查看数据）
+#   parquet文件：先确定抽中的行号，只读取包含这些行的行组
+import csv
+import io
+import math
+import os
+import random
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from convert_engine import open_source, reservoir_sample
+from csv_input import read_header, sniff_csv
+from dtype_policy import arrow_to_pandas
+from csv_ranges import header_end
+from run_report import current_stage, staged
 
-# 获取用户输入
-input_file = input("请输入导入文件（.csv）的地址：").replace("\"","")
-output_file = input("请输入导出文件（.csv）的地址：").replace("\"","")
-n = input("请输入需要抽取几行：")
-columns = input("请输入要保存的列名（用逗号分隔，例如：姓名,年龄）: ").strip().split(',')
-columns = [col.strip() for col in columns]  # 去除列名两边的空格
-
-
-try:
-    df = pd.read_csv(input_file)
-    
-    # 处理行数n（确保不超过数据总行数）
-    n = min(n, len(df))
-    
-    # 检查列名是否存在
-    invalid_cols = [col for col in columns if col not in df.columns]
+def check_columns(available, columns):
+    """检查列名是否存在"""
+    invalid_cols = [col for col in columns if col not in available]
     if invalid_cols:
-        print(f"错误：以下列名不存在于数据中：{invalid_cols}")
-        print(f"数据中包含的列名：{df.columns.tolist()}")
-        exit()
-    
-    # 随机抽取n行并选择特定列
-    result = df.sample(n=n).loc[:, columns]
-    
+        raise ValueError(f"以下列名不存在于数据中：{invalid_cols}\n数据中包含的列名：{list(available)}")
+
+def read_csv_header(input_file, encoding=None):
+    """读取表头，encoding为None时自动判断编码和分隔符"""
+    return read_header(input_file, sniff_csv(input_file, encoding))
+
+def reservoir_sample_csv(input_file, columns, n, seed=None, encoding=None):
+    """单遍蓄水池抽样，只解析指定的列，返回DataFrame（按原文件行顺序）"""
+    check_columns(read_csv_header(input_file, encoding), columns)
+    source = open_source(input_file, columns=columns, encoding=encoding)
+    sampled = [batch for _, batch in reservoir_sample(((None, b) for b in source), n, seed)]
+    if not sampled:
+        return pd.DataFrame(columns=columns)
+    return arrow_to_pandas(pa.Table.from_batches(sampled), categories=False)[columns]
+
+def block_sample_csv(input_file, columns, n, seed=None, block_rows=50, encoding=None):
+    """
+    近似块抽样：随机选择 ceil(n/block_rows) 个字节位置，
+    从每个位置之后的下一行开始连续读取block_rows行，最后随机保留n行
+    位置落在上一块已读范围内时从上一块的结束处接着读，同一行不会被读入两次
+    """
+    fmt = sniff_csv(input_file, encoding)
+    header = read_header(input_file, fmt)
+    check_columns(header, columns)
+    indices = [header.index(col) for col in columns]
+    data_start = header_end(input_file)
+    size = os.path.getsize(input_file)
+    if data_start >= size:
+        return pd.DataFrame(columns=columns)
+
+    rng = random.Random(seed)
+    n_blocks = max(1, math.ceil(n / block_rows))
+    offsets = sorted(rng.randrange(data_start, size) for _ in range(n_blocks))
+
+    rows = []
+    end = data_start  # 上一块读到的位置
+    with open(input_file, 'rb') as f:
+        for offset in offsets:
+            if offset < end:
+                f.seek(end)
+            else:
+                f.seek(offset)
+                if offset != data_start:
+                    f.readline()  # 跳过被截断的半行
+            if f.tell() >= size:
+                continue
+            for _ in range(block_rows):
+                # 按字节逐条读取记录（引号个数为奇数时说明字段内有换行，继续读下一行），便于准确记录结束位置
+                record = f.readline()
+                if not record:
+                    break
+                while record.count(b'"') % 2:
+                    line = f.readline()
+                    if not line:
+                        break
+                    record += line
+                text = record.decode(fmt.encoding, errors='replace')
+                row = next(csv.reader(io.StringIO(text, newline=''), delimiter=fmt.delimiter,
+                                      quotechar=fmt.quotechar), [])
+                if len(row) == len(header):  # 从引号内的换行开始读到的残缺行直接跳过
+                    rows.append([row[i] for i in indices])
+            end = f.tell()
+
+    if len(rows) > n:
+        rows = rng.sample(rows, n)
+    return pd.DataFrame(rows, columns=columns)
+
+def sample_parquet(input_file, columns, n, seed=None):
+    """parquet抽样：随机确定n个行号，只读取包含这些行的行组"""
+    parquet_file = pq.ParquetFile(input_file)
+    check_columns(parquet_file.schema_arrow.names, columns)
+    total = parquet_file.metadata.num_rows
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(total, size=min(n, total), replace=False))
+
+    # 每个行组的起始行号
+    group_rows = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+    group_starts = np.concatenate([[0], np.cumsum(group_rows)])
+
+    parts = []
+    group_of_pick = np.searchsorted(group_starts, picks, side='right') - 1
+    for group in np.unique(group_of_pick):
+        local = picks[group_of_pick == group] - group_starts[group]
+        table = parquet_file.read_row_group(int(group), columns=columns)
+        parts.append(arrow_to_pandas(table.take(local), categories=False))
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)[columns]
+
+@staged('sample')
+def sample_file(input_file, output_file, n, columns, seed=None, method='reservoir', encoding=None):
+    """按文件类型和抽样方式抽取n行指定列并保存为CSV"""
+    n = int(n)
+    if n < 1:
+        raise ValueError("抽取行数必须大于0")
+    if input_file.lower().endswith('.parquet'):
+        result = sample_parquet(input_file, columns, n, seed)
+    elif method == 'block':
+        result = block_sample_csv(input_file, columns, n, seed, encoding=encoding)
+    else:
+        result = reservoir_sample_csv(input_file, columns, n, seed, encoding=encoding)
+
     result.to_csv(output_file, index=False)
     print(f"成功！已将{len(result)}行数据（{columns}列）保存到 {output_file}")
+    stage = current_stage()
+    stage.add(rows_out=len(result))
+    stage.add_files_in(input_file)
+    stage.add_files_out(output_file)
+    stage.set(method='parquet' if input_file.lower().endswith('.parquet') else method)
+    return result
+
+if __name__ == "__main__":
+    # 获取用户输入
+    input_file = input("请输入导入文件（.csv 或 .parquet）的地址：").replace("\"","")
+    output_file = input("请输入导出文件（.csv）的地址：").replace("\"","")
+    n = input("请输入需要抽取几行：")
+    columns = input("请输入要保存的列名（用逗号分隔，例如：姓名,年龄）: ").strip().split(',')
+    columns = [col.strip() for col in columns]  # 去除列名两边的空格
+    seed_input = input("请输入随机种子（留空则每次结果不同）：").strip()
+    seed = int(seed_input) if seed_input else None
+    method = 'block' if input("是否使用快速近似抽样？(y/n，默认n): ").strip().lower() == 'y' else 'reservoir'
 
-except FileNotFoundError:
-    print(f"错误：文件 '{input_file}' 不存在，请检查路径是否正确")
-except Exception as e:
-    print(f"发生错误：{e}")
\ No newline at end of file
+    try:
+        sample_file(input_file, output_file, n, columns, seed, method)
+    except FileNotFoundError:
+        print(f"错误：文件 '{input_file}' 不存在，请检查路径是否正确")
+    except Exception as e:
+        print(f"发生错误：{e}")